@@ -7,7 +7,9 @@ from aiogram import Bot, Dispatcher
 from aiogram.types import Message
 from aiogram.filters import Command
 from config import BOT_TOKEN
-from data.storage import is_subscribed
+from data.storage import flush_storage
+from data import async_storage
+from utils import event_loop_lag_monitor
 from handlers import commands, entries, statistics, projects, delete, hashtags, wishlist, notes, plans, calendar, challenges, subscriptions, period_comparison, export, admin, feedback
 from handlers.keyboards import get_main_menu
 
@@ -40,6 +42,10 @@ logger = logging.getLogger(__name__)
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
+# Все отправки сообщений идут через общий лимит с приоритетами (ответы пользователям - первыми)
+from middleware.outbound import OutboundMiddleware
+bot.session.middleware(OutboundMiddleware())
+
 # Регистрация middleware для отслеживания пользователей
 from middleware.user_tracker import UserTrackerMiddleware
 dp.message.outer_middleware(UserTrackerMiddleware())
@@ -72,7 +78,7 @@ async def handle_text_messages(message: Message):
     logger.info(f"[BOT] Получено текстовое сообщение от user_id={user_id}, text='{message.text[:100] if message.text else 'None'}'")
     
     # Проверяем подписку, но не блокируем полностью - проверяем, есть ли активные диалоги
-    subscribed = is_subscribed(user_id)
+    subscribed = await async_storage.is_subscribed(user_id)
     logger.info(f"[BOT] Проверка подписки для user_id={user_id}, subscribed={subscribed}")
     if not subscribed:
         # Проверяем, есть ли активные диалоги, которые нужно завершить
@@ -178,7 +184,7 @@ async def handle_text_messages(message: Message):
 async def handle_photos(message: Message):
     user_id = message.from_user.id
     
-    if not is_subscribed(user_id):
+    if not await async_storage.is_subscribed(user_id):
         return
     
     # Получаем самое большое фото
@@ -208,6 +214,9 @@ async def main():
         task = asyncio.create_task(subscription_checker_task(bot))
         logger.info("✅ Фоновая задача проверки подписок запущена")
         
+        # Мониторинг блокировок event loop (сводка в логе раз в 5 минут)
+        lag_task = asyncio.create_task(event_loop_lag_monitor())
+        
         logger.info("Подключение к Telegram API...")
         await dp.start_polling(bot, skip_updates=True)
     except Exception as e:
@@ -221,6 +230,11 @@ async def main():
                 await task
             except asyncio.CancelledError:
                 pass
+        if 'lag_task' in locals():
+            lag_task.cancel()
+        # Дожидаемся операций с хранилищем и записываем на диск отложенные изменения
+        async_storage.shutdown()
+        flush_storage()
         await bot.session.close()
 
 if __name__ == '__main__':
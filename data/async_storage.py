@@ -0,0 +1,249 @@
+"""Асинхронная обёртка над data/storage.py.
+
+Чтение и запись файлов вместе с разбором JSON выполняются в отдельном пуле потоков,
+чтобы большие файлы не останавливали event loop и обработку сообщений других пользователей.
+"""
+import asyncio
+import functools
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from data import challenges, storage
+
+# Количество потоков для работы с хранилищем
+STORAGE_THREADS = int(os.getenv('STORAGE_THREADS', '4'))
+
+_executor = ThreadPoolExecutor(max_workers=STORAGE_THREADS, thread_name_prefix='storage')
+
+async def run_in_storage(func: Callable, *args, **kwargs) -> Any:
+    """Выполнить синхронную функцию хранилища в пуле потоков"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+# Изменения данных одного пользователя выполняются по очереди ещё до попадания в пул,
+# чтобы ожидание блокировки файла не занимало потоки. Блокировка исчезает, когда она никому не нужна.
+# Очередь соблюдается, только если обработчики меняют данные через этот модуль, а не через data.storage.
+_user_locks = weakref.WeakValueDictionary()
+
+async def run_for_user(user_id: Optional[int], func: Callable, *args, **kwargs) -> Any:
+    """Выполнить изменение данных пользователя в пуле потоков, по одному изменению на пользователя"""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    async with lock:
+        return await run_in_storage(func, *args, **kwargs)
+
+def shutdown():
+    """Дождаться завершения операций с хранилищем и остановить пул потоков"""
+    _executor.shutdown(wait=True)
+
+# === Версии данных ===
+async def get_external_version(user_id: int) -> int:
+    """Счётчик изменений данных пользователя извне (другим процессом, скриптом или вручную)"""
+    return await run_in_storage(storage.get_external_version, user_id)
+
+# === Подписки ===
+async def get_user_subscription(user_id: int) -> Optional[Dict]:
+    """Получить информацию о подписке пользователя"""
+    return await run_in_storage(storage.get_user_subscription, user_id)
+
+async def get_expiring_subscriptions(until: datetime) -> List[Dict]:
+    """Получить действующие подписки, которые закончатся раньше until (по возрастанию даты окончания)"""
+    return await run_in_storage(storage.get_expiring_subscriptions, until)
+
+async def save_subscription(user_id: int, subscription_data: Dict):
+    """Сохранить информацию о подписке"""
+    return await run_for_user(user_id, storage.save_subscription, user_id, subscription_data)
+
+async def grant_access(user_id: int, days: int = 30, is_trial: bool = False):
+    """Выдать доступ пользователю на указанное количество дней"""
+    return await run_for_user(user_id, storage.grant_access, user_id, days, is_trial)
+
+async def is_subscribed(user_id: int) -> bool:
+    """Проверить, есть ли активная подписка"""
+    # Индекс подписок уже в памяти - проверка прямо в event loop, без очереди пула
+    subscribed = storage.is_subscribed_cached(user_id)
+    if subscribed is not None:
+        return subscribed
+    return await run_in_storage(storage.is_subscribed, user_id)
+
+# === Пользователи ===
+async def save_user_id(user_id: int):
+    """Сохранить ID пользователя (если его еще нет в списке)"""
+    # Известный пользователь - проверка в памяти прямо в event loop, без пула и очереди изменений
+    if storage.is_known_user(user_id):
+        return
+    return await run_for_user(user_id, storage.save_user_id, user_id)
+
+async def get_all_user_ids() -> List[int]:
+    """Получить список всех ID пользователей"""
+    return await run_in_storage(storage.get_all_user_ids)
+
+async def get_admin_statistics(fresh: bool = False) -> Dict:
+    """Статистика по всем пользователям для администратора"""
+    return await run_in_storage(storage.get_admin_statistics, fresh)
+
+async def get_user_feedback_given(user_id: int) -> bool:
+    """Получить статус feedback_given для пользователя"""
+    return await run_in_storage(storage.get_user_feedback_given, user_id)
+
+async def set_user_feedback_given(user_id: int, value: bool = True):
+    """Установить feedback_given для пользователя"""
+    return await run_for_user(user_id, storage.set_user_feedback_given, user_id, value)
+
+# === Записи о крестиках ===
+async def get_entries(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить все записи или записи конкретного пользователя"""
+    return await run_in_storage(storage.get_entries, user_id)
+
+async def add_count_to_date(date: str, count: float, user_id: int, hashtag: Optional[str] = None):
+    """Добавить крестики за дату с опциональным хэштегом"""
+    return await run_for_user(user_id, storage.add_count_to_date, date, count, user_id, hashtag)
+
+async def get_entries_by_hashtag(hashtag: str, user_id: int) -> List[Dict]:
+    """Получить записи по хэштегу"""
+    return await run_in_storage(storage.get_entries_by_hashtag, hashtag, user_id)
+
+async def get_entries_by_date(date: str, user_id: int) -> List[Dict]:
+    """Получить записи пользователя за дату"""
+    return await run_in_storage(storage.get_entries_by_date, date, user_id)
+
+async def get_daily_totals(user_id: int, hashtag: Optional[str] = None) -> Dict[str, float]:
+    """Получить сумму крестиков по дням {дата: сумма} (по всем хэштегам или по одному)"""
+    return await run_in_storage(storage.get_daily_totals, user_id, hashtag)
+
+async def get_daily_hashtag_totals(user_id: int) -> Dict[str, Dict[Optional[str], float]]:
+    """Получить сумму крестиков по дням с разбивкой по хэштегам {дата: {хэштег: сумма}} (None - без хэштега)"""
+    return await run_in_storage(storage.get_daily_hashtag_totals, user_id)
+
+async def range_total(user_id: int, start=None, end=None, hashtag: Optional[str] = None) -> float:
+    """Получить сумму крестиков пользователя за интервал дат (границы включаются, None - без границы)"""
+    return await run_in_storage(storage.range_total, user_id, start, end, hashtag)
+
+async def range_days(user_id: int, start=None, end=None, hashtag: Optional[str] = None) -> int:
+    """Получить число дней с записями пользователя за интервал дат"""
+    return await run_in_storage(storage.range_days, user_id, start, end, hashtag)
+
+async def get_plans_progress(user_id: int, plans: List[Dict]) -> List[float]:
+    """Получить прогресс планов пользователя за одно чтение записей"""
+    return await run_in_storage(storage.get_plans_progress, user_id, plans)
+
+async def get_streak(user_id: int, start: Optional[date] = None, today: Optional[date] = None) -> Dict[str, int]:
+    """Получить серию дней подряд с записями: текущую и самую длинную"""
+    return await run_in_storage(storage.get_streak, user_id, start, today)
+
+async def get_entry_stats(user_id: int, today: Optional[date] = None) -> Dict:
+    """Получить сводную статистику пользователя для экрана статистики"""
+    return await run_in_storage(storage.get_entry_stats, user_id, today)
+
+async def rebuild_entry_stats(user_id: Optional[int] = None):
+    """Пересобрать сводную статистику по записям (пользователя или всех)"""
+    return await run_for_user(user_id, storage.rebuild_entry_stats, user_id)
+
+async def get_all_hashtags(user_id: int) -> List[str]:
+    """Получить все уникальные хэштеги пользователя (из записей и проектов)"""
+    return await run_in_storage(storage.get_all_hashtags, user_id)
+
+async def get_hashtag_summary(user_id: int) -> Dict[str, Dict]:
+    """Сводка по хэштегам пользователя"""
+    return await run_in_storage(storage.get_hashtag_summary, user_id)
+
+async def get_projects_by_hashtag(hashtag: str, user_id: int) -> List[Dict]:
+    """Получить проекты по хэштегу"""
+    return await run_in_storage(storage.get_projects_by_hashtag, hashtag, user_id)
+
+# === Проекты ===
+async def get_projects(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить все проекты или проекты конкретного пользователя"""
+    return await run_in_storage(storage.get_projects, user_id)
+
+async def save_project(project: Dict):
+    """Сохранить проект"""
+    return await run_for_user(project.get('userId'), storage.save_project, project)
+
+async def remove_project_photo(project_id: str, user_id: int):
+    """Удалить фото из проекта"""
+    return await run_for_user(user_id, storage.remove_project_photo, project_id, user_id)
+
+async def delete_project(project_id: str, user_id: int) -> bool:
+    """Удалить проект"""
+    return await run_for_user(user_id, storage.delete_project, project_id, user_id)
+
+async def delete_all_user_data(user_id: int):
+    """Удалить все данные пользователя (ID остается в списке для статистики)"""
+    return await run_for_user(user_id, storage.delete_all_user_data, user_id)
+
+async def delete_entry_by_date(date: str, user_id: int):
+    """Удалить запись за конкретную дату"""
+    return await run_for_user(user_id, storage.delete_entry_by_date, date, user_id)
+
+# === Вишлист ===
+async def get_wishlist(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить вишлист пользователя"""
+    return await run_in_storage(storage.get_wishlist, user_id)
+
+async def add_to_wishlist(item: Dict):
+    """Добавить элемент в вишлист"""
+    return await run_for_user(item.get('userId'), storage.add_to_wishlist, item)
+
+async def remove_from_wishlist(item_id: str, user_id: int):
+    """Удалить элемент из вишлиста"""
+    return await run_for_user(user_id, storage.remove_from_wishlist, item_id, user_id)
+
+async def update_wishlist_item(item_id: str, user_id: int, updates: Dict):
+    """Обновить элемент вишлиста"""
+    return await run_for_user(user_id, storage.update_wishlist_item, item_id, user_id, updates)
+
+# === Заметки ===
+async def get_notes(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить заметки пользователя"""
+    return await run_in_storage(storage.get_notes, user_id)
+
+async def save_note(note: Dict):
+    """Сохранить заметку"""
+    return await run_for_user(note.get('userId'), storage.save_note, note)
+
+async def delete_note(note_id: str, user_id: int):
+    """Удалить заметку"""
+    return await run_for_user(user_id, storage.delete_note, note_id, user_id)
+
+# === Планы ===
+async def get_plans(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить планы пользователя"""
+    return await run_in_storage(storage.get_plans, user_id)
+
+async def save_plan(plan: Dict):
+    """Сохранить план"""
+    return await run_for_user(plan.get('userId'), storage.save_plan, plan)
+
+async def delete_plan(plan_id: str, user_id: int):
+    """Удалить план"""
+    return await run_for_user(user_id, storage.delete_plan, plan_id, user_id)
+
+# === Челленджи ===
+async def get_user_challenges(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить челленджи пользователя"""
+    return await run_in_storage(storage.get_user_challenges, user_id)
+
+async def add_user_challenge(challenge: Dict):
+    """Добавить челлендж пользователю"""
+    return await run_for_user(challenge.get('userId'), storage.add_user_challenge, challenge)
+
+async def update_user_challenge(challenge_id: str, user_id: int, updates: Dict):
+    """Обновить челлендж пользователя"""
+    return await run_for_user(user_id, storage.update_user_challenge, challenge_id, user_id, updates)
+
+async def delete_user_challenge(challenge_id: str, user_id: int):
+    """Удалить челлендж пользователя"""
+    return await run_for_user(user_id, storage.delete_user_challenge, challenge_id, user_id)
+
+async def get_user_challenge(challenge_id: str, user_id: int) -> Optional[Dict]:
+    """Получить конкретный челлендж пользователя"""
+    return await run_in_storage(storage.get_user_challenge, challenge_id, user_id)
+
+async def check_challenge_progress(user_id: int, challenge_id: str, user_challenge: Dict) -> Optional[Dict]:
+    """Проверить прогресс по челленджу (может сохранить состояние челленджа, поэтому идёт как изменение)"""
+    return await run_for_user(user_id, challenges.check_challenge_progress, user_id, challenge_id, user_challenge)
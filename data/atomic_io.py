@@ -0,0 +1,119 @@
+"""Атомарная запись файлов: временный файл + fsync + переименование поверх старого"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Пакетный fsync: 0 - fsync при каждой записи, N - не чаще раза в N мс для всех изменённых папок и журналов.
+# Новый файл всегда сбрасывается на диск до переименования, поэтому обрезанным он не останется;
+# откладывается только fsync папки (само переименование) и дописанных журналов -
+# при сбое питания могут потеряться изменения последних N мс.
+STORAGE_FSYNC_BATCH_MS = int(os.getenv('STORAGE_FSYNC_BATCH_MS', '0'))
+
+# mkstemp создаёт файл с правами 0600 - новым файлам выставляем обычные права с учётом umask
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Дописанные файлы (журналы) и папки с переименованными файлами, ожидающие пакетного fsync
+_pending_sync: Set[str] = set()
+_pending_dirs: Set[str] = set()
+_sync_lock = threading.Lock()
+_sync_thread: Optional[threading.Thread] = None
+
+def _fsync_dir(dirpath: str):
+    """Сбросить на диск запись о переименовании в папке (только POSIX)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(dirpath, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _fsync_path(filepath: str):
+    """fsync уже записанного файла и его папки"""
+    # 'ab' вместо 'rb' - на Windows fsync требует права на запись
+    with open(filepath, 'ab') as f:
+        os.fsync(f.fileno())
+    _fsync_dir(os.path.dirname(os.path.abspath(filepath)))
+
+def _schedule_sync(filepath: str = None, dirpath: str = None):
+    """Отложить fsync дописанного файла или папки до ближайшего пакета"""
+    global _sync_thread
+    with _sync_lock:
+        if filepath is not None:
+            _pending_sync.add(filepath)
+        if dirpath is not None:
+            _pending_dirs.add(dirpath)
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_loop, name='storage-fsync', daemon=True)
+            _sync_thread.start()
+
+def _sync_loop():
+    """Фоновый поток: раз в STORAGE_FSYNC_BATCH_MS делает fsync всех изменённых файлов и папок"""
+    while True:
+        time.sleep(STORAGE_FSYNC_BATCH_MS / 1000)
+        flush_fsync()
+
+def flush_fsync():
+    """Сделать fsync всех файлов и папок, ожидающих пакетного fsync"""
+    with _sync_lock:
+        paths = list(_pending_sync)
+        dirs = _pending_dirs - {os.path.dirname(os.path.abspath(path)) for path in paths}
+        _pending_sync.clear()
+        _pending_dirs.clear()
+    for filepath in paths:
+        try:
+            _fsync_path(filepath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"flush_fsync: ошибка fsync {filepath}: {e}")
+    for dirpath in dirs:
+        try:
+            _fsync_dir(dirpath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"flush_fsync: ошибка fsync папки {dirpath}: {e}")
+
+def atomic_write_json(filepath: str, data: Any, indent: Optional[int] = 2):
+    """Атомарно записать JSON: при сбое на диске останется либо старый, либо новый файл целиком"""
+    dirpath = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(dir=dirpath, prefix=f'.{os.path.basename(filepath)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            # Всегда до переименования: иначе после сбоя питания на месте файла может оказаться пустой
+            os.fsync(f.fileno())
+        try:
+            mode = os.stat(filepath).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if STORAGE_FSYNC_BATCH_MS:
+        _schedule_sync(dirpath=dirpath)
+    else:
+        _fsync_dir(dirpath)
+
+def sync_appended(f):
+    """Сбросить на диск дописанный файл (журнал): сразу или в ближайшем пакете"""
+    f.flush()
+    if STORAGE_FSYNC_BATCH_MS:
+        _schedule_sync(f.name)
+    else:
+        os.fsync(f.fileno())
@@ -1,7 +1,11 @@
 """Предустановленные челленджи для пользователей"""
-from datetime import datetime, timedelta
-from typing import Dict, List
-from data.storage import get_entries
+import math
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from data.dates import parse_date
+from data.storage import (add_entry_listener, get_daily_totals, get_external_version, get_streak,
+                          get_user_challenges, range_days, range_total, update_user_challenge)
 
 # Доступные челленджи
 AVAILABLE_CHALLENGES = {
@@ -58,68 +62,171 @@ def get_challenge_by_id(challenge_id: str) -> Dict:
     """Получить челлендж по ID"""
     return AVAILABLE_CHALLENGES.get(challenge_id)
 
-def calculate_streak(entries: List[Dict], start_date: datetime) -> int:
-    """Вычислить текущую серию дней подряд"""
-    if not entries:
-        return 0
-    
-    # Получаем уникальные даты с записями (независимо от количества крестиков)
-    dates_with_entries = set()
-    for entry in entries:
-        date_str = entry.get('date', '')
-        if date_str:
-            try:
-                entry_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                if entry_date >= start_date.date():
-                    dates_with_entries.add(entry_date)
-            except:
-                continue
+# === Состояние челленджей ===
+# Каждый начатый челлендж хранит в поле 'state' свои итоги: count_period - суммы по дням периода,
+# daily_minimum - дни с нормой в окне проверки, streak - последний день с записями и длину серии до него.
+# При изменении записей состояние сдвигается на один изменённый день, без перечитывания истории.
+#
+# Рядом с состоянием хранится 'stateVersion' - запуск процесса и счётчик изменений данных пользователя извне
+# (get_external_version). Если версия не совпадает (данные правили скриптом, другим процессом или бот
+# перезапускался), состояние собирается заново. Сдвинутое по дням состояние держится в памяти (_states),
+# а в коллекцию челленджей пишется только собранное заново - добавление записи коллекцию не перезаписывает.
+
+# Отличает запуски процесса: счётчики изменений извне после перезапуска начинаются заново
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+# user_id -> {id челленджа: {'startDate', 'stateVersion', 'state'}} - актуальные состояния начатых челленджей
+_states: Dict[int, Dict[str, Dict]] = {}
+
+def _state_version(user_id: int) -> str:
+    return f"{_PROCESS_TOKEN}:{get_external_version(user_id)}"
+
+def _period_end(challenge_data: Dict, start: date) -> date:
+    return start + timedelta(days=challenge_data['period_days'])
+
+def _window_start(challenge_data: Dict, start: date, today: date) -> date:
+    """Самый ранний день, который ещё может попасть в проверку daily_minimum"""
+    return max(start, today - timedelta(days=challenge_data['period_days'] * 2))
+
+def _build_state(user_id: int, challenge_data: Dict, start: date) -> Dict:
+    """Собрать состояние челленджа по записям пользователя (один раз, дальше оно обновляется по дням)"""
+    today = datetime.now().date()
+    if challenge_data['type'] == 'streak':
+        days = [day for day in map(parse_date, get_daily_totals(user_id)) if day and day >= start]
+        if not days:
+            return {'last': None, 'length': 0}
+        last = max(days)
+        return {'last': last.isoformat(), 'length': get_streak(user_id, start, last)['current']}
     
-    if not dates_with_entries:
-        return 0
+    if challenge_data['type'] == 'count_period':
+        first, last = start, _period_end(challenge_data, start)
+    else:
+        first, last = _window_start(challenge_data, start, today), None
+    days = {}
+    for date_str, total in get_daily_totals(user_id).items():
+        day = parse_date(date_str)
+        if day and first <= day and (last is None or day <= last):
+            days[date_str] = total
+    if challenge_data['type'] == 'daily_minimum':
+        return {'days': sorted(d for d, total in days.items() if total >= challenge_data['target'])}
+    return {'days': days}
+
+def _advance_state(challenge_data: Dict, start: date, state: Dict, day: date,
+                   total: Optional[float]) -> Optional[Dict]:
+    """Новое состояние после изменения записей за день day (total=None - записей за день не осталось).
     
-    # Проверяем серию с сегодняшнего дня назад
-    today = datetime.now().date()
-    streak = 0
-    current_date = today
+    Состояние не меняется на месте (оно может лежать в кэше файлов). None - по одному дню
+    обновить нельзя (серия могла слиться с предыдущей или потерять последний день), нужно собрать заново.
+    """
+    if day < start:
+        return state
+    date_str = day.isoformat()
     
-    # Начинаем проверку с сегодняшнего дня и идем назад
-    while current_date >= start_date.date():
-        if current_date in dates_with_entries:
-            streak += 1
-            current_date -= timedelta(days=1)
+    if challenge_data['type'] == 'count_period':
+        if day > _period_end(challenge_data, start):
+            return state
+        days = dict(state['days'])
+        if total is None:
+            days.pop(date_str, None)
         else:
-            # Если пропущен день, серия прерывается
-            break
+            days[date_str] = total
+        return {'days': days}
     
-    return streak
+    if challenge_data['type'] == 'daily_minimum':
+        # Дни раньше окна проверки уже никогда не понадобятся - заодно убираем их
+        window = _window_start(challenge_data, start, datetime.now().date()).isoformat()
+        days = [d for d in state['days'] if d >= window and d != date_str]
+        if date_str >= window and total is not None and total >= challenge_data['target']:
+            days.append(date_str)
+            days.sort()
+        return {'days': days}
+    
+    # streak
+    last = parse_date(state['last']) if state['last'] else None
+    length = state['length']
+    if total is not None:
+        if last is None or day > last + timedelta(days=1):
+            return {'last': date_str, 'length': 1}
+        if day == last + timedelta(days=1):
+            return {'last': date_str, 'length': length + 1}
+        if day == last - timedelta(days=length):
+            return None
+        return state
+    if last is None or day > last or day <= last - timedelta(days=length):
+        return state
+    if day == last:
+        return None
+    return {'last': state['last'], 'length': (last - day).days}
+
+def _current_state(user_id: int, user_challenge: Dict) -> Optional[Dict]:
+    """Последнее известное состояние челленджа с его версией (из памяти или сохранённое)"""
+    running = _states.get(user_id, {}).get(user_challenge.get('challengeId'))
+    if running is not None and running['startDate'] == user_challenge.get('startDate'):
+        return running
+    if user_challenge.get('state') is None:
+        return None
+    return {'startDate': user_challenge.get('startDate'), 'stateVersion': user_challenge.get('stateVersion'),
+            'state': user_challenge['state']}
+
+def _on_entries_changed(user_id: int, date_str: Optional[str]):
+    """Сдвинуть состояние начатых челленджей пользователя после изменения записей за дату"""
+    active = [c for c in get_user_challenges(user_id) if not c.get('completed', False)]
+    day = parse_date(date_str) if date_str else None
+    if date_str and day is None:
+        # Записи с неразбираемой датой в челленджах не учитываются
+        return
+    total = None
+    if day and range_days(user_id, day, day):
+        total = range_total(user_id, day, day)
+    
+    states = {}
+    for user_challenge in active:
+        challenge_data = get_challenge_by_id(user_challenge.get('challengeId'))
+        current = _current_state(user_id, user_challenge)
+        if not challenge_data or current is None:
+            continue
+        state = None
+        if day and current['state'] is not None:
+            start = datetime.strptime(user_challenge['startDate'], '%Y-%m-%d').date()
+            state = _advance_state(challenge_data, start, current['state'], day, total)
+        # None - сохранённое состояние устарело и соберётся заново при следующей проверке
+        states[user_challenge['challengeId']] = dict(current, state=state, stateVersion=None if state is None
+                                                     else current['stateVersion'])
+    if states:
+        _states[user_id] = states
+    else:
+        _states.pop(user_id, None)
+
+add_entry_listener(_on_entries_changed)
 
 def check_challenge_progress(user_id: int, challenge_id: str, user_challenge: Dict) -> Dict:
-    """Проверить прогресс по челленджу"""
+    """Проверить прогресс по челленджу (по сохранённому состоянию, без прохода по записям)"""
     challenge_data = get_challenge_by_id(challenge_id)
     if not challenge_data:
         return None
     
-    entries = get_entries(user_id)
-    start_date = datetime.strptime(user_challenge['startDate'], '%Y-%m-%d')
+    start_date = datetime.strptime(user_challenge['startDate'], '%Y-%m-%d').date()
     today = datetime.now().date()
     
+    version = _state_version(user_id)
+    current = _current_state(user_id, user_challenge)
+    if current is not None and current['stateVersion'] == version:
+        state = current['state']
+    else:
+        state = _build_state(user_id, challenge_data, start_date)
+        update_user_challenge(challenge_id, user_id, {'state': state, 'stateVersion': version})
+        user_challenge.update(state=state, stateVersion=version)
+        _states.setdefault(user_id, {})[challenge_id] = {
+            'startDate': user_challenge['startDate'], 'stateVersion': version, 'state': state}
+    
     if challenge_data['type'] == 'count_period':
-        # Подсчет крестиков за период
-        period_end = start_date + timedelta(days=challenge_data['period_days'])
-        period_entries = []
-        for entry in entries:
-            try:
-                entry_date = datetime.strptime(entry.get('date', ''), '%Y-%m-%d').date()
-                if start_date.date() <= entry_date <= min(period_end.date(), today):
-                    period_entries.append(entry)
-            except:
-                continue
-        
-        current = sum(e.get('count', 0) for e in period_entries)
+        # Подсчет крестиков за период: даты позже сегодняшней не учитываются
+        period_end = _period_end(challenge_data, start_date)
+        until = min(period_end, today).isoformat()
+        current = math.fsum(total for date_str, total in state['days'].items() if date_str <= until)
         progress = (current / challenge_data['target']) * 100 if challenge_data['target'] > 0 else 0
         completed = current >= challenge_data['target']
-        days_left = max(0, (period_end.date() - today).days)
+        days_left = max(0, (period_end - today).days)
         
         return {
             'current': current,
@@ -131,8 +238,15 @@ def check_challenge_progress(user_id: int, challenge_id: str, user_challenge: Di
         }
     
     elif challenge_data['type'] == 'streak':
-        # Проверка серии дней
-        current_streak = calculate_streak(entries, start_date)
+        # Серия, идущая до сегодня включительно
+        last = parse_date(state['last']) if state['last'] else None
+        if last is None or last < today:
+            current_streak = 0
+        elif last == today:
+            current_streak = state['length']
+        else:
+            # Есть записи на будущие даты - серию до сегодня берём из хранилища
+            current_streak = get_streak(user_id, start_date)['current']
         progress = (current_streak / challenge_data['target']) * 100 if challenge_data['target'] > 0 else 0
         completed = current_streak >= challenge_data['target']
         days_left = max(0, challenge_data['target'] - current_streak)
@@ -149,39 +263,24 @@ def check_challenge_progress(user_id: int, challenge_id: str, user_challenge: Di
     elif challenge_data['type'] == 'daily_minimum':
         # Проверка минимума каждый день (7 дней подряд с минимумом 300 крестиков)
         # Если в какой-то день меньше 300, последовательность обнуляется
-        days_with_entries = {}
-        
-        # Собираем количество крестиков по дням с момента начала челленджа
-        for entry in entries:
-            try:
-                entry_date = datetime.strptime(entry.get('date', ''), '%Y-%m-%d').date()
-                if start_date.date() <= entry_date <= today:
-                    if entry_date not in days_with_entries:
-                        days_with_entries[entry_date] = 0.0
-                    days_with_entries[entry_date] += float(entry.get('count', 0))
-            except:
-                continue
+        qualified = set(state['days'])
         
         # Ищем максимальную последовательность дней подряд с >= 300, идущую от сегодня назад
         days_completed = 0
         current_date = today
-        check_start_date = max(start_date.date(), today - timedelta(days=challenge_data['period_days'] * 2))
+        check_start_date = _window_start(challenge_data, start_date, today)
         
         # Идем от сегодня назад, считая последовательные дни с >= 300
         while current_date >= check_start_date:
-            # Проверяем, есть ли запись за этот день и достаточно ли крестиков
-            if current_date in days_with_entries and days_with_entries[current_date] >= challenge_data['target']:
+            if current_date.isoformat() in qualified:
                 days_completed += 1
                 if days_completed >= challenge_data['period_days']:
                     # Найдена последовательность из нужного количества дней
                     break
-                current_date -= timedelta(days=1)
-            else:
-                # День без достаточного количества крестиков - обнуляем счетчик
-                if days_completed > 0:
-                    # Если уже была последовательность, она прервалась
-                    days_completed = 0
-                current_date -= timedelta(days=1)
+            elif days_completed > 0:
+                # День без достаточного количества крестиков - последовательность прервалась
+                days_completed = 0
+            current_date -= timedelta(days=1)
         
         progress = (days_completed / challenge_data['period_days']) * 100 if challenge_data['period_days'] > 0 else 0
         completed = days_completed >= challenge_data['period_days']
@@ -198,4 +297,3 @@ def check_challenge_progress(user_id: int, challenge_id: str, user_challenge: Di
         }
     
     return None
-
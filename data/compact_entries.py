@@ -0,0 +1,436 @@
+"""Компактное хранение записей о крестиках в памяти: колонки-массивы по пользователям вместо словарей"""
+import threading
+from array import array
+from collections.abc import Mapping
+from datetime import date as date_type
+from typing import Dict, Iterator, List, Optional, Set
+from data.dates import date_ordinal
+from data.entry_index import hashtag_totals
+from data.entry_stats import EntryStats
+from data.range_sums import DayPrefixSums
+from data.streaks import DayRuns
+
+# Поля записи, которые раскладываются по колонкам; остальное (если встретится) лежит в extra
+_COLUMN_KEYS = ('id', 'date', 'count', 'userId', 'hashtag')
+
+# Интернированные хэштеги: id 0 - запись без хэштега
+_tag_names: List[Optional[str]] = [None]
+_tag_ids: Dict[str, int] = {}
+_tag_lock = threading.Lock()
+
+# Порядковый номер дня -> строка даты (дат немного, строки переиспользуются)
+_date_strings: Dict[int, str] = {}
+
+def _tag_id(hashtag: Optional[str], create: bool = True) -> Optional[int]:
+    """Номер хэштега (None, если его ещё не было и create=False)"""
+    if hashtag is None:
+        return 0
+    tag_id = _tag_ids.get(hashtag)
+    if tag_id is None and create:
+        with _tag_lock:
+            tag_id = _tag_ids.get(hashtag)
+            if tag_id is None:
+                _tag_names.append(hashtag)
+                tag_id = _tag_ids[hashtag] = len(_tag_names) - 1
+    return tag_id
+
+def _date_ordinal(value) -> int:
+    """Дата 'YYYY-MM-DD' -> порядковый номер дня; 0, если строка не в этом формате"""
+    try:
+        ordinal = date_type.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        return 0
+    # fromisoformat принимает и другие формы записи - храним только те, что восстанавливаются один в один
+    return ordinal if _date_string(ordinal) == value else 0
+
+def _date_string(ordinal: int) -> str:
+    """Порядковый номер дня -> 'YYYY-MM-DD'"""
+    value = _date_strings.get(ordinal)
+    if value is None:
+        value = _date_strings[ordinal] = date_type.fromordinal(ordinal).isoformat()
+    return value
+
+class _UserColumns:
+    """Записи одного пользователя по колонкам"""
+    __slots__ = ('dates', 'counts', 'tags', 'stamps', 'ints', 'extra')
+
+    def __init__(self):
+        self.dates = array('i')    # порядковый номер дня (0 - дата лежит строкой в extra)
+        self.counts = array('d')
+        self.tags = array('i')     # номер хэштега в _tag_names
+        self.stamps = array('q')   # метка времени из id вида '<дата>-<userId>-<метка>'
+        # Позиции, где count был целым числом: в JSON он возвращается целым, а не 5.0
+        self.ints: Optional[Set[int]] = None
+        # Позиция -> поля, которые не легли в колонки (нестандартный id или дата, лишние ключи)
+        self.extra: Optional[Dict[int, Dict]] = None
+
+    def append(self, user_id, entry: Dict):
+        extra = {key: value for key, value in entry.items() if key not in _COLUMN_KEYS}
+        date = entry.get('date')
+        ordinal = _date_ordinal(date)
+        if not ordinal:
+            extra['date'] = date
+        count = entry.get('count')
+        if type(count) is not float and type(count) is not int:
+            extra['count'] = count
+            count = 0.0
+        hashtag = entry.get('hashtag')
+        if hashtag is None and 'hashtag' in entry:
+            extra['hashtag'] = None
+        stamp = None
+        entry_id = entry.get('id')
+        if ordinal and isinstance(entry_id, str):
+            prefix, _, suffix = entry_id.rpartition('-')
+            if prefix == f"{date}-{user_id}" and suffix.isdigit() and suffix == str(int(suffix)):
+                stamp = int(suffix)
+        if stamp is None or stamp >= 2 ** 63:
+            stamp = 0
+            extra['id'] = entry_id
+        if extra:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[len(self.dates)] = extra
+        if type(count) is int:
+            if self.ints is None:
+                self.ints = set()
+            self.ints.add(len(self.dates))
+        self.counts.append(count)
+        self.tags.append(_tag_id(hashtag))
+        self.stamps.append(stamp)
+        # dates дописываем последней: читатели берут число записей по ней
+        self.dates.append(ordinal)
+
+    def kept(self, positions: List[int]) -> '_UserColumns':
+        """Новые колонки только с записями на указанных позициях (старые остаются целыми для читателей)"""
+        columns = _UserColumns()
+        columns.dates = array('i', (self.dates[i] for i in positions))
+        columns.counts = array('d', (self.counts[i] for i in positions))
+        columns.tags = array('i', (self.tags[i] for i in positions))
+        columns.stamps = array('q', (self.stamps[i] for i in positions))
+        if self.extra:
+            columns.extra = {new: self.extra[old] for new, old in enumerate(positions) if old in self.extra} or None
+        if self.ints:
+            columns.ints = {new for new, old in enumerate(positions) if old in self.ints} or None
+        return columns
+
+class EntryView(Mapping):
+    """Запись из компактного хранилища, которая ведёт себя как словарь.
+
+    Изменять можно count (пишется прямо в колонку); копия для отдачи наружу - dict(view).
+    """
+    __slots__ = ('_user_id', '_columns', '_pos')
+
+    def __init__(self, user_id, columns: _UserColumns, pos: int):
+        self._user_id = user_id
+        self._columns = columns
+        self._pos = pos
+
+    def _extra(self) -> Dict:
+        extra = self._columns.extra
+        return extra.get(self._pos, {}) if extra else {}
+
+    def __getitem__(self, key):
+        extra = self._extra()
+        if key in extra:
+            return extra[key]
+        columns, pos = self._columns, self._pos
+        if key == 'date':
+            return _date_string(columns.dates[pos])
+        if key == 'count':
+            if columns.ints and pos in columns.ints:
+                return int(columns.counts[pos])
+            return columns.counts[pos]
+        if key == 'userId':
+            return self._user_id
+        if key == 'hashtag':
+            hashtag = _tag_names[columns.tags[pos]]
+            if hashtag is not None:
+                return hashtag
+        if key == 'id':
+            return f"{_date_string(columns.dates[pos])}-{self._user_id}-{columns.stamps[pos]}"
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key != 'count' or (type(value) is not float and type(value) is not int):
+            raise TypeError(f"В компактном хранилище можно изменить только числовой count, а не {key}")
+        columns = self._columns
+        columns.counts[self._pos] = value
+        if type(value) is int:
+            if columns.ints is None:
+                columns.ints = set()
+            columns.ints.add(self._pos)
+        elif columns.ints:
+            columns.ints.discard(self._pos)
+        extra = self._extra()
+        extra.pop('count', None)
+
+    def __iter__(self) -> Iterator[str]:
+        extra = self._extra()
+        for key in _COLUMN_KEYS:
+            if key in extra or key != 'hashtag' or self._columns.tags[self._pos]:
+                yield key
+        for key in extra:
+            if key not in _COLUMN_KEYS:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+class CompactEntries:
+    """Все записи файла в колонках по пользователям.
+
+    Снаружи выглядит как список записей (итерация, len, append), а заодно служит
+    индексом с тем же интерфейсом, что EntryIndex: записи пользователя хранятся рядом,
+    поиск по дате и хэштегу - проход по числовым массивам одного пользователя.
+    Записи отдаются как EntryView; порядок - по пользователям, внутри пользователя - порядок добавления.
+    """
+
+    def __init__(self, entries=()):
+        self._users: Dict[object, _UserColumns] = {}
+        self._size = 0
+        # Сводная статистика, накопленные суммы по дням ({хэштег или None: суммы}) и серии дней
+        # пользователей, которые уже запрашивали; обновляются по одному дню при изменении записей
+        self._stats: Dict[object, EntryStats] = {}
+        self._sums: Dict[object, Dict[Optional[str], DayPrefixSums]] = {}
+        self._streaks: Dict[object, DayRuns] = {}
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[EntryView]:
+        for user_id, columns in list(self._users.items()):
+            for pos in range(len(columns.dates)):
+                yield EntryView(user_id, columns, pos)
+
+    def append(self, entry: Dict):
+        """Добавить запись (словарь или EntryView)"""
+        user_id = entry.get('userId')
+        columns = self._users.get(user_id)
+        if columns is None:
+            columns = self._users[user_id] = _UserColumns()
+        columns.append(user_id, entry)
+        self._size += 1
+        if self._tracked(user_id):
+            self._refresh_day(user_id, entry.get('date'))
+
+    add = append
+
+    def to_list(self) -> List[Dict]:
+        """Записи обычными словарями (для записи в JSON)"""
+        return [dict(entry) for entry in self]
+
+    @staticmethod
+    def _views(user_id, columns: _UserColumns, positions) -> List[EntryView]:
+        return [EntryView(user_id, columns, pos) for pos in positions]
+
+    def find(self, user_id: int, date: str, hashtag: Optional[str]) -> Optional[EntryView]:
+        """Запись пользователя за дату с таким хэштегом"""
+        columns = self._users.get(user_id)
+        tag = _tag_id(hashtag, create=False)
+        if columns is None or tag is None:
+            return None
+        for pos in self._date_positions(columns, date):
+            if columns.tags[pos] == tag:
+                return EntryView(user_id, columns, pos)
+        return None
+
+    def for_user(self, user_id: int) -> List[EntryView]:
+        """Все записи пользователя"""
+        columns = self._users.get(user_id)
+        return self._views(user_id, columns, range(len(columns.dates))) if columns else []
+
+    def counts_by_user(self) -> Dict[object, int]:
+        """Число записей у каждого пользователя"""
+        return {user_id: len(columns.dates) for user_id, columns in self._users.items() if len(columns.dates)}
+
+    def for_date(self, user_id: int, date: str) -> List[EntryView]:
+        """Записи пользователя за дату"""
+        columns = self._users.get(user_id)
+        if columns is None:
+            return []
+        return self._views(user_id, columns, self._date_positions(columns, date))
+
+    def for_hashtag(self, user_id: int, hashtag: Optional[str]) -> List[EntryView]:
+        """Записи пользователя с хэштегом"""
+        columns = self._users.get(user_id)
+        tag = _tag_id(hashtag, create=False)
+        if columns is None or tag is None:
+            return []
+        return self._views(user_id, columns, [pos for pos, entry_tag in enumerate(columns.tags) if entry_tag == tag])
+
+    def hashtags(self, user_id: int) -> List[str]:
+        """Непустые хэштеги из записей пользователя"""
+        columns = self._users.get(user_id)
+        if columns is None:
+            return []
+        return [_tag_names[tag] for tag in set(columns.tags) if _tag_names[tag]]
+
+    def hashtag_summary(self, user_id: int) -> Dict[str, Dict]:
+        """Итоги пользователя по хэштегам записей - по накопленным суммам и колонке хэштегов"""
+        columns = self._users.get(user_id)
+        if columns is None:
+            return {}
+        return {_tag_names[tag]: hashtag_totals(self._get_sums(user_id, _tag_names[tag]), columns.tags.count(tag))
+                for tag in set(columns.tags) if _tag_names[tag]}
+
+    def set_count(self, entry: EntryView, count: float):
+        """Изменить количество крестиков в записи"""
+        entry['count'] = count
+        if self._tracked(entry['userId']):
+            self._refresh_day(entry['userId'], entry['date'])
+
+    @staticmethod
+    def _dates(columns: _UserColumns) -> Iterator[str]:
+        """Даты записей строками (нестандартные берутся из extra)"""
+        extra = columns.extra or {}
+        for pos, day in enumerate(columns.dates):
+            yield _date_string(day) if day else extra[pos]['date']
+
+    def daily_totals(self, user_id: int, hashtag: Optional[str] = None) -> Dict[str, float]:
+        """Сумма крестиков пользователя по дням (по всем хэштегам или по одному)"""
+        columns = self._users.get(user_id)
+        tag = _tag_id(hashtag, create=False) if hashtag is not None else None
+        if columns is None or (hashtag is not None and tag is None):
+            return {}
+        totals: Dict[str, float] = {}
+        for date, count, entry_tag in zip(self._dates(columns), columns.counts, columns.tags):
+            if tag is None or entry_tag == tag:
+                totals[date] = totals.get(date, 0.0) + count
+        return totals
+
+    def daily_hashtag_totals(self, user_id: int) -> Dict[str, Dict[Optional[str], float]]:
+        """Сумма крестиков пользователя по дням с разбивкой по хэштегам (None - без хэштега)"""
+        columns = self._users.get(user_id)
+        if columns is None:
+            return {}
+        totals: Dict[str, Dict[Optional[str], float]] = {}
+        for date, count, tag in zip(self._dates(columns), columns.counts, columns.tags):
+            day = totals.setdefault(date, {})
+            hashtag = _tag_names[tag]
+            day[hashtag] = day.get(hashtag, 0.0) + count
+        return totals
+
+    def stats(self, user_id) -> EntryStats:
+        """Сводная статистика пользователя (при первом обращении собирается проходом по колонкам)"""
+        stats = self._stats.get(user_id)
+        if stats is None:
+            columns = self._users.get(user_id)
+            days: Dict[str, List[float]] = {}
+            if columns is not None:
+                for date, count in zip(self._dates(columns), columns.counts):
+                    day = days.get(date)
+                    if day is None:
+                        days[date] = [count, count]
+                    else:
+                        day[0] += count
+                        day[1] = max(day[1], count)
+            stats = EntryStats()
+            for date, (total, best) in days.items():
+                stats.set_day(date, total, best)
+            self._stats[user_id] = stats
+        return stats
+
+    def first_entry(self, user_id, match) -> Optional[str]:
+        """Дата первой по порядку в файле записи пользователя, для которой match(date, count) истинно"""
+        columns = self._users.get(user_id)
+        if columns is not None:
+            for date, count in zip(self._dates(columns), columns.counts):
+                if match(date, count):
+                    return date
+        return None
+
+    def reset_stats(self, user_id=None):
+        """Сбросить сводную статистику (пользователя или всех) - при следующем запросе она соберётся заново"""
+        if user_id is None:
+            self._stats.clear()
+        else:
+            self._stats.pop(user_id, None)
+
+    def range_total(self, user_id, start: Optional[str] = None, end: Optional[str] = None,
+                    hashtag: Optional[str] = None) -> float:
+        """Сумма крестиков пользователя за даты start <= date <= end (по всем хэштегам или по одному)"""
+        return self._get_sums(user_id, hashtag).total(start, end)
+
+    def range_days(self, user_id, start: Optional[str] = None, end: Optional[str] = None,
+                   hashtag: Optional[str] = None) -> int:
+        """Число дней с записями пользователя в интервале дат"""
+        return self._get_sums(user_id, hashtag).days(start, end)
+
+    def _get_sums(self, user_id, hashtag: Optional[str]) -> DayPrefixSums:
+        user_sums = self._sums.setdefault(user_id, {})
+        sums = user_sums.get(hashtag)
+        if sums is None:
+            sums = user_sums[hashtag] = DayPrefixSums(self.daily_totals(user_id, hashtag))
+        return sums
+
+    def streak(self, user_id, today: int, start: Optional[int] = None) -> Dict[str, int]:
+        """Текущая серия дней подряд до дня today (не раньше start) и самая длинная серия пользователя"""
+        streaks = self._streaks.get(user_id)
+        if streaks is None:
+            columns = self._users.get(user_id)
+            dates = set(self._dates(columns)) if columns else ()
+            streaks = self._streaks[user_id] = DayRuns(day for day in map(date_ordinal, dates) if day)
+        return {'current': streaks.current(today, start), 'longest': streaks.longest}
+
+    def _tracked(self, user_id) -> bool:
+        """Есть ли у пользователя построенные статистика, суммы или серии, которые надо обновлять"""
+        return user_id in self._stats or user_id in self._sums or user_id in self._streaks
+
+    def _refresh_day(self, user_id, date: str):
+        """Пересчитать день пользователя в статистике и накопленных суммах"""
+        columns = self._users.get(user_id)
+        positions = self._date_positions(columns, date) if columns else []
+        total = 0.0
+        by_tag: Dict[int, float] = {}
+        for pos in positions:
+            count, tag = columns.counts[pos], columns.tags[pos]
+            total += count
+            by_tag[tag] = by_tag.get(tag, 0.0) + count
+        if user_id in self._stats:
+            best = max((columns.counts[pos] for pos in positions), default=0.0)
+            self._stats[user_id].set_day(date, total if positions else None, best)
+        for hashtag, sums in self._sums.get(user_id, {}).items():
+            if hashtag is None:
+                sums.set_day(date, total if positions else None)
+            else:
+                sums.set_day(date, by_tag.get(_tag_id(hashtag, create=False)))
+        streaks = self._streaks.get(user_id)
+        if streaks is not None and date_ordinal(date):
+            if positions:
+                streaks.add(date_ordinal(date))
+            else:
+                streaks.remove(date_ordinal(date))
+
+    @staticmethod
+    def _date_positions(columns: _UserColumns, date: str) -> List[int]:
+        """Позиции записей за дату: проход по числовой колонке, для нестандартных дат - по extra"""
+        ordinal = _date_ordinal(date)
+        if ordinal:
+            return [pos for pos, day in enumerate(columns.dates) if day == ordinal]
+        return sorted(pos for pos, extra in (columns.extra or {}).items() if 'date' in extra and extra['date'] == date)
+
+    def delete_day(self, user_id: int, date: str):
+        """Удалить записи пользователя за дату"""
+        columns = self._users.get(user_id)
+        if columns is None:
+            return
+        removed = set(self._date_positions(columns, date))
+        if removed:
+            self._users[user_id] = columns.kept([pos for pos in range(len(columns.dates)) if pos not in removed])
+            self._size -= len(removed)
+            if self._tracked(user_id):
+                self._refresh_day(user_id, date)
+
+    def delete_user(self, user_id: int):
+        """Удалить все записи пользователя"""
+        columns = self._users.pop(user_id, None)
+        self._stats.pop(user_id, None)
+        self._sums.pop(user_id, None)
+        self._streaks.pop(user_id, None)
+        if columns is not None:
+            self._size -= len(columns.dates)
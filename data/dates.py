@@ -0,0 +1,30 @@
+"""Разбор дат записей 'YYYY-MM-DD' с кэшем: каждая строка даты разбирается один раз на процесс"""
+from datetime import date, datetime
+from typing import Dict, Optional
+
+# Дат в данных немного (по одной на день), поэтому кэш маленький; на случай мусора в данных он ограничен
+_DATE_CACHE_MAX = 100_000
+
+_parsed: Dict[str, Optional[date]] = {}
+
+def parse_date(value) -> Optional[date]:
+    """'YYYY-MM-DD' -> date (None, если строка не разбирается) - как datetime.strptime, но с кэшем"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return _parsed[value]
+    except KeyError:
+        pass
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        parsed = None
+    if len(_parsed) >= _DATE_CACHE_MAX:
+        _parsed.clear()
+    _parsed[value] = parsed
+    return parsed
+
+def date_ordinal(value) -> int:
+    """'YYYY-MM-DD' -> порядковый номер дня (date.toordinal); 0, если строка не разбирается"""
+    parsed = parse_date(value)
+    return parsed.toordinal() if parsed else 0
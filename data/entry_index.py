@@ -0,0 +1,273 @@
+"""Вторичные индексы записей о крестиках: по (userId, date) и (userId, hashtag), плюс суммы по дням, накопленные суммы и сводная статистика"""
+from typing import Dict, List, Optional, Tuple
+from data.dates import date_ordinal
+from data.entry_stats import EntryStats
+from data.range_sums import DayPrefixSums
+from data.streaks import DayRuns
+
+def _count(entry: Dict) -> float:
+    """Количество крестиков в записи (0, если оно не число)"""
+    try:
+        return float(entry.get('count', 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+def hashtag_totals(sums: DayPrefixSums, entries: int) -> Dict:
+    """Итоги хэштега по его накопленным суммам: сумма, число записей, число дней, первая и последняя дата"""
+    return {
+        'total': sums.total(),
+        'entries': entries,
+        'days': sums.days(),
+        'first_date': sums.dates[0] if sums.dates else None,
+        'last_date': sums.dates[-1] if sums.dates else None,
+    }
+
+class _UserEntries:
+    """Записи одного пользователя, индексы и суммы по дням"""
+    __slots__ = ('entries', 'by_key', 'by_date', 'by_hashtag', 'daily', 'daily_hashtags', 'stats', 'sums', 'streaks')
+
+    def __init__(self):
+        self.entries: List[Dict] = []
+        # (date, hashtag) -> запись; у пользователя одна запись на дату и хэштег
+        self.by_key: Dict[Tuple[str, Optional[str]], Dict] = {}
+        self.by_date: Dict[str, List[Dict]] = {}
+        self.by_hashtag: Dict[Optional[str], List[Dict]] = {}
+        # date -> сумма за день; date -> {хэштег: сумма}
+        self.daily: Dict[str, float] = {}
+        self.daily_hashtags: Dict[str, Dict[Optional[str], float]] = {}
+        # Сводная статистика - строится при первом запросе, дальше обновляется вместе с суммами по дням
+        self.stats: Optional[EntryStats] = None
+        # Накопленные суммы по дням: None - по всем записям, строка - по хэштегу (строятся при первом запросе)
+        self.sums: Dict[Optional[str], DayPrefixSums] = {}
+        # Серии дней подряд с записями (строятся при первом запросе)
+        self.streaks: Optional[DayRuns] = None
+
+    def add(self, entry: Dict):
+        date, hashtag = entry.get('date'), entry.get('hashtag')
+        self.entries.append(entry)
+        # Если в файле всё же оказались дубли, поиск находит первую запись - как линейный поиск
+        self.by_key.setdefault((date, hashtag), entry)
+        self.by_date.setdefault(date, []).append(entry)
+        self.by_hashtag.setdefault(hashtag, []).append(entry)
+        self.refresh_day(date)
+
+    def refresh_day(self, date: str):
+        """Пересчитать суммы за день по его записям (их за день единицы)"""
+        items = self.by_date.get(date)
+        if not items:
+            self.daily.pop(date, None)
+            self.daily_hashtags.pop(date, None)
+            if self.stats is not None:
+                self.stats.set_day(date, None)
+            self._update_sums(date, None, {})
+            if self.streaks is not None and date_ordinal(date):
+                self.streaks.remove(date_ordinal(date))
+            return
+        # Складываем заново, а не прибавляем разницу, чтобы не копить ошибку округления
+        total = 0.0
+        by_hashtag: Dict[Optional[str], float] = {}
+        for entry in items:
+            count = _count(entry)
+            total += count
+            hashtag = entry.get('hashtag')
+            by_hashtag[hashtag] = by_hashtag.get(hashtag, 0.0) + count
+        self.daily[date] = total
+        self.daily_hashtags[date] = by_hashtag
+        if self.stats is not None:
+            self.stats.set_day(date, total, self.day_best(date))
+        self._update_sums(date, total, by_hashtag)
+        if self.streaks is not None and date_ordinal(date):
+            self.streaks.add(date_ordinal(date))
+
+    def _update_sums(self, date: str, total: Optional[float], by_hashtag: Dict[Optional[str], float]):
+        """Обновить накопленные суммы (по всем записям и по хэштегам)"""
+        for hashtag, sums in self.sums.items():
+            sums.set_day(date, total if hashtag is None else by_hashtag.get(hashtag))
+
+    def get_sums(self, hashtag: Optional[str]) -> DayPrefixSums:
+        """Накопленные суммы по дням (по всем записям или по хэштегу)"""
+        sums = self.sums.get(hashtag)
+        if sums is None:
+            if hashtag is None:
+                totals = self.daily
+            else:
+                totals = {date: tags[hashtag] for date, tags in self.daily_hashtags.items() if hashtag in tags}
+            sums = self.sums[hashtag] = DayPrefixSums(totals)
+        return sums
+
+    def day_best(self, date: str) -> float:
+        """Самая большая запись за день"""
+        return max(map(_count, self.by_date.get(date, ())), default=0.0)
+
+    def get_streaks(self) -> DayRuns:
+        """Серии дней подряд (при первом обращении собираются по дням с записями)"""
+        if self.streaks is None:
+            self.streaks = DayRuns(day for day in map(date_ordinal, self.daily) if day)
+        return self.streaks
+
+    def get_stats(self) -> EntryStats:
+        """Сводная статистика (при первом обращении собирается по суммам за дни)"""
+        if self.stats is None:
+            stats = EntryStats()
+            for date, total in self.daily.items():
+                stats.set_day(date, total, self.day_best(date))
+            self.stats = stats
+        return self.stats
+
+class EntryIndex:
+    """Индексы по списку записей одного файла.
+
+    Хранит ссылки на элементы исходного списка (source), поэтому после замены
+    списка индекс нужно перестроить или обновить через replace_user.
+    """
+
+    def __init__(self, entries: List[Dict]):
+        self.source = entries
+        self._users: Dict[int, _UserEntries] = {}
+        for entry in entries:
+            self.add(entry)
+
+    def _user(self, user_id: int) -> _UserEntries:
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserEntries()
+        return user
+
+    def add(self, entry: Dict):
+        """Добавить запись в индекс (сама запись уже добавлена в source)"""
+        self._user(entry.get('userId')).add(entry)
+
+    def find(self, user_id: int, date: str, hashtag: Optional[str]) -> Optional[Dict]:
+        """Запись пользователя за дату с таким хэштегом"""
+        user = self._users.get(user_id)
+        return user.by_key.get((date, hashtag)) if user else None
+
+    def set_count(self, entry: Dict, count: float):
+        """Изменить количество крестиков в записи и пересчитать сумму за её день"""
+        entry['count'] = count
+        user = self._users.get(entry.get('userId'))
+        if user is not None:
+            user.refresh_day(entry.get('date'))
+
+    def for_user(self, user_id: int) -> List[Dict]:
+        """Все записи пользователя в порядке файла"""
+        user = self._users.get(user_id)
+        return user.entries if user else []
+
+    def counts_by_user(self) -> Dict[int, int]:
+        """Число записей у каждого пользователя"""
+        return {user_id: len(user.entries) for user_id, user in self._users.items() if user.entries}
+
+    def for_date(self, user_id: int, date: str) -> List[Dict]:
+        """Записи пользователя за дату"""
+        user = self._users.get(user_id)
+        return user.by_date.get(date, []) if user else []
+
+    def for_hashtag(self, user_id: int, hashtag: Optional[str]) -> List[Dict]:
+        """Записи пользователя с хэштегом"""
+        user = self._users.get(user_id)
+        return user.by_hashtag.get(hashtag, []) if user else []
+
+    def hashtags(self, user_id: int) -> List[str]:
+        """Непустые хэштеги из записей пользователя"""
+        user = self._users.get(user_id)
+        return [h for h, items in user.by_hashtag.items() if h and items] if user else []
+
+    def hashtag_summary(self, user_id: int) -> Dict[str, Dict]:
+        """Итоги пользователя по хэштегам записей - по накопленным суммам, без прохода по записям"""
+        user = self._users.get(user_id)
+        if user is None:
+            return {}
+        return {hashtag: hashtag_totals(user.get_sums(hashtag), len(items))
+                for hashtag, items in user.by_hashtag.items() if hashtag and items}
+
+    def daily_totals(self, user_id: int, hashtag: Optional[str] = None) -> Dict[str, float]:
+        """Сумма крестиков пользователя по дням (по всем хэштегам или по одному)"""
+        user = self._users.get(user_id)
+        if user is None:
+            return {}
+        if hashtag is None:
+            return dict(user.daily)
+        return {date: tags[hashtag] for date, tags in user.daily_hashtags.items() if hashtag in tags}
+
+    def daily_hashtag_totals(self, user_id: int) -> Dict[str, Dict[Optional[str], float]]:
+        """Сумма крестиков пользователя по дням с разбивкой по хэштегам (None - без хэштега)"""
+        user = self._users.get(user_id)
+        return {date: dict(tags) for date, tags in user.daily_hashtags.items()} if user else {}
+
+    def range_total(self, user_id: int, start: Optional[str] = None, end: Optional[str] = None,
+                    hashtag: Optional[str] = None) -> float:
+        """Сумма крестиков пользователя за даты start <= date <= end (по всем хэштегам или по одному)"""
+        user = self._users.get(user_id)
+        return user.get_sums(hashtag).total(start, end) if user else 0.0
+
+    def range_days(self, user_id: int, start: Optional[str] = None, end: Optional[str] = None,
+                   hashtag: Optional[str] = None) -> int:
+        """Число дней с записями пользователя в интервале дат"""
+        user = self._users.get(user_id)
+        return user.get_sums(hashtag).days(start, end) if user else 0
+
+    def streak(self, user_id: int, today: int, start: Optional[int] = None) -> Dict[str, int]:
+        """Текущая серия дней подряд до дня today (не раньше start) и самая длинная серия пользователя"""
+        user = self._users.get(user_id)
+        if user is None:
+            return {'current': 0, 'longest': 0}
+        streaks = user.get_streaks()
+        return {'current': streaks.current(today, start), 'longest': streaks.longest}
+
+    def stats(self, user_id: int) -> EntryStats:
+        """Сводная статистика пользователя (обновляется вместе с индексом)"""
+        user = self._users.get(user_id)
+        return user.get_stats() if user else EntryStats()
+
+    def first_entry(self, user_id: int, match) -> Optional[str]:
+        """Дата первой по порядку в файле записи пользователя, для которой match(date, count) истинно"""
+        user = self._users.get(user_id)
+        for entry in user.entries if user else ():
+            if match(entry.get('date'), _count(entry)):
+                return entry.get('date')
+        return None
+
+    def reset_stats(self, user_id: Optional[int] = None):
+        """Сбросить сводную статистику (пользователя или всех) - при следующем запросе она соберётся заново"""
+        for uid, user in self._users.items():
+            if user_id is None or uid == user_id:
+                user.stats = None
+
+    def delete_day(self, user_id: int, date: str):
+        """Убрать из индекса записи пользователя за дату"""
+        user = self._users.get(user_id)
+        if not user or date not in user.by_date:
+            return
+        removed = user.by_date.pop(date)
+        user.refresh_day(date)
+        removed_ids = set(map(id, removed))
+        user.entries = [e for e in user.entries if id(e) not in removed_ids]
+        for entry in removed:
+            hashtag = entry.get('hashtag')
+            user.by_key.pop((date, hashtag), None)
+            items = [e for e in user.by_hashtag.get(hashtag, []) if id(e) not in removed_ids]
+            if items:
+                user.by_hashtag[hashtag] = items
+            else:
+                user.by_hashtag.pop(hashtag, None)
+
+    def delete_user(self, user_id: int):
+        """Убрать из индекса все записи пользователя"""
+        self._users.pop(user_id, None)
+
+    def replace_user(self, user_id: int, entries: List[Dict], source: List[Dict]):
+        """Заменить записи пользователя после перезаписи файла новым списком source"""
+        self.source = source
+        old = self._users.pop(user_id, None)
+        for entry in entries:
+            self.add(entry)
+        user = self._users.get(user_id)
+        if old is not None and (old.stats is not None or old.sums or old.streaks is not None) and user is not None:
+            # Переносим статистику, накопленные суммы и серии и поправляем в них только дни, сумма за которые изменилась
+            user.stats = old.stats
+            user.sums = old.sums
+            user.streaks = old.streaks
+            for date in set(old.daily) | set(user.daily):
+                if old.daily.get(date) != user.daily.get(date):
+                    user.refresh_day(date)
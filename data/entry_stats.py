@@ -0,0 +1,143 @@
+"""Сводная статистика пользователя по записям о крестиках, обновляемая по одному дню"""
+import math
+from datetime import date as date_type, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from data.dates import parse_date
+
+# Поиск первой по порядку в файле записи, для которой match(date, count) истинно; возвращает её дату
+FirstEntry = Callable[[Callable[[str, float], bool]], Optional[str]]
+
+def _day_keys(date) -> Optional[Tuple[str, int]]:
+    """Месяц 'YYYY-MM' и день недели даты (None, если дата не разбирается; разбор кэшируется в data.dates)"""
+    parsed = parse_date(date)
+    return (f"{parsed.year}-{parsed.month:02d}", parsed.weekday()) if parsed else None
+
+class _ExactSum:
+    """Сумма, в которую можно добавлять и из которой можно вычитать без накопления ошибки округления"""
+    __slots__ = ('partials', 'days')
+
+    def __init__(self):
+        # Неперекрывающиеся частичные суммы (как в math.fsum) и число дней, вошедших в сумму
+        self.partials: List[float] = []
+        self.days = 0
+
+    def add(self, value: float):
+        partials = self.partials
+        i = 0
+        for partial in partials:
+            if abs(value) < abs(partial):
+                value, partial = partial, value
+            high = value + partial
+            low = partial - (high - value)
+            if low:
+                partials[i] = low
+                i += 1
+            value = high
+        partials[i:] = [value]
+
+    @property
+    def value(self) -> float:
+        return math.fsum(self.partials)
+
+class EntryStats:
+    """Итоги пользователя: всего, по месяцам, по дням недели, число дней с записями и лучшая запись.
+
+    Обновляется через set_day, когда меняются записи одного дня, - стоимость не зависит от длины истории.
+    Записи с датой не в формате 'YYYY-MM-DD' в статистику не входят.
+    """
+
+    def __init__(self):
+        # Дата -> (сумма за день, самая большая запись дня)
+        self._days: Dict[str, Tuple[float, float]] = {}
+        self._total = _ExactSum()
+        self._months: Dict[str, _ExactSum] = {}
+        self._weekdays: Dict[int, _ExactSum] = {}
+        self._best_count = 0.0
+        self._best_date: Optional[str] = None
+
+    def set_day(self, date: str, total: Optional[float], best: float = 0.0):
+        """Записать итоги дня: сумму и самую большую запись (total=None - записей за день не осталось)"""
+        keys = _day_keys(date)
+        if keys is None:
+            return
+        month, weekday = keys
+        old = self._days.pop(date, None)
+        if old is not None:
+            self._add(month, weekday, -old[0], -1)
+        if total is not None:
+            self._days[date] = (total, best)
+            self._add(month, weekday, total, 1)
+
+        if total is not None and best > self._best_count:
+            self._best_count, self._best_date = best, date
+        elif date == self._best_date and (total is None or best < self._best_count):
+            # Рекордную запись уменьшили или удалили - ищем новый рекорд среди дней
+            self._best_count, self._best_date = 0.0, None
+            for day, (_, day_best) in sorted(self._days.items()):
+                if day_best > self._best_count:
+                    self._best_count, self._best_date = day_best, day
+
+    def _add(self, month: str, weekday: int, value: float, days: int):
+        self._total.add(value)
+        for sums, key in ((self._months, month), (self._weekdays, weekday)):
+            item = sums.get(key)
+            if item is None:
+                item = sums[key] = _ExactSum()
+            item.add(value)
+            item.days += days
+            if not item.days:
+                del sums[key]
+
+    def summary(self, today: Optional[date_type] = None, first_entry: Optional[FirstEntry] = None) -> Dict:
+        """Показатели для экрана статистики на дату today (по умолчанию - сегодня).
+
+        first_entry нужен при равенстве рекордов: как и раньше, побеждает то, что раньше встречается в записях.
+        """
+        today = today or datetime.now().date()
+        month_key = f"{today.year}-{today.month:02d}"
+        year_key = f"{today.year}-01"
+        months = {month: item.value for month, item in self._months.items()}
+        weekdays = {weekday: item.value for weekday, item in self._weekdays.items()}
+        total = self._total.value
+        days = len(self._days)
+        today_total = self._days.get(today.strftime('%Y-%m-%d'))
+
+        best_day = None
+        if self._best_date:
+            days_best = [day for day, (_, day_best) in self._days.items() if day_best == self._best_count]
+            best_day = (self._best_count, _first_of(days_best, lambda day: day, first_entry, self._best_count))
+        best_month = _best_of(months, 0, first_entry)
+        best_weekday = _best_of(weekdays, 1, first_entry)
+        return {
+            'today': today_total[0] if today_total else 0,
+            # Как и раньше, в месяц и год попадают и записи на будущие даты
+            'month': math.fsum(value for month, value in months.items() if month >= month_key),
+            'year': math.fsum(value for month, value in months.items() if month >= year_key),
+            'total': total,
+            'days': days,
+            'average': total // days if days > 0 else 0,
+            'best_day': best_day,
+            'best_month': best_month,
+            'best_weekday': best_weekday,
+        }
+
+def _first_of(candidates: List, key: Callable[[str], object], first_entry: Optional[FirstEntry],
+              best: Optional[float] = None):
+    """Из равных рекордов - тот, что раньше встречается в записях (с числом best, если оно задано).
+
+    key: дата записи -> рекорд, к которому она относится.
+    """
+    if len(candidates) > 1 and first_entry is not None:
+        wanted = set(candidates)
+        date = first_entry(lambda date, count: key(date) in wanted and (best is None or count == best))
+        if date is not None:
+            return key(date)
+    return min(candidates)
+
+def _best_of(sums: Dict, part: int, first_entry: Optional[FirstEntry]) -> Optional[Tuple]:
+    """Лучший месяц (part=0) или день недели (part=1) по суммам"""
+    if not sums:
+        return None
+    best = max(sums.values())
+    candidates = [key for key, value in sums.items() if value == best]
+    return _first_of(candidates, lambda date: (_day_keys(date) or (None, None))[part], first_entry), best
@@ -0,0 +1,85 @@
+"""Блокировки файлов хранилища для безопасного чтения-изменения-записи"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# Дополнительно брать межпроцессную блокировку (<файл>.lock) - нужно, если с данными работают несколько процессов
+STORAGE_FILE_LOCKS = os.getenv('STORAGE_FILE_LOCKS', 'false').lower() == 'true'
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+class _PathLock:
+    """Блокировка одного файла: RLock внутри процесса и (по желанию) advisory-блокировка между процессами"""
+    __slots__ = ('lock', 'depth', 'lock_file')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.lock_file = None
+
+_locks: Dict[str, _PathLock] = {}
+_locks_guard = threading.Lock()
+
+def _get_lock(filepath: str) -> _PathLock:
+    """Получить (или создать) блокировку для файла"""
+    with _locks_guard:
+        path_lock = _locks.get(filepath)
+        if path_lock is None:
+            path_lock = _locks[filepath] = _PathLock()
+        return path_lock
+
+def _acquire_file_lock(filepath: str):
+    """Взять межпроцессную блокировку на <файл>.lock (ждёт, пока её не отпустят)"""
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    lock_file = open(filepath + '.lock', 'a+b')
+    try:
+        if os.name == 'nt':
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK сдаётся примерно через 10 секунд - продолжаем ждать
+                    time.sleep(0.1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+    except BaseException:
+        lock_file.close()
+        raise
+    return lock_file
+
+def _release_file_lock(lock_file):
+    """Отпустить межпроцессную блокировку"""
+    try:
+        if os.name == 'nt':
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    finally:
+        lock_file.close()
+
+@contextmanager
+def locked(filepath: str):
+    """Монопольный доступ к файлу на время чтения-изменения-записи.
+
+    Блокировка повторно входимая: внутри можно снова брать блокировку того же файла.
+    """
+    path_lock = _get_lock(filepath)
+    with path_lock.lock:
+        if path_lock.depth == 0 and STORAGE_FILE_LOCKS:
+            path_lock.lock_file = _acquire_file_lock(filepath)
+        path_lock.depth += 1
+        try:
+            yield
+        finally:
+            path_lock.depth -= 1
+            if path_lock.depth == 0 and path_lock.lock_file is not None:
+                lock_file, path_lock.lock_file = path_lock.lock_file, None
+                _release_file_lock(lock_file)
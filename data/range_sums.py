@@ -0,0 +1,73 @@
+"""Накопленные суммы крестиков по дням: сумма за любой интервал дат - два бинарных поиска и вычитание"""
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+def _fixed(value: float) -> Tuple[int, int]:
+    """float -> (числитель, степень двойки знаменателя): любое конечное float - это m / 2^k"""
+    numerator, denominator = float(value).as_integer_ratio()
+    return numerator, denominator.bit_length() - 1
+
+class DayPrefixSums:
+    """Накопленные суммы по отсортированным датам.
+
+    Суммы хранятся точно - целыми числами с общим знаменателем 2^shift, поэтому разность двух
+    накопленных сумм не копит ошибку округления и равна math.fsum по интервалу.
+    Даты сравниваются как строки 'YYYY-MM-DD' (их порядок совпадает с порядком дней).
+    """
+    __slots__ = ('dates', '_prefix', '_shift')
+
+    def __init__(self, totals: Dict[str, float]):
+        # Записи без даты (или с датой не строкой) в интервалы не попадают
+        self.dates: List[str] = sorted(date for date in totals if isinstance(date, str))
+        values = [_fixed(totals[date]) for date in self.dates]
+        self._shift = max((shift for _, shift in values), default=0)
+        self._prefix = [0]
+        for numerator, shift in values:
+            self._prefix.append(self._prefix[-1] + (numerator << (self._shift - shift)))
+
+    def set_day(self, date: str, total: Optional[float]):
+        """Записать сумму дня (None - записей за день не осталось).
+
+        Последний день обновляется за O(1); день в середине истории - сдвигом накопленных сумм после него
+        (целые числа складываются точно, поэтому ошибка не копится).
+        """
+        if not isinstance(date, str):
+            return
+        value = 0
+        if total is not None:
+            numerator, shift = _fixed(total)
+            if shift > self._shift:
+                # Нужен более мелкий общий знаменатель - домножаем накопленные суммы
+                self._prefix = [item << (shift - self._shift) for item in self._prefix]
+                self._shift = shift
+            value = numerator << (self._shift - shift)
+        dates, prefix = self.dates, self._prefix
+        pos = bisect_left(dates, date)
+        if pos < len(dates) and dates[pos] == date:
+            delta = value - (prefix[pos + 1] - prefix[pos])
+            if total is None:
+                del dates[pos]
+                del prefix[pos + 1]
+        elif total is not None:
+            dates.insert(pos, date)
+            prefix.insert(pos + 1, prefix[pos])
+            delta = value
+        else:
+            return
+        if delta:
+            prefix[pos + 1:] = [item + delta for item in prefix[pos + 1:]]
+
+    def _bounds(self, start: Optional[str], end: Optional[str]) -> Tuple[int, int]:
+        lo = bisect_left(self.dates, start) if start is not None else 0
+        hi = bisect_right(self.dates, end) if end is not None else len(self.dates)
+        return lo, max(lo, hi)
+
+    def total(self, start: Optional[str] = None, end: Optional[str] = None) -> float:
+        """Сумма за даты start <= date <= end (None - без ограничения)"""
+        lo, hi = self._bounds(start, end)
+        return (self._prefix[hi] - self._prefix[lo]) / (1 << self._shift)
+
+    def days(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """Число дней с записями в интервале"""
+        lo, hi = self._bounds(start, end)
+        return hi - lo
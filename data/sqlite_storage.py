@@ -0,0 +1,670 @@
+"""SQLite-хранилище с тем же API, что и JSON-хранилище в data/storage.py"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date as date_type, datetime
+from typing import List, Dict, Optional
+from data.dates import date_ordinal
+from data.entry_index import hashtag_totals
+from data.entry_stats import EntryStats
+from data.range_sums import DayPrefixSums
+from data.streaks import DayRuns
+from data.subscription_index import SubscriptionIndex
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    hashtag TEXT NOT NULL DEFAULT '',
+    count REAL NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_user_date_hashtag ON entries (user_id, date, hashtag);
+CREATE INDEX IF NOT EXISTS idx_entries_user_hashtag ON entries (user_id, hashtag);
+
+-- Сумма крестиков пользователя за день; поддерживается триггерами на entries
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS projects (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT,
+    user_id INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_projects_user ON projects (user_id);
+CREATE INDEX IF NOT EXISTS idx_projects_id ON projects (id);
+
+CREATE TABLE IF NOT EXISTS wishlist (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT,
+    user_id INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_wishlist_user ON wishlist (user_id);
+
+CREATE TABLE IF NOT EXISTS notes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT,
+    user_id INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notes_user ON notes (user_id);
+CREATE INDEX IF NOT EXISTS idx_notes_id ON notes (id);
+
+CREATE TABLE IF NOT EXISTS plans (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT,
+    user_id INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plans_user ON plans (user_id);
+CREATE INDEX IF NOT EXISTS idx_plans_id ON plans (id);
+
+CREATE TABLE IF NOT EXISTS user_challenges (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT,
+    user_id INTEGER,
+    challenge_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_challenges_user ON user_challenges (user_id, challenge_id);
+
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL UNIQUE,
+    feedback_given INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Триггеры, которые поддерживают daily_totals (при массовом импорте снимаются, таблица пересобирается целиком).
+# Сумма пересчитывается заново в порядке добавления записей (как при сложении в Python), а не прибавлением разницы;
+# строка удаляется и вставляется явно: OR REPLACE внутри триггера перекрывается режимом внешнего запроса
+_DAILY_TOTALS_TRIGGERS = {
+    'trg_entries_insert_daily': """CREATE TRIGGER IF NOT EXISTS trg_entries_insert_daily AFTER INSERT ON entries BEGIN
+    DELETE FROM daily_totals WHERE user_id = NEW.user_id AND date = NEW.date;
+    INSERT INTO daily_totals (user_id, date, total)
+    SELECT NEW.user_id, NEW.date, SUM(count)
+    FROM (SELECT count FROM entries WHERE user_id = NEW.user_id AND date = NEW.date ORDER BY rowid);
+END
+""",
+    'trg_entries_update_daily': """CREATE TRIGGER IF NOT EXISTS trg_entries_update_daily AFTER UPDATE ON entries BEGIN
+    DELETE FROM daily_totals WHERE user_id = OLD.user_id AND date = OLD.date;
+    INSERT INTO daily_totals (user_id, date, total)
+    SELECT OLD.user_id, OLD.date,
+           (SELECT SUM(count) FROM (SELECT count FROM entries WHERE user_id = OLD.user_id AND date = OLD.date ORDER BY rowid))
+    WHERE EXISTS (SELECT 1 FROM entries WHERE user_id = OLD.user_id AND date = OLD.date);
+    DELETE FROM daily_totals WHERE user_id = NEW.user_id AND date = NEW.date;
+    INSERT INTO daily_totals (user_id, date, total)
+    SELECT NEW.user_id, NEW.date, SUM(count)
+    FROM (SELECT count FROM entries WHERE user_id = NEW.user_id AND date = NEW.date ORDER BY rowid);
+END
+""",
+    'trg_entries_delete_daily': """CREATE TRIGGER IF NOT EXISTS trg_entries_delete_daily AFTER DELETE ON entries BEGIN
+    DELETE FROM daily_totals WHERE user_id = OLD.user_id AND date = OLD.date;
+    INSERT INTO daily_totals (user_id, date, total)
+    SELECT OLD.user_id, OLD.date,
+           (SELECT SUM(count) FROM (SELECT count FROM entries WHERE user_id = OLD.user_id AND date = OLD.date ORDER BY rowid))
+    WHERE EXISTS (SELECT 1 FROM entries WHERE user_id = OLD.user_id AND date = OLD.date);
+END
+""",
+}
+
+# Коллекции, которые хранятся как JSON-документы с индексом по userId
+_DOCUMENT_TABLES = ('projects', 'wishlist', 'notes', 'plans', 'user_challenges')
+
+_conn: Optional[sqlite3.Connection] = None
+# Одно соединение на процесс, доступ к нему сериализуем
+_lock = threading.RLock()
+
+def init(db_path: str):
+    """Открыть базу и создать таблицы, если их нет"""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            return
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        has_daily_totals = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_totals'"
+        ).fetchone() is not None
+        conn.executescript(_SCHEMA)
+        with conn:
+            for trigger in _DAILY_TOTALS_TRIGGERS.values():
+                conn.execute(trigger)
+            if not has_daily_totals:
+                # База создана до появления daily_totals - заполняем по уже сохранённым записям
+                _rebuild_daily_totals(conn)
+        _conn = conn
+        logger.info(f"SQLite-хранилище открыто: {db_path}")
+
+def _rebuild_daily_totals(conn: sqlite3.Connection):
+    """Заново посчитать daily_totals по всем записям"""
+    conn.execute('DELETE FROM daily_totals')
+    conn.execute(
+        'INSERT INTO daily_totals (user_id, date, total) '
+        'SELECT user_id, date, SUM(count) '
+        'FROM (SELECT user_id, date, count FROM entries ORDER BY user_id, date, rowid) '
+        'GROUP BY user_id, date'
+    )
+
+def close():
+    """Закрыть соединение с базой"""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+def _execute(sql: str, params=()) -> sqlite3.Cursor:
+    with _lock, _conn:
+        return _conn.execute(sql, params)
+
+def _query(sql: str, params=()) -> List[sqlite3.Row]:
+    with _lock:
+        return _conn.execute(sql, params).fetchall()
+
+# === Общие операции для коллекций-документов ===
+def _get_documents(table: str, user_id: Optional[int] = None) -> List[Dict]:
+    if user_id:
+        rows = _query(f'SELECT data FROM {table} WHERE user_id = ? ORDER BY seq', (user_id,))
+    else:
+        rows = _query(f'SELECT data FROM {table} ORDER BY seq')
+    return [json.loads(row['data']) for row in rows]
+
+def _dumps(doc: Dict) -> str:
+    return json.dumps(doc, ensure_ascii=False)
+
+def _save_document(table: str, doc: Dict):
+    """Обновить документ с тем же id или добавить новый"""
+    with _lock, _conn:
+        cursor = _conn.execute(
+            f'UPDATE {table} SET user_id = ?, data = ? '
+            f'WHERE seq = (SELECT seq FROM {table} WHERE id = ? ORDER BY seq LIMIT 1)',
+            (doc.get('userId'), _dumps(doc), doc.get('id'))
+        )
+        if cursor.rowcount == 0:
+            _conn.execute(
+                f'INSERT INTO {table} (id, user_id, data) VALUES (?, ?, ?)',
+                (doc.get('id'), doc.get('userId'), _dumps(doc))
+            )
+
+def _update_document(table: str, where: str, params: tuple, updates: Dict) -> bool:
+    """Обновить поля первого подходящего документа"""
+    with _lock, _conn:
+        row = _conn.execute(
+            f'SELECT seq, data FROM {table} WHERE {where} ORDER BY seq LIMIT 1', params
+        ).fetchone()
+        if row is None:
+            return False
+        doc = json.loads(row['data'])
+        doc.update(updates)
+        _conn.execute(f'UPDATE {table} SET data = ? WHERE seq = ?', (_dumps(doc), row['seq']))
+        return True
+
+# === Подписки ===
+def get_user_subscription(user_id: int) -> Optional[Dict]:
+    """Получить информацию о подписке пользователя"""
+    rows = _query('SELECT data FROM subscriptions WHERE user_id = ?', (user_id,))
+    return json.loads(rows[0]['data']) if rows else None
+
+def get_expiring_subscriptions(until: datetime) -> List[Dict]:
+    """Получить действующие подписки, которые закончатся раньше until (по возрастанию даты окончания)"""
+    return SubscriptionIndex(get_all_subscriptions()).expiring(datetime.now(), until)
+
+def get_all_subscriptions() -> List[Dict]:
+    """Получить подписки всех пользователей"""
+    return [json.loads(row['data']) for row in _query('SELECT data FROM subscriptions')]
+
+def save_subscription(user_id: int, subscription_data: Dict):
+    """Сохранить информацию о подписке"""
+    subscription_data['userId'] = user_id
+    _execute(
+        'INSERT INTO subscriptions (user_id, data) VALUES (?, ?) '
+        'ON CONFLICT(user_id) DO UPDATE SET data = excluded.data',
+        (user_id, _dumps(subscription_data))
+    )
+    logger.info(f"save_subscription: подписка сохранена для user_id={user_id}")
+
+# === Пользователи ===
+# ID, которые уже точно есть в таблице users: повторные save_user_id не ходят в базу
+_known_user_ids = set()
+
+def save_user_id(user_id: int):
+    """Сохранить ID пользователя (если его еще нет в списке)"""
+    if user_id in _known_user_ids:
+        return
+    _execute('INSERT OR IGNORE INTO users (user_id) VALUES (?)', (user_id,))
+    _known_user_ids.add(user_id)
+
+def is_known_user(user_id: int) -> bool:
+    """Сохранялся ли ID в этом процессе (только проверка в памяти)"""
+    return user_id in _known_user_ids
+
+def count_items_by_user(table: str) -> Dict[int, int]:
+    """Число строк таблицы (entries, projects, ...) у каждого пользователя - одним запросом"""
+    rows = _query(f'SELECT user_id, COUNT(*) AS n FROM {table} GROUP BY user_id')
+    return {row['user_id']: row['n'] for row in rows}
+
+def get_all_user_ids() -> List[int]:
+    """Получить список всех ID пользователей"""
+    return [row['user_id'] for row in _query('SELECT user_id FROM users ORDER BY seq')]
+
+def get_user_feedback_given(user_id: int) -> bool:
+    """Получить статус feedback_given для пользователя"""
+    rows = _query('SELECT feedback_given FROM users WHERE user_id = ?', (user_id,))
+    return bool(rows[0]['feedback_given']) if rows else False
+
+def set_user_feedback_given(user_id: int, value: bool = True):
+    """Установить feedback_given для пользователя"""
+    _execute(
+        'INSERT INTO users (user_id, feedback_given) VALUES (?, ?) '
+        'ON CONFLICT(user_id) DO UPDATE SET feedback_given = excluded.feedback_given',
+        (user_id, int(value))
+    )
+
+# === Изменения извне ===
+# Сколько раз базу меняли в обход функций этого модуля: другое соединение (PRAGMA data_version) или импорт
+_external_changes = 0
+_seen_data_version: Optional[int] = None
+
+def get_external_version() -> int:
+    """Счётчик изменений базы извне; при изменении накопленная статистика по записям сбрасывается"""
+    global _external_changes, _seen_data_version
+    with _lock:
+        data_version = _conn.execute('PRAGMA data_version').fetchone()[0]
+        if _seen_data_version is not None and data_version != _seen_data_version:
+            _external_changes += 1
+            _entry_stats.clear()
+            _range_sums.clear()
+            _streaks.clear()
+        _seen_data_version = data_version
+        return _external_changes
+
+# === Записи о крестиках ===
+# Сводная статистика, накопленные суммы по дням ({хэштег или None: суммы}) и серии дней пользователей,
+# которые уже запрашивали; обновляются по одному дню при изменении записей.
+# Читаются, строятся и обновляются только под _lock: функции хранилища выполняются в пуле потоков.
+_entry_stats: Dict[int, EntryStats] = {}
+_range_sums: Dict[int, Dict[Optional[str], DayPrefixSums]] = {}
+_streaks: Dict[int, DayRuns] = {}
+
+_DAY_STATS_SQL = (
+    'SELECT t.date, t.total, MAX(e.count) AS best FROM daily_totals t '
+    'JOIN entries e ON e.user_id = t.user_id AND e.date = t.date '
+)
+
+def _refresh_day(user_id: int, date: str):
+    """Пересчитать день пользователя в сводной статистике и накопленных суммах (вызывается под _lock)"""
+    stats = _entry_stats.get(user_id)
+    user_sums = _range_sums.get(user_id)
+    streaks = _streaks.get(user_id)
+    if stats is None and not user_sums and streaks is None:
+        return
+    rows = _query('SELECT hashtag, count FROM entries WHERE user_id = ? AND date = ? ORDER BY rowid', (user_id, date))
+    total = 0.0
+    for row in rows:
+        total += row['count']
+    if stats is not None:
+        stats.set_day(date, total if rows else None, max((row['count'] for row in rows), default=0.0))
+    for hashtag, sums in (user_sums or {}).items():
+        if hashtag is None:
+            sums.set_day(date, total if rows else None)
+        else:
+            sums.set_day(date, next((row['count'] for row in rows if row['hashtag'] == hashtag), None))
+    if streaks is not None and date_ordinal(date):
+        if rows:
+            streaks.add(date_ordinal(date))
+        else:
+            streaks.remove(date_ordinal(date))
+
+def _entry_from_row(row: sqlite3.Row) -> Dict:
+    entry = {
+        'id': row['id'],
+        'date': row['date'],
+        'count': row['count'],
+        'userId': row['user_id']
+    }
+    if row['hashtag']:
+        entry['hashtag'] = row['hashtag']
+    return entry
+
+def get_entries(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить все записи или записи конкретного пользователя"""
+    if user_id:
+        rows = _query('SELECT * FROM entries WHERE user_id = ? ORDER BY rowid', (user_id,))
+    else:
+        rows = _query('SELECT * FROM entries ORDER BY rowid')
+    return [_entry_from_row(row) for row in rows]
+
+def add_count_to_date(date: str, count: float, user_id: int, hashtag: Optional[str] = None):
+    """Добавить крестики за дату с опциональным хэштегом (один upsert по индексу)"""
+    # Запись и пересчёт дня под одной блокировкой: иначе пересчёт после более ранней записи
+    # может перезаписать в сводке результат более поздней
+    with _lock:
+        _execute(
+            'INSERT INTO entries (id, user_id, date, hashtag, count) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(user_id, date, hashtag) DO UPDATE SET count = count + excluded.count',
+            (f"{date}-{user_id}-{int(datetime.now().timestamp())}", user_id, date, hashtag or '', count)
+        )
+        _refresh_day(user_id, date)
+
+def get_entries_by_hashtag(hashtag: str, user_id: int) -> List[Dict]:
+    """Получить записи по хэштегу"""
+    rows = _query(
+        'SELECT * FROM entries WHERE user_id = ? AND hashtag = ? ORDER BY rowid',
+        (user_id, hashtag or '')
+    )
+    return [_entry_from_row(row) for row in rows]
+
+def get_entries_by_date(date: str, user_id: int) -> List[Dict]:
+    """Получить записи пользователя за дату"""
+    rows = _query(
+        'SELECT * FROM entries WHERE user_id = ? AND date = ? ORDER BY rowid',
+        (user_id, date)
+    )
+    return [_entry_from_row(row) for row in rows]
+
+def get_daily_totals(user_id: int, hashtag: Optional[str] = None) -> Dict[str, float]:
+    """Получить сумму крестиков по дням {дата: сумма} (по всем хэштегам или по одному)"""
+    if hashtag is None:
+        rows = _query('SELECT date, total FROM daily_totals WHERE user_id = ?', (user_id,))
+        return {row['date']: row['total'] for row in rows}
+    # По хэштегу за день одна запись - отдельная таблица не нужна
+    rows = _query('SELECT date, count FROM entries WHERE user_id = ? AND hashtag = ? ORDER BY rowid', (user_id, hashtag))
+    return {row['date']: row['count'] for row in rows}
+
+def get_daily_hashtag_totals(user_id: int) -> Dict[str, Dict[Optional[str], float]]:
+    """Получить сумму крестиков по дням с разбивкой по хэштегам {дата: {хэштег: сумма}} (None - без хэштега)"""
+    totals: Dict[str, Dict[Optional[str], float]] = {}
+    for row in _query('SELECT date, hashtag, count FROM entries WHERE user_id = ? ORDER BY rowid', (user_id,)):
+        totals.setdefault(row['date'], {})[row['hashtag'] or None] = row['count']
+    return totals
+
+def _get_range_sums(user_id: int, hashtag: Optional[str]) -> DayPrefixSums:
+    """Накопленные суммы пользователя (вызывается под _lock)"""
+    user_sums = _range_sums.setdefault(user_id, {})
+    sums = user_sums.get(hashtag)
+    if sums is None:
+        sums = user_sums[hashtag] = DayPrefixSums(get_daily_totals(user_id, hashtag))
+    return sums
+
+def range_total(user_id: int, start: Optional[str] = None, end: Optional[str] = None,
+                hashtag: Optional[str] = None) -> float:
+    """Сумма крестиков пользователя за даты start <= date <= end (по всем хэштегам или по одному)"""
+    with _lock:
+        return _get_range_sums(user_id, hashtag).total(start, end)
+
+def range_days(user_id: int, start: Optional[str] = None, end: Optional[str] = None,
+               hashtag: Optional[str] = None) -> int:
+    """Число дней с записями пользователя в интервале дат"""
+    with _lock:
+        return _get_range_sums(user_id, hashtag).days(start, end)
+
+def get_streak(user_id: int, today: int, start: Optional[int] = None) -> Dict[str, int]:
+    """Текущая серия дней подряд до дня today (не раньше start) и самая длинная серия пользователя"""
+    with _lock:
+        streaks = _streaks.get(user_id)
+        if streaks is None:
+            rows = _query('SELECT date FROM daily_totals WHERE user_id = ?', (user_id,))
+            streaks = _streaks[user_id] = DayRuns(day for day in (date_ordinal(row['date']) for row in rows) if day)
+        return {'current': streaks.current(today, start), 'longest': streaks.longest}
+
+def get_entry_stats(user_id: int, today: Optional[date_type] = None) -> Dict:
+    """Получить сводную статистику пользователя для экрана статистики"""
+    with _lock:
+        stats = _entry_stats.get(user_id)
+        if stats is None:
+            stats = EntryStats()
+            for row in _query(_DAY_STATS_SQL + 'WHERE t.user_id = ? GROUP BY t.date', (user_id,)):
+                stats.set_day(row['date'], row['total'], row['best'])
+            _entry_stats[user_id] = stats
+        return stats.summary(today, lambda match: _first_entry(user_id, match))
+
+def _first_entry(user_id: int, match) -> Optional[str]:
+    """Дата первой по порядку добавления записи пользователя, для которой match(date, count) истинно"""
+    with _lock:
+        rows = _conn.execute('SELECT date, count FROM entries WHERE user_id = ? ORDER BY rowid', (user_id,))
+        for row in rows:
+            if match(row['date'], row['count']):
+                return row['date']
+    return None
+
+def rebuild_entry_stats(user_id: Optional[int] = None):
+    """Сбросить сводную статистику (пользователя или всех) - при следующем запросе она соберётся заново"""
+    with _lock:
+        if user_id is None:
+            _entry_stats.clear()
+        else:
+            _entry_stats.pop(user_id, None)
+
+def get_entry_hashtags(user_id: int) -> List[str]:
+    """Получить уникальные хэштеги из записей пользователя"""
+    rows = _query(
+        "SELECT DISTINCT hashtag FROM entries WHERE user_id = ? AND hashtag != ''",
+        (user_id,)
+    )
+    return [row['hashtag'] for row in rows]
+
+def get_hashtag_summary(user_id: int) -> Dict[str, Dict]:
+    """Итоги пользователя по хэштегам записей (сумма, записи, дни, первая и последняя дата)"""
+    with _lock:
+        rows = _query(
+            "SELECT hashtag, COUNT(*) AS entries FROM entries WHERE user_id = ? AND hashtag != '' GROUP BY hashtag",
+            (user_id,)
+        )
+        return {row['hashtag']: hashtag_totals(_get_range_sums(user_id, row['hashtag']), row['entries']) for row in rows}
+
+def delete_entry_by_date(date: str, user_id: int):
+    """Удалить запись за конкретную дату"""
+    with _lock:
+        _execute('DELETE FROM entries WHERE user_id = ? AND date = ?', (user_id, date))
+        _refresh_day(user_id, date)
+
+def delete_all_user_data(user_id: int):
+    """Удалить все данные пользователя (ID и подписка остаются)"""
+    with _lock:
+        with _conn:
+            _conn.execute('DELETE FROM entries WHERE user_id = ?', (user_id,))
+            for table in _DOCUMENT_TABLES:
+                _conn.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+        _entry_stats.pop(user_id, None)
+        _range_sums.pop(user_id, None)
+        _streaks.pop(user_id, None)
+
+# === Проекты ===
+def get_projects(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить все проекты или проекты конкретного пользователя"""
+    return _get_documents('projects', user_id)
+
+def save_project(project: Dict):
+    """Сохранить проект"""
+    _save_document('projects', project)
+
+def remove_project_photo(project_id: str, user_id: int):
+    """Удалить фото из проекта"""
+    with _lock, _conn:
+        row = _conn.execute(
+            'SELECT seq, data FROM projects WHERE id = ? AND user_id = ? ORDER BY seq LIMIT 1',
+            (project_id, user_id)
+        ).fetchone()
+        if row is None:
+            return False
+        project = json.loads(row['data'])
+        if 'imageFileId' in project:
+            del project['imageFileId']
+            _conn.execute('UPDATE projects SET data = ? WHERE seq = ?', (_dumps(project), row['seq']))
+        return True
+
+def delete_project(project_id: str, user_id: int) -> bool:
+    """Удалить проект"""
+    cursor = _execute('DELETE FROM projects WHERE id = ? AND user_id = ?', (project_id, user_id))
+    return cursor.rowcount > 0
+
+# === Вишлист ===
+def get_wishlist(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить вишлист пользователя"""
+    return _get_documents('wishlist', user_id)
+
+def add_to_wishlist(item: Dict):
+    """Добавить элемент в вишлист"""
+    _execute(
+        'INSERT INTO wishlist (id, user_id, data) VALUES (?, ?, ?)',
+        (item.get('id'), item.get('userId'), _dumps(item))
+    )
+
+def remove_from_wishlist(item_id: str, user_id: int):
+    """Удалить элемент из вишлиста"""
+    _execute('DELETE FROM wishlist WHERE id = ? AND user_id = ?', (item_id, user_id))
+
+def update_wishlist_item(item_id: str, user_id: int, updates: Dict):
+    """Обновить элемент вишлиста"""
+    _update_document('wishlist', 'id = ? AND user_id = ?', (item_id, user_id), updates)
+
+# === Заметки ===
+def get_notes(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить заметки пользователя"""
+    return _get_documents('notes', user_id)
+
+def save_note(note: Dict):
+    """Сохранить заметку"""
+    _save_document('notes', note)
+
+def delete_note(note_id: str, user_id: int):
+    """Удалить заметку"""
+    _execute('DELETE FROM notes WHERE id = ? AND user_id = ?', (note_id, user_id))
+
+# === Планы ===
+def get_plans(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить планы пользователя"""
+    return _get_documents('plans', user_id)
+
+def save_plan(plan: Dict):
+    """Сохранить план"""
+    _save_document('plans', plan)
+
+def delete_plan(plan_id: str, user_id: int):
+    """Удалить план"""
+    _execute('DELETE FROM plans WHERE id = ? AND user_id = ?', (plan_id, user_id))
+
+# === Челленджи ===
+def get_user_challenges(user_id: Optional[int] = None) -> List[Dict]:
+    """Получить челленджи пользователя"""
+    return _get_documents('user_challenges', user_id)
+
+def add_user_challenge(challenge: Dict):
+    """Добавить челлендж пользователю"""
+    _execute(
+        'INSERT INTO user_challenges (id, user_id, challenge_id, data) VALUES (?, ?, ?, ?)',
+        (challenge.get('id'), challenge.get('userId'), challenge.get('challengeId'), _dumps(challenge))
+    )
+
+def update_user_challenge(challenge_id: str, user_id: int, updates: Dict):
+    """Обновить челлендж пользователя"""
+    _update_document('user_challenges', 'challenge_id = ? AND user_id = ?', (challenge_id, user_id), updates)
+
+def delete_user_challenge(challenge_id: str, user_id: int):
+    """Удалить челлендж пользователя"""
+    _execute('DELETE FROM user_challenges WHERE challenge_id = ? AND user_id = ?', (challenge_id, user_id))
+
+# === Импорт из JSON ===
+def _read_json_list(filepath: str) -> List:
+    if not os.path.exists(filepath):
+        return []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def import_from_json(data_dir: str) -> Dict[str, int]:
+    """Однократно перенести данные из JSON-файлов в SQLite (содержимое таблиц заменяется)"""
+    global _external_changes
+    entries = _read_json_list(os.path.join(data_dir, 'entries.json'))
+    users = _read_json_list(os.path.join(data_dir, 'users.json'))
+    subscriptions = _read_json_list(os.path.join(data_dir, 'subscriptions.json'))
+    documents = {
+        'projects': _read_json_list(os.path.join(data_dir, 'projects.json')),
+        'wishlist': _read_json_list(os.path.join(data_dir, 'wishlist.json')),
+        'notes': _read_json_list(os.path.join(data_dir, 'notes.json')),
+        'plans': _read_json_list(os.path.join(data_dir, 'plans.json')),
+        'user_challenges': _read_json_list(os.path.join(data_dir, 'user_challenges.json')),
+    }
+
+    counts = {}
+    with _lock, _conn:
+        # DELETE открывает транзакцию, поэтому снятие триггеров откатится вместе с импортом при ошибке;
+        # без триггеров записи вставляются втрое быстрее, daily_totals пересчитываем один раз в конце
+        _conn.execute('DELETE FROM daily_totals')
+        for name in _DAILY_TOTALS_TRIGGERS:
+            _conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        _conn.execute('DELETE FROM entries')
+        for entry in entries:
+            # Дубли (userId, date, hashtag) из старых данных складываем в одну запись
+            _conn.execute(
+                'INSERT INTO entries (id, user_id, date, hashtag, count) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(user_id, date, hashtag) DO UPDATE SET count = count + excluded.count',
+                (entry.get('id', ''), entry.get('userId'), entry.get('date', ''),
+                 entry.get('hashtag') or '', float(entry.get('count', 0)))
+            )
+        counts['entries'] = len(entries)
+        _rebuild_daily_totals(_conn)
+        _entry_stats.clear()
+        _range_sums.clear()
+        _streaks.clear()
+        for trigger in _DAILY_TOTALS_TRIGGERS.values():
+            _conn.execute(trigger)
+
+        for table, docs in documents.items():
+            _conn.execute(f'DELETE FROM {table}')
+            for doc in docs:
+                if table == 'user_challenges':
+                    _conn.execute(
+                        'INSERT INTO user_challenges (id, user_id, challenge_id, data) VALUES (?, ?, ?, ?)',
+                        (doc.get('id'), doc.get('userId'), doc.get('challengeId'), _dumps(doc))
+                    )
+                else:
+                    _conn.execute(
+                        f'INSERT INTO {table} (id, user_id, data) VALUES (?, ?, ?)',
+                        (doc.get('id'), doc.get('userId'), _dumps(doc))
+                    )
+            counts[table] = len(docs)
+
+        _conn.execute('DELETE FROM subscriptions')
+        for sub in subscriptions:
+            _conn.execute(
+                'INSERT OR REPLACE INTO subscriptions (user_id, data) VALUES (?, ?)',
+                (sub.get('userId'), _dumps(sub))
+            )
+        counts['subscriptions'] = len(subscriptions)
+
+        _conn.execute('DELETE FROM users')
+        _known_user_ids.clear()
+        for user in users:
+            # Старый формат users.json - список ID
+            if isinstance(user, dict):
+                uid, feedback_given = user.get('userId'), user.get('feedback_given', False)
+            else:
+                uid, feedback_given = user, False
+            _conn.execute(
+                'INSERT OR IGNORE INTO users (user_id, feedback_given) VALUES (?, ?)',
+                (uid, int(bool(feedback_given)))
+            )
+        counts['users'] = len(users)
+        _external_changes += 1
+
+    logger.info(f"import_from_json: импорт завершен {counts}")
+    return counts
@@ -1,7 +1,19 @@
+import atexit
+import functools
+import inspect
 import json
 import os
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional, Tuple
+from datetime import date as date_type, datetime, timedelta
+from data import locks
+from data.atomic_io import STORAGE_FSYNC_BATCH_MS, atomic_write_json, sync_appended, flush_fsync
+from data.compact_entries import CompactEntries
+from data.entry_index import EntryIndex
+from data.locks import STORAGE_FILE_LOCKS
+from data.subscription_index import SubscriptionIndex, parse_expires_at
 
 def format_number(num: float) -> str:
     """Форматировать число с пробелами вместо запятых (1 115 вместо 1,115)"""
@@ -16,6 +28,26 @@ def format_number(num: float) -> str:
     return f"{int_str},{int(frac_part * 10)}"
 
 DATA_DIR = os.getenv('DATA_DIR', './data')
+# Бэкенд хранения: 'json' (файлы *.json, по умолчанию) или 'sqlite'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json').strip().lower()
+# Раскладка JSON-файлов: 'single' (один файл на коллекцию) или 'sharded' (data/users/<id>/*.json)
+STORAGE_LAYOUT = os.getenv('STORAGE_LAYOUT', 'single').strip().lower()
+# Кэш прочитанных JSON-файлов в памяти (отключается через STORAGE_CACHE=false)
+STORAGE_CACHE = os.getenv('STORAGE_CACHE', 'true').lower() == 'true'
+# Как часто (в секундах) сверять mtime/размер закэшированного файла с диском
+STORAGE_CACHE_CHECK_INTERVAL = float(os.getenv('STORAGE_CACHE_CHECK_INTERVAL', '1.0'))
+# Максимум файлов в кэше (актуально для раскладки sharded)
+STORAGE_CACHE_MAX_FILES = int(os.getenv('STORAGE_CACHE_MAX_FILES', '2048'))
+# Отложенная запись записей о крестиках: сбрасывать на диск не чаще раза в N мс (0 - писать сразу)
+ENTRIES_WRITE_BEHIND_MS = int(os.getenv('ENTRIES_WRITE_BEHIND_MS', '0'))
+# ...или сразу, как только накопится столько изменений
+ENTRIES_WRITE_BEHIND_MAX_CHANGES = int(os.getenv('ENTRIES_WRITE_BEHIND_MAX_CHANGES', '100'))
+# Журнал операций с записями (JSON Lines) вместо перезаписи entries.json на каждое изменение
+ENTRIES_JOURNAL = os.getenv('ENTRIES_JOURNAL', 'false').lower() == 'true'
+# Размер журнала (в байтах), после которого он сворачивается в новый снимок entries.json
+ENTRIES_JOURNAL_COMPACT_BYTES = int(os.getenv('ENTRIES_JOURNAL_COMPACT_BYTES', str(1024 * 1024)))
+# Держать записи о крестиках в памяти колонками (array) вместо списка словарей
+ENTRIES_COMPACT = os.getenv('ENTRIES_COMPACT', 'false').lower() == 'true'
 ENTRIES_FILE = os.path.join(DATA_DIR, 'entries.json')
 PROJECTS_FILE = os.path.join(DATA_DIR, 'projects.json')
 WISHLIST_FILE = os.path.join(DATA_DIR, 'wishlist.json')
@@ -24,28 +56,637 @@ PLANS_FILE = os.path.join(DATA_DIR, 'plans.json')
 CHALLENGES_FILE = os.path.join(DATA_DIR, 'user_challenges.json')
 SUBSCRIPTIONS_FILE = os.path.join(DATA_DIR, 'subscriptions.json')
 USERS_FILE = os.path.join(DATA_DIR, 'users.json')
+# Журнал новых пользователей: по строке на ID, сворачивается в users.json
+USERS_JOURNAL_FILE = os.path.join(DATA_DIR, 'users.journal.jsonl')
+SQLITE_FILE = os.path.join(DATA_DIR, 'storage.db')
+# Снимок статистики для команды /users (см. get_admin_statistics)
+ADMIN_STATS_FILE = os.path.join(DATA_DIR, 'admin_stats.json')
+# Считать статистику /users раз в день и отвечать из снимка, а не пересчитывать на каждый вызов
+ADMIN_STATS_SNAPSHOT = os.getenv('ADMIN_STATS_SNAPSHOT', 'false').lower() == 'true'
+USERS_DIR = os.path.join(DATA_DIR, 'users')
+
+# Коллекции, которые в раскладке sharded хранятся отдельно для каждого пользователя.
+# Подписки и список пользователей остаются общими файлами.
+USER_COLLECTION_FILES = (ENTRIES_FILE, PROJECTS_FILE, WISHLIST_FILE, NOTES_FILE, PLANS_FILE, CHALLENGES_FILE)
+
+if STORAGE_BACKEND not in ('json', 'sqlite'):
+    raise ValueError(f"Неизвестный STORAGE_BACKEND: {STORAGE_BACKEND} (ожидается json или sqlite)")
+if STORAGE_LAYOUT not in ('single', 'sharded'):
+    raise ValueError(f"Неизвестный STORAGE_LAYOUT: {STORAGE_LAYOUT} (ожидается single или sharded)")
 
 # Создаём директорию если её нет
 os.makedirs(DATA_DIR, exist_ok=True)
 
+_sqlite = None
+if STORAGE_BACKEND == 'sqlite':
+    from data import sqlite_storage as _sqlite
+    _sqlite.init(SQLITE_FILE)
+
 def _ensure_file(filepath: str):
     """Создаёт файл если его нет"""
     if not os.path.exists(filepath):
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False)
-
-_ensure_file(ENTRIES_FILE)
-_ensure_file(PROJECTS_FILE)
-_ensure_file(WISHLIST_FILE)
-_ensure_file(NOTES_FILE)
-_ensure_file(PLANS_FILE)
-_ensure_file(CHALLENGES_FILE)
-_ensure_file(SUBSCRIPTIONS_FILE)
-
-# Для users.json используем список ID
-if not os.path.exists(USERS_FILE):
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([], f, ensure_ascii=False)
+        atomic_write_json(filepath, [], indent=None)
+
+if _sqlite is None and STORAGE_LAYOUT == 'sharded':
+    os.makedirs(USERS_DIR, exist_ok=True)
+    _ensure_file(SUBSCRIPTIONS_FILE)
+elif _sqlite is None:
+    _ensure_file(ENTRIES_FILE)
+    _ensure_file(PROJECTS_FILE)
+    _ensure_file(WISHLIST_FILE)
+    _ensure_file(NOTES_FILE)
+    _ensure_file(PLANS_FILE)
+    _ensure_file(CHALLENGES_FILE)
+    _ensure_file(SUBSCRIPTIONS_FILE)
+
+    # Для users.json используем список ID
+    if not os.path.exists(USERS_FILE):
+        atomic_write_json(USERS_FILE, [], indent=None)
+
+# === Кэш прочитанных файлов ===
+# Путь -> {'data': разобранный JSON, 'stamp': (mtime_ns, size), 'checked': время последней сверки}.
+# Закэшированные списки общие для всех вызовов: наружу отдаются только копии элементов.
+_file_cache = OrderedDict()
+_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+# Номер версии файла: растёт при каждой записи, чтобы не положить в кэш данные, прочитанные до неё
+_cache_generations: Dict[str, int] = {}
+# Защищает только словари кэша; файлы читаются и пишутся без неё
+_cache_lock = threading.RLock()
+# Путь к файлу записей -> индекс по его текущему списку записей (см. _entry_index)
+_entry_indexes: Dict[str, EntryIndex] = {}
+
+def _file_stamp(filepath: str) -> Optional[Tuple[int, int]]:
+    """Отпечаток файла для проверки изменений извне (None, если файла нет)"""
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _remember_file(filepath: str, data: List, stamp: Optional[Tuple[int, int]]):
+    """Положить содержимое файла в кэш"""
+    _file_cache[filepath] = {'data': data, 'stamp': stamp, 'checked': time.monotonic()}
+    _file_cache.move_to_end(filepath)
+    while len(_file_cache) > STORAGE_CACHE_MAX_FILES:
+        evicted, _ = _file_cache.popitem(last=False)
+        # Индекс держит ссылку на вытесненный список - отпускаем и его
+        _entry_indexes.pop(evicted, None)
+
+def _invalidate_cache(filepath: Optional[str] = None):
+    """Сбросить кэш файла (или весь кэш)"""
+    with _cache_lock:
+        if filepath is None:
+            _file_cache.clear()
+            return
+        _cache_generations[filepath] = _cache_generations.get(filepath, 0) + 1
+        if _file_cache.pop(filepath, None) is not None:
+            _cache_stats['invalidations'] += 1
+
+# === Изменения файлов извне ===
+# Путь -> отпечаток файла, каким этот процесс его последним записал или прочитал
+_seen_stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+# Путь -> сколько раз файл на диске оказывался не таким, каким его оставил этот процесс
+_external_changes: Dict[str, int] = {}
+
+def _saw_stamp(filepath: str, stamp: Optional[Tuple[int, int]], written: bool = False):
+    """Запомнить отпечаток записанного или прочитанного файла и посчитать изменение извне"""
+    with _cache_lock:
+        if not written and filepath in _seen_stamps and _seen_stamps[filepath] != stamp:
+            _external_changes[filepath] = _external_changes.get(filepath, 0) + 1
+        _seen_stamps[filepath] = stamp
+
+def get_external_version(user_id: int) -> int:
+    """Счётчик изменений файлов пользователя извне: другим процессом, скриптом миграции или вручную.
+    
+    Сверяет файлы с диском (с SQLite - базу целиком); изменённый файл заодно выбрасывается из кэша чтения,
+    чтобы следующее чтение вернуло новые данные. Кэши готовых текстов учитывают счётчик вместе
+    с версией данных (get_data_version), которая растёт только от изменений в этом процессе.
+    """
+    if _sqlite:
+        return _sqlite.get_external_version()
+    version = 0
+    for filepath in USER_COLLECTION_FILES:
+        if ENTRIES_JOURNAL and filepath == ENTRIES_FILE:
+            # Записи с журналом загружаются один раз и с диском не сверяются
+            continue
+        path = _user_file(filepath, user_id)
+        stamp = _file_stamp(path)
+        with _cache_lock:
+            changed = path in _seen_stamps and _seen_stamps[path] != stamp
+        if changed:
+            _saw_stamp(path, stamp)
+            _invalidate_cache(path)
+        version += _external_changes.get(path, 0)
+    return version
+
+def get_cache_stats() -> Dict[str, int]:
+    """Получить счётчики кэша чтения: попадания, промахи, сбросы и число файлов"""
+    with _cache_lock:
+        return dict(_cache_stats, files=len(_file_cache))
+
+# === Чтение и запись файлов ===
+def _parse_json_file(filepath: str) -> List:
+    """Прочитать и разобрать JSON-файл с диска"""
+    if not os.path.exists(filepath):
+        data = []
+    else:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    return _compact_entries(filepath, data)
+
+def _compact_entries(filepath: str, data: List) -> List:
+    """С ENTRIES_COMPACT=true записи о крестиках держим в памяти в CompactEntries"""
+    if ENTRIES_COMPACT and _is_entries_file(filepath) and not isinstance(data, CompactEntries):
+        return CompactEntries(data)
+    return data
+
+def _read_json(filepath: str, revalidate: bool = False) -> List:
+    """Прочитать JSON-файл коллекции (пустой список, если файла нет).
+    
+    Возвращает закэшированный список - его нельзя изменять без последующего _write_json.
+    revalidate=True сверяет файл с диском, не дожидаясь STORAGE_CACHE_CHECK_INTERVAL.
+    """
+    if ENTRIES_JOURNAL and _is_entries_file(filepath):
+        return _journal_state(filepath)
+    
+    with _cache_lock:
+        if filepath in _pending_writes:
+            return _pending_writes[filepath]
+        if STORAGE_CACHE:
+            cached = _file_cache.get(filepath)
+            if cached is not None:
+                now = time.monotonic()
+                if not revalidate and now - cached['checked'] < STORAGE_CACHE_CHECK_INTERVAL:
+                    _cache_stats['hits'] += 1
+                    _file_cache.move_to_end(filepath)
+                    return cached['data']
+                if _file_stamp(filepath) == cached['stamp']:
+                    _cache_stats['hits'] += 1
+                    cached['checked'] = now
+                    _file_cache.move_to_end(filepath)
+                    return cached['data']
+                # Файл изменили извне - перечитываем
+                _cache_stats['invalidations'] += 1
+            _cache_stats['misses'] += 1
+        generation = _cache_generations.get(filepath, 0)
+    
+    # Сам файл читаем без блокировки кэша, чтобы не задерживать чтение других файлов
+    _fold_stale_journal(filepath)
+    # Отпечаток берём до чтения: если файл поменяется во время чтения, следующая сверка это заметит
+    stamp = _file_stamp(filepath)
+    _saw_stamp(filepath, stamp)
+    data = _parse_json_file(filepath) if stamp is not None else _compact_entries(filepath, [])
+    if STORAGE_CACHE:
+        with _cache_lock:
+            # Если файл успели перезаписать, пока мы его читали, в кэше уже более свежие данные
+            if _cache_generations.get(filepath, 0) == generation:
+                _remember_file(filepath, data, stamp)
+    return data
+
+def _write_json(filepath: str, data: List):
+    """Записать JSON-файл коллекции (вызывающий держит блокировку файла)"""
+    data = _compact_entries(filepath, data)
+    try:
+        atomic_write_json(filepath, data.to_list() if isinstance(data, CompactEntries) else data)
+    except Exception:
+        # Закэшированный список мог быть уже изменён на месте - перечитаем его с диска
+        _invalidate_cache(filepath)
+        raise
+    stamp = _file_stamp(filepath)
+    with _cache_lock:
+        _cache_generations[filepath] = _cache_generations.get(filepath, 0) + 1
+        _saw_stamp(filepath, stamp, written=True)
+        if STORAGE_CACHE:
+            _remember_file(filepath, data, stamp)
+
+# === Отложенная запись ===
+# Путь -> данные, которые ещё не сброшены на диск. Чтение видит их раньше кэша и файла.
+_pending_writes: Dict[str, List] = {}
+_pending_changes = 0
+_flush_event = threading.Event()
+_flush_thread: Optional[threading.Thread] = None
+
+def _write_json_deferred(filepath: str, data: List):
+    """Запомнить данные файла и записать их позже одним пакетом"""
+    global _pending_changes, _flush_thread
+    data = _compact_entries(filepath, data)
+    with _cache_lock:
+        _pending_writes[filepath] = data
+        _pending_changes += 1
+        _cache_generations[filepath] = _cache_generations.get(filepath, 0) + 1
+        if STORAGE_CACHE:
+            # Отпечаток остаётся от файла на диске, данные - уже новые
+            cached = _file_cache.get(filepath)
+            _remember_file(filepath, data, cached['stamp'] if cached else _file_stamp(filepath))
+        if _pending_changes >= ENTRIES_WRITE_BEHIND_MAX_CHANGES:
+            _flush_event.set()
+        if _flush_thread is None:
+            _flush_thread = threading.Thread(target=_flush_loop, name='storage-flush', daemon=True)
+            _flush_thread.start()
+            # На случай выхода без явного flush_storage() (скрипты, тесты)
+            atexit.register(flush_storage)
+
+def _flush_loop():
+    """Фоновый поток: сбрасывает отложенные записи по таймеру или по количеству изменений"""
+    while True:
+        _flush_event.wait(ENTRIES_WRITE_BEHIND_MS / 1000)
+        _flush_event.clear()
+        flush_storage()
+
+def flush_storage():
+    """Записать на диск все отложенные изменения"""
+    global _pending_changes
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    with _cache_lock:
+        paths = list(_pending_writes)
+        _pending_changes = 0
+    
+    written = 0
+    for filepath in paths:
+        # Блокировка файла не даёт изменить данные, пока они пишутся
+        with locks.locked(filepath):
+            with _cache_lock:
+                data = _pending_writes.get(filepath)
+            if data is None:
+                continue
+            try:
+                _write_json(filepath, data)
+            except Exception as e:
+                # Данные остаются в очереди до следующей попытки
+                logger.error(f"flush_storage: не удалось записать {filepath}: {e}", exc_info=True)
+                continue
+            with _cache_lock:
+                del _pending_writes[filepath]
+            written += 1
+    if written:
+        logger.debug(f"flush_storage: записано файлов: {written}")
+    _fold_users_journal()
+    flush_fsync()
+
+# === Раскладка коллекций по файлам ===
+def _shard_path(filepath: str, user_id: int) -> str:
+    """Путь к файлу коллекции конкретного пользователя: data/users/<id>/<коллекция>.json"""
+    return os.path.join(USERS_DIR, str(user_id), os.path.basename(filepath))
+
+def _user_file(filepath: str, user_id: int) -> str:
+    """Файл, в котором лежат элементы пользователя: его собственный (sharded) или общий"""
+    return _shard_path(filepath, user_id) if STORAGE_LAYOUT == 'sharded' else filepath
+
+def _locked(filepath: str, user_id: int):
+    """Блокировка файла с элементами пользователя на время чтения-изменения-записи.
+    
+    В раскладке sharded разные пользователи не мешают друг другу, в single блокируется вся коллекция.
+    """
+    return locks.locked(_user_file(filepath, user_id))
+
+def _shard_user_ids() -> List[int]:
+    """ID пользователей, у которых есть папка в data/users"""
+    if not os.path.isdir(USERS_DIR):
+        return []
+    return sorted(int(name) for name in os.listdir(USERS_DIR) if name.lstrip('-').isdigit())
+
+def _load_items(filepath: str, user_id: Optional[int] = None) -> List[Dict]:
+    """Получить все элементы коллекции или элементы конкретного пользователя"""
+    if STORAGE_LAYOUT == 'sharded':
+        if user_id:
+            return [dict(i) for i in _read_json(_shard_path(filepath, user_id))]
+        items = []
+        for uid in _shard_user_ids():
+            items.extend(dict(i) for i in _read_json(_shard_path(filepath, uid)))
+        return items
+    
+    items = _read_json(filepath)
+    if user_id:
+        return [dict(i) for i in items if i.get('userId') == user_id]
+    return [dict(i) for i in items]
+
+def _load_user_items(filepath: str, user_id: int) -> Tuple[List[Dict], Optional[List[Dict]]]:
+    """Загрузить элементы пользователя для изменения.
+    
+    Возвращает (элементы пользователя, элементы остальных пользователей).
+    В раскладке sharded чужие элементы лежат в других файлах, вместо них None.
+    """
+    # С межпроцессными блокировками файл мог изменить другой процесс - сверяемся с диском
+    if STORAGE_LAYOUT == 'sharded':
+        return [dict(i) for i in _read_json(_shard_path(filepath, user_id), revalidate=STORAGE_FILE_LOCKS)], None
+    
+    items = _read_json(filepath, revalidate=STORAGE_FILE_LOCKS)
+    mine = [dict(i) for i in items if i.get('userId') == user_id]
+    others = [i for i in items if i.get('userId') != user_id]
+    return mine, others
+
+def _store_user_items(filepath: str, user_id: int, items: List[Dict], others: Optional[List[Dict]]):
+    """Сохранить элементы пользователя, загруженные через _load_user_items (под _locked).
+    
+    Возвращает записанный список всего файла.
+    """
+    # Копируем, чтобы вызывающий код не мог изменить закэшированные элементы задним числом
+    items = [dict(i) for i in items]
+    write = _write_json_deferred if filepath == ENTRIES_FILE and ENTRIES_WRITE_BEHIND_MS > 0 else _write_json
+    if STORAGE_LAYOUT == 'sharded':
+        path = _shard_path(filepath, user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write(path, items)
+        return items
+    data = others + items
+    write(filepath, data)
+    return data
+
+def split_into_shards() -> Dict[str, int]:
+    """Разложить общие файлы коллекций по папкам пользователей (data/users/<id>/).
+    
+    Файлы пользователей перезаписываются, исходные общие файлы не изменяются.
+    Возвращает количество перенесённых элементов по каждой коллекции.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    counts = {}
+    for filepath in USER_COLLECTION_FILES:
+        by_user = {}
+        for item in _read_json(filepath):
+            if item.get('userId') is None:
+                logger.warning(f"split_into_shards: пропущен элемент без userId в {filepath}: {item.get('id')}")
+                continue
+            by_user.setdefault(item['userId'], []).append(item)
+        
+        for user_id, items in by_user.items():
+            path = _shard_path(filepath, user_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_json(path, items)
+        counts[os.path.basename(filepath)] = sum(len(items) for items in by_user.values())
+    return counts
+
+# === Операции с записями о крестиках ===
+def _apply_entry_op(entries: List[Dict], op: Dict, index: Optional[EntryIndex] = None):
+    """Применить операцию к списку записей на месте (и к индексу по этому списку, если он передан).
+    
+    Операции: add (добавить крестики за дату), delete_day (удалить записи за дату),
+    delete_user (удалить все записи пользователя). Операция add при первом применении
+    запоминает итоговое значение в op['total'], поэтому повторное применение не удваивает крестики.
+    """
+    if index is None and isinstance(entries, CompactEntries):
+        # Компактное хранилище само служит себе индексом
+        index = entries
+    user_id = op['userId']
+    if op['op'] == 'add':
+        # Ищем существующую запись за эту дату без хэштега или с таким же хэштегом
+        if index is not None:
+            entry = index.find(user_id, op['date'], op.get('hashtag'))
+        else:
+            entry = next((e for e in entries
+                          if e.get('date') == op['date'] and
+                          e.get('userId') == user_id and
+                          e.get('hashtag') == op.get('hashtag')), None)
+        if entry is not None:
+            if 'total' not in op:
+                op['total'] = float(entry.get('count', 0)) + op['count']
+            if index is not None:
+                index.set_count(entry, op['total'])
+            else:
+                entry['count'] = op['total']
+            return
+        
+        entry_data = {
+            'id': op['id'],
+            'date': op['date'],
+            'count': op.get('total', op['count']),
+            'userId': user_id
+        }
+        if op.get('hashtag'):
+            entry_data['hashtag'] = op['hashtag']
+        op['total'] = entry_data['count']
+        entries.append(entry_data)
+        if index is not None and index is not entries:
+            index.add(entry_data)
+    elif op['op'] == 'delete_day':
+        if index is not entries:
+            entries[:] = [e for e in entries if not (e.get('date') == op['date'] and e.get('userId') == user_id)]
+        if index is not None:
+            index.delete_day(user_id, op['date'])
+    elif op['op'] == 'delete_user':
+        if index is not entries:
+            entries[:] = [e for e in entries if e.get('userId') != user_id]
+        if index is not None:
+            index.delete_user(user_id)
+    else:
+        raise ValueError(f"Неизвестная операция с записями: {op['op']}")
+
+def _run_entry_op(op: Dict):
+    """Выполнить операцию с записями: дописать в журнал или перезаписать файл"""
+    user_id = op['userId']
+    with _locked(ENTRIES_FILE, user_id):
+        path = _user_file(ENTRIES_FILE, user_id)
+        if ENTRIES_JOURNAL:
+            _apply_entry_op(_journal_state(path), op, _entry_index(path))
+            _append_journal(path, op)
+            return
+        
+        current = _read_json(path, revalidate=STORAGE_FILE_LOCKS)
+        if isinstance(current, CompactEntries):
+            # Компактное хранилище меняем на месте: колонки не пересобираются, накопленные суммы остаются
+            _apply_entry_op(current, op)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write = _write_json_deferred if ENTRIES_WRITE_BEHIND_MS > 0 else _write_json
+            write(path, current)
+            return
+        
+        entries, others = _load_user_items(ENTRIES_FILE, user_id)
+        _apply_entry_op(entries, op)
+        index = _entry_indexes.get(path)
+        if index is not None and index.source is not _read_json(path):
+            index = None
+        data = _store_user_items(ENTRIES_FILE, user_id, entries, others)
+        if index is not None:
+            # Записи остальных пользователей в новом списке - те же объекты, обновляем только этого пользователя
+            index.replace_user(user_id, data if others is None else data[len(others):], data)
+
+# === Индексы записей о крестиках ===
+def _entry_index(filepath: str) -> Optional[EntryIndex]:
+    """Индекс по текущим записям файла: строится при первом обращении и после замены списка.
+    
+    Без кэша (STORAGE_CACHE=false) файл каждый раз читается заново и индекс не строится - вернётся None.
+    Компактное хранилище (ENTRIES_COMPACT) отдаётся как есть - у него тот же интерфейс.
+    """
+    if not STORAGE_CACHE and not ENTRIES_JOURNAL:
+        return None
+    entries = _read_json(filepath)
+    if isinstance(entries, CompactEntries):
+        return entries
+    index = _entry_indexes.get(filepath)
+    if index is not None and index.source is entries:
+        return index
+    
+    # Строим под блокировкой файла, чтобы журнал не изменил список посреди построения
+    with locks.locked(filepath):
+        entries = _read_json(filepath)
+        index = _entry_indexes.get(filepath)
+        if index is None or index.source is not entries:
+            index = _entry_indexes[filepath] = EntryIndex(entries)
+        return index
+
+# === Журнал операций с записями ===
+# Путь к entries.json -> текущие записи (снимок + все операции из журнала)
+_journal_states: Dict[str, List[Dict]] = {}
+_journal_sizes: Dict[str, int] = {}
+_compact_queue: List[str] = []
+_compact_event = threading.Event()
+_compact_thread: Optional[threading.Thread] = None
+
+def _is_entries_file(filepath: str) -> bool:
+    """Это файл записей о крестиках (общий или файл пользователя)?"""
+    return os.path.basename(filepath) == os.path.basename(ENTRIES_FILE)
+
+def _journal_path(filepath: str) -> str:
+    """entries.json -> entries.journal.jsonl"""
+    return os.path.splitext(filepath)[0] + '.journal.jsonl'
+
+def _replay_journal(journal_path: str, entries: List[Dict]) -> int:
+    """Применить к записям операции из файла журнала, вернуть его размер"""
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    if not os.path.exists(journal_path):
+        return 0
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                _apply_entry_op(entries, json.loads(line))
+            except ValueError as e:
+                # Недописанная строка в конце журнала после сбоя
+                logger.warning(f"_replay_journal: пропущена повреждённая строка в {journal_path}: {e}")
+    return os.path.getsize(journal_path)
+
+def _journal_state(filepath: str) -> List[Dict]:
+    """Текущие записи файла: последний снимок + журнал (загружается один раз)"""
+    state = _journal_states.get(filepath)
+    if state is not None:
+        return state
+    
+    with locks.locked(filepath):
+        state = _journal_states.get(filepath)
+        if state is None:
+            state = _parse_json_file(filepath)
+            journal = _journal_path(filepath)
+            # Журнал, который сворачивался в момент сбоя, применяем раньше текущего
+            _replay_journal(journal + '.compacting', state)
+            _journal_sizes[filepath] = _replay_journal(journal, state)
+            _journal_states[filepath] = state
+        return state
+
+def _append_journal(filepath: str, op: Dict):
+    """Дописать операцию в журнал и при необходимости запланировать свёртку (под блокировкой файла)"""
+    global _compact_thread
+    journal = _journal_path(filepath)
+    os.makedirs(os.path.dirname(journal) or '.', exist_ok=True)
+    line = json.dumps(op, ensure_ascii=False) + '\n'
+    with open(journal, 'a', encoding='utf-8') as f:
+        f.write(line)
+        sync_appended(f)
+    
+    _journal_sizes[filepath] = _journal_sizes.get(filepath, 0) + len(line.encode('utf-8'))
+    if _journal_sizes[filepath] < ENTRIES_JOURNAL_COMPACT_BYTES:
+        return
+    with _cache_lock:
+        if filepath in _compact_queue:
+            return
+        _compact_queue.append(filepath)
+        if _compact_thread is None:
+            _compact_thread = threading.Thread(target=_compact_loop, name='entries-compactor', daemon=True)
+            _compact_thread.start()
+    _compact_event.set()
+
+def _compact_loop():
+    """Фоновый поток: сворачивает разросшиеся журналы в снимки"""
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    while True:
+        _compact_event.wait()
+        _compact_event.clear()
+        while True:
+            with _cache_lock:
+                if not _compact_queue:
+                    break
+                filepath = _compact_queue.pop(0)
+            try:
+                compact_journal(filepath)
+            except Exception as e:
+                logger.error(f"_compact_loop: не удалось свернуть журнал {filepath}: {e}", exc_info=True)
+
+def compact_journal(filepath: str = ENTRIES_FILE):
+    """Свернуть журнал операций в новый снимок файла записей.
+    
+    Под блокировкой только копируются записи и переименовывается журнал,
+    сам снимок пишется без блокировки - новые операции идут уже в свежий журнал.
+    """
+    journal = _journal_path(filepath)
+    compacting = journal + '.compacting'
+    with locks.locked(filepath):
+        state = _journal_state(filepath)
+        if not os.path.exists(journal) and not os.path.exists(compacting):
+            return
+        snapshot = [dict(e) for e in state]
+        if os.path.exists(journal) and os.path.exists(compacting):
+            # Остался от прерванной свёртки - его операции ещё не в снимке, дописываем к нему
+            with open(journal, 'r', encoding='utf-8') as src, open(compacting, 'a', encoding='utf-8') as dst:
+                dst.write(src.read())
+            os.remove(journal)
+        elif os.path.exists(journal):
+            os.replace(journal, compacting)
+        _journal_sizes[filepath] = 0
+    
+    atomic_write_json(filepath, snapshot)
+    if STORAGE_FSYNC_BATCH_MS:
+        # Снимок должен оказаться на диске раньше, чем пропадёт свёрнутый в него журнал
+        flush_fsync()
+    os.remove(compacting)
+
+def _fold_stale_journal(filepath: str):
+    """Свернуть журнал, оставшийся после работы с ENTRIES_JOURNAL=true, перед чтением снимка"""
+    if not _is_entries_file(filepath):
+        return
+    journal = _journal_path(filepath)
+    if os.path.exists(journal) or os.path.exists(journal + '.compacting'):
+        compact_journal(filepath)
+        _journal_states.pop(filepath, None)
+
+# === Версии данных пользователей ===
+# Номер растёт после каждого изменения данных пользователя (в пределах процесса):
+# по нему кэши готовых экранов понимают, что собранный текст устарел
+_data_versions: Dict[int, int] = {}
+_data_versions_lock = threading.Lock()
+
+def get_data_version(user_id: int) -> int:
+    """Текущая версия данных пользователя"""
+    return _data_versions.get(user_id, 0)
+
+def _user_write(func):
+    """Операция записи данных пользователя: после неё версия его данных увеличивается.
+    
+    Пользователь берётся из аргумента user_id, а если его нет - из поля userId первого аргумента (документа).
+    """
+    params = list(inspect.signature(func).parameters)
+    position = params.index('user_id') if 'user_id' in params else None
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if position is None:
+                doc = args[0] if args else kwargs.get(params[0])
+                user_id = doc.get('userId') if isinstance(doc, dict) else None
+            else:
+                user_id = args[position] if len(args) > position else kwargs.get('user_id')
+            if user_id is not None:
+                with _data_versions_lock:
+                    _data_versions[user_id] = _data_versions.get(user_id, 0) + 1
+    return wrapper
 
 # === Авторизация (устарело, оставлено для совместимости) ===
 def is_authorized(user_id: int) -> bool:
@@ -53,63 +694,89 @@ def is_authorized(user_id: int) -> bool:
     return is_subscribed(user_id)
 
 # === Подписки ===
+# Индекс по текущему списку подписок (см. _subscription_index)
+_subscriptions_index: Optional[SubscriptionIndex] = None
+
+def _subscription_index() -> Optional[SubscriptionIndex]:
+    """Индекс подписок по закэшированному subscriptions.json (None без STORAGE_CACHE)"""
+    global _subscriptions_index
+    if not STORAGE_CACHE:
+        return None
+    subscriptions = _read_json(SUBSCRIPTIONS_FILE)
+    index = _subscriptions_index
+    if index is None or index.source is not subscriptions:
+        index = _subscriptions_index = SubscriptionIndex(subscriptions)
+    return index
+
 def get_user_subscription(user_id: int) -> Optional[Dict]:
     """Получить информацию о подписке пользователя"""
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    if not os.path.exists(SUBSCRIPTIONS_FILE):
-        logger.debug(f"get_user_subscription: файл {SUBSCRIPTIONS_FILE} не существует")
-        return None
-    
+    if _sqlite:
+        return _sqlite.get_user_subscription(user_id)
     try:
-        with open(SUBSCRIPTIONS_FILE, 'r', encoding='utf-8') as f:
-            subscriptions = json.load(f)
-        logger.debug(f"get_user_subscription: загружено {len(subscriptions)} подписок")
+        index = _subscription_index()
+        if index is not None:
+            subscription = index.get(user_id)
+            return dict(subscription) if subscription is not None else None
         
-        for sub in subscriptions:
+        for sub in _read_json(SUBSCRIPTIONS_FILE):
             if sub.get('userId') == user_id:
-                logger.debug(f"get_user_subscription: найдена подписка для user_id={user_id}")
-                return sub
-        
-        logger.debug(f"get_user_subscription: подписка не найдена для user_id={user_id}")
+                return dict(sub)
         return None
     except Exception as e:
-        logger.error(f"get_user_subscription: ошибка при чтении файла: {e}", exc_info=True)
+        import logging
+        logging.getLogger(__name__).error(f"get_user_subscription: ошибка при чтении файла: {e}", exc_info=True)
         return None
 
+def get_expiring_subscriptions(until: datetime) -> List[Dict]:
+    """Получить действующие подписки, которые закончатся раньше until (по возрастанию даты окончания)"""
+    if _sqlite:
+        return _sqlite.get_expiring_subscriptions(until)
+    now = datetime.now()
+    index = _subscription_index()
+    if index is None:
+        index = SubscriptionIndex(_read_json(SUBSCRIPTIONS_FILE))
+    return [dict(sub) for sub in index.expiring(now, until)]
+
+@_user_write
 def save_subscription(user_id: int, subscription_data: Dict):
     """Сохранить информацию о подписке"""
+    if _sqlite:
+        return _sqlite.save_subscription(user_id, subscription_data)
     import logging
     logger = logging.getLogger(__name__)
     
-    subscriptions = []
-    if os.path.exists(SUBSCRIPTIONS_FILE):
+    with locks.locked(SUBSCRIPTIONS_FILE):
+        subscriptions = []
+        if os.path.exists(SUBSCRIPTIONS_FILE):
+            try:
+                subscriptions = _read_json(SUBSCRIPTIONS_FILE, revalidate=STORAGE_FILE_LOCKS)
+                logger.debug(f"save_subscription: загружено {len(subscriptions)} подписок из файла")
+            except Exception as e:
+                logger.error(f"save_subscription: ошибка при чтении файла: {e}", exc_info=True)
+                subscriptions = []
+        index = _subscriptions_index
+        if index is not None and index.source is not subscriptions:
+            index = None
+        
+        # Удаляем старую подписку пользователя
+        old_count = len(subscriptions)
+        subscriptions = [s for s in subscriptions if s.get('userId') != user_id]
+        if old_count != len(subscriptions):
+            logger.info(f"save_subscription: удалена старая подписка для user_id={user_id}")
+        
+        # Добавляем новую
+        subscription_data['userId'] = user_id
+        subscriptions.append(subscription_data)
+        
         try:
-            with open(SUBSCRIPTIONS_FILE, 'r', encoding='utf-8') as f:
-                subscriptions = json.load(f)
-            logger.debug(f"save_subscription: загружено {len(subscriptions)} подписок из файла")
+            _write_json(SUBSCRIPTIONS_FILE, subscriptions)
+            logger.info(f"save_subscription: подписка сохранена для user_id={user_id}, всего подписок: {len(subscriptions)}")
         except Exception as e:
-            logger.error(f"save_subscription: ошибка при чтении файла: {e}", exc_info=True)
-            subscriptions = []
-    
-    # Удаляем старую подписку пользователя
-    old_count = len(subscriptions)
-    subscriptions = [s for s in subscriptions if s.get('userId') != user_id]
-    if old_count != len(subscriptions):
-        logger.info(f"save_subscription: удалена старая подписка для user_id={user_id}")
-    
-    # Добавляем новую
-    subscription_data['userId'] = user_id
-    subscriptions.append(subscription_data)
-    
-    try:
-        with open(SUBSCRIPTIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(subscriptions, f, ensure_ascii=False, indent=2)
-        logger.info(f"save_subscription: подписка сохранена для user_id={user_id}, всего подписок: {len(subscriptions)}")
-    except Exception as e:
-        logger.error(f"save_subscription: ошибка при сохранении файла: {e}", exc_info=True)
-        raise
+            logger.error(f"save_subscription: ошибка при сохранении файла: {e}", exc_info=True)
+            raise
+        if index is not None:
+            # Остальные подписки в новом списке - те же объекты, обновляем только этого пользователя
+            index.replace(user_id, subscription_data, subscriptions)
 
 def grant_access(user_id: int, days: int = 30, is_trial: bool = False):
     """Выдать доступ пользователю на указанное количество дней"""
@@ -135,44 +802,65 @@ def grant_access(user_id: int, days: int = 30, is_trial: bool = False):
     
     return expires_at
 
+# TEST_MODE из config.py (None - ещё не загружен)
+_test_mode: Optional[bool] = None
+
+def _is_test_mode() -> bool:
+    """Включён ли тестовый режим (TEST_MODE из config.py)"""
+    global _test_mode
+    if _test_mode is None:
+        # Импортируем здесь, чтобы избежать циклических импортов
+        try:
+            from config import TEST_MODE
+            _test_mode = TEST_MODE
+        except Exception as e:
+            # Если config не загружен, считаем что тестовый режим
+            import logging
+            logging.getLogger(__name__).warning(f"is_subscribed: не удалось загрузить TEST_MODE: {e}, возвращаем True")
+            return True
+    return _test_mode
+
 def is_subscribed(user_id: int) -> bool:
     """Проверить, есть ли активная подписка"""
-    import logging
-    logger = logging.getLogger(__name__)
+    if _is_test_mode():
+        return True  # В тестовом режиме все имеют доступ
     
-    # Импортируем здесь, чтобы избежать циклических импортов
-    try:
-        from config import TEST_MODE
-        if TEST_MODE:
-            logger.debug(f"is_subscribed: TEST_MODE=True для user_id={user_id}, возвращаем True")
-            return True  # В тестовом режиме все имеют доступ
-    except Exception as e:
-        # Если config не загружен, считаем что тестовый режим
-        logger.warning(f"is_subscribed: не удалось загрузить TEST_MODE: {e}, возвращаем True")
-        return True
+    if not _sqlite:
+        index = _subscription_index()
+        if index is not None:
+            # Дата окончания уже разобрана в индексе - проверка без чтения файла и логов
+            return index.is_active(user_id, datetime.now())
     
     subscription = get_user_subscription(user_id)
-    logger.debug(f"is_subscribed: user_id={user_id}, subscription={subscription is not None}")
-    
     if not subscription:
-        logger.info(f"is_subscribed: подписка не найдена для user_id={user_id}")
         return False
     
     # Проверяем, не истекла ли подписка
-    expires_at = subscription.get('expiresAt')
-    if expires_at:
-        try:
-            expire_date = datetime.fromisoformat(expires_at)
-            is_active = datetime.now() < expire_date
-            logger.debug(f"is_subscribed: user_id={user_id}, expires_at={expires_at}, is_active={is_active}")
-            return is_active
-        except Exception as e:
-            logger.error(f"is_subscribed: ошибка при парсинге expires_at: {e}")
-            return False
+    expires_at = parse_expires_at(subscription)
+    if expires_at is None:
+        return subscription.get('active', False)
+    if expires_at is False:
+        import logging
+        logging.getLogger(__name__).error(f"is_subscribed: не удалось разобрать expiresAt={subscription.get('expiresAt')!r} для user_id={user_id}")
+        return False
+    return datetime.now() < expires_at
+
+def is_subscribed_cached(user_id: int) -> Optional[bool]:
+    """is_subscribed только по данным в памяти (None - для ответа нужен файл или база).
     
-    is_active = subscription.get('active', False)
-    logger.debug(f"is_subscribed: user_id={user_id}, active={is_active}")
-    return is_active
+    Годится, пока индекс подписок построен по закэшированному файлу, который сверялся с диском
+    не раньше STORAGE_CACHE_CHECK_INTERVAL секунд назад - так же, как при обычном чтении через кэш.
+    """
+    if _is_test_mode():
+        return True
+    if _sqlite or not STORAGE_CACHE:
+        return None
+    index = _subscriptions_index
+    cached = _file_cache.get(SUBSCRIPTIONS_FILE)
+    if (index is None or cached is None or cached['data'] is not index.source or
+            time.monotonic() - cached['checked'] >= STORAGE_CACHE_CHECK_INTERVAL):
+        return None
+    return index.is_active(user_id, datetime.now())
 
 # === Пользователи ===
 def _migrate_users_format(users_data):
@@ -186,131 +874,404 @@ def _migrate_users_format(users_data):
     # Если уже новый формат, возвращаем как есть
     return users_data
 
+# Реестр пользователей в памяти: userId -> запись users.json (в порядке появления)
+_users_registry: Optional[Dict[int, Dict]] = None
+# Отпечатки users.json и журнала, по которым загружен реестр (сверяются при STORAGE_FILE_LOCKS)
+_users_stamps = None
+
+def _users_file_stamps():
+    return (_file_stamp(USERS_FILE), _file_stamp(USERS_JOURNAL_FILE))
+
+def _users_state() -> Dict[int, Dict]:
+    """Реестр пользователей: users.json + журнал новых ID (загружается один раз).
+    
+    С STORAGE_FILE_LOCKS реестр перечитывается, если файлы изменил другой процесс.
+    """
+    global _users_registry, _users_stamps
+    registry = _users_registry
+    if registry is not None and (not STORAGE_FILE_LOCKS or _users_stamps == _users_file_stamps()):
+        return registry
+    
+    with locks.locked(USERS_FILE):
+        if _users_registry is not None and (not STORAGE_FILE_LOCKS or _users_stamps == _users_file_stamps()):
+            return _users_registry
+        users_data = _parse_json_file(USERS_FILE)
+        registry = {}
+        for user in _migrate_users_format(users_data):
+            user = user if isinstance(user, dict) else {'userId': user, 'feedback_given': False}
+            registry.setdefault(user.get('userId'), user)
+        
+        journal_size = 0
+        if os.path.exists(USERS_JOURNAL_FILE):
+            with open(USERS_JOURNAL_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        user_id = json.loads(line)['userId']
+                    except (ValueError, KeyError, TypeError):
+                        # Недописанная строка в конце журнала после сбоя
+                        continue
+                    registry.setdefault(user_id, {'userId': user_id, 'feedback_given': False})
+            journal_size = os.path.getsize(USERS_JOURNAL_FILE)
+        
+        _users_registry = registry
+        if journal_size or (users_data and isinstance(users_data[0], int)):
+            # Сворачиваем журнал (и старый формат) в users.json сразу при загрузке
+            _write_users(registry)
+        else:
+            _users_stamps = _users_file_stamps()
+        return registry
+
+def _write_users(registry: Dict[int, Dict]):
+    """Записать реестр в users.json и удалить свёрнутый в него журнал (под блокировкой USERS_FILE)"""
+    global _users_registry, _users_stamps
+    try:
+        atomic_write_json(USERS_FILE, list(registry.values()))
+        if os.path.exists(USERS_JOURNAL_FILE):
+            os.remove(USERS_JOURNAL_FILE)
+    except Exception:
+        # Реестр мог уже измениться на месте - перечитаем его с диска
+        _users_registry = None
+        raise
+    _users_stamps = _users_file_stamps()
+
+def _fold_users_journal():
+    """Свернуть журнал новых пользователей в users.json"""
+    if not os.path.exists(USERS_JOURNAL_FILE):
+        return
+    with locks.locked(USERS_FILE):
+        registry = _users_state()
+        if os.path.exists(USERS_JOURNAL_FILE):
+            _write_users(registry)
+
 def save_user_id(user_id: int):
     """Сохранить ID пользователя (если его еще нет в списке)"""
-    users = []
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            users_data = json.load(f)
-            users = _migrate_users_format(users_data)
+    global _users_stamps
+    if _sqlite:
+        return _sqlite.save_user_id(user_id)
+    # Известный пользователь - только проверка в памяти
+    if user_id in _users_state():
+        return
     
-    # Проверяем, есть ли уже такой пользователь
-    user_exists = any(u.get('userId') == user_id if isinstance(u, dict) else u == user_id for u in users)
-    
-    if not user_exists:
-        users.append({'userId': user_id, 'feedback_given': False})
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
+    with locks.locked(USERS_FILE):
+        registry = _users_state()
+        if user_id in registry:
+            return
+        # Новый ID дописываем в журнал, а не перезаписываем users.json целиком
+        with open(USERS_JOURNAL_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'userId': user_id}) + '\n')
+            sync_appended(f)
+        registry[user_id] = {'userId': user_id, 'feedback_given': False}
+        _users_stamps = _users_file_stamps()
+
+def is_known_user(user_id: int) -> bool:
+    """Есть ли ID в уже загруженном реестре пользователей (только проверка в памяти, без чтения файлов)"""
+    if _sqlite:
+        return _sqlite.is_known_user(user_id)
+    registry = _users_registry
+    return registry is not None and user_id in registry
 
 def get_all_user_ids() -> List[int]:
     """Получить список всех ID пользователей"""
-    if not os.path.exists(USERS_FILE):
-        return []
-    
-    with open(USERS_FILE, 'r', encoding='utf-8') as f:
-        users_data = json.load(f)
-        users = _migrate_users_format(users_data)
-        return [u.get('userId') if isinstance(u, dict) else u for u in users]
+    if _sqlite:
+        return _sqlite.get_all_user_ids()
+    return list(_users_state())
 
 def get_user_feedback_given(user_id: int) -> bool:
     """Получить статус feedback_given для пользователя"""
-    if not os.path.exists(USERS_FILE):
-        return False
-    
-    with open(USERS_FILE, 'r', encoding='utf-8') as f:
-        users_data = json.load(f)
-        users = _migrate_users_format(users_data)
-        
-        for user in users:
-            user_id_val = user.get('userId') if isinstance(user, dict) else user
-            if user_id_val == user_id:
-                return user.get('feedback_given', False) if isinstance(user, dict) else False
-    
-    return False
+    if _sqlite:
+        return _sqlite.get_user_feedback_given(user_id)
+    user = _users_state().get(user_id)
+    return user.get('feedback_given', False) if user else False
 
+@_user_write
 def set_user_feedback_given(user_id: int, value: bool = True):
     """Установить feedback_given для пользователя"""
-    users = []
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            users_data = json.load(f)
-            users = _migrate_users_format(users_data)
-            # Если была миграция, сохраняем новый формат
-            if users_data and isinstance(users_data[0], int):
-                with open(USERS_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(users, f, ensure_ascii=False, indent=2)
-    
-    # Ищем пользователя и обновляем его
-    found = False
-    for i, user in enumerate(users):
-        user_id_val = user.get('userId') if isinstance(user, dict) else user
-        if user_id_val == user_id:
-            if isinstance(user, dict):
-                users[i]['feedback_given'] = value
-            else:
-                # Конвертируем старый формат в новый
-                users[i] = {'userId': user_id, 'feedback_given': value}
-            found = True
-            break
+    if _sqlite:
+        return _sqlite.set_user_feedback_given(user_id, value)
+    with locks.locked(USERS_FILE):
+        registry = _users_state()
+        user = registry.get(user_id)
+        # Если пользователь не найден, добавляем его
+        if user is None:
+            user = registry[user_id] = {'userId': user_id}
+        user['feedback_given'] = value
+        # Заодно сворачиваем журнал новых пользователей
+        _write_users(registry)
+
+# === Статистика для администратора ===
+# Последний снимок статистики (см. get_admin_statistics)
+_admin_stats: Optional[Dict] = None
+
+def _items_per_user(filepath: str) -> Dict[int, int]:
+    """Число элементов коллекции у каждого пользователя - за один проход по файлу (или по файлам пользователей)"""
+    if STORAGE_LAYOUT == 'sharded':
+        counts = {}
+        for uid in _shard_user_ids():
+            items = _read_json(_shard_path(filepath, uid))
+            if items:
+                counts[uid] = len(items)
+        return counts
+    if _is_entries_file(filepath):
+        index = _entry_index(filepath)
+        if index is not None:
+            return index.counts_by_user()
+    counts = {}
+    for item in _read_json(filepath):
+        uid = item.get('userId')
+        counts[uid] = counts.get(uid, 0) + 1
+    return counts
+
+def _compute_admin_statistics() -> Dict:
+    """Посчитать статистику по всем пользователям: каждая коллекция читается один раз"""
+    user_ids = get_all_user_ids()
+    if _sqlite:
+        entries = _sqlite.count_items_by_user('entries')
+        projects = _sqlite.count_items_by_user('projects')
+        subscriptions = SubscriptionIndex(_sqlite.get_all_subscriptions())
+    else:
+        entries = _items_per_user(ENTRIES_FILE)
+        projects = _items_per_user(PROJECTS_FILE)
+        subscriptions = _subscription_index() or SubscriptionIndex(_read_json(SUBSCRIPTIONS_FILE))
+    test_mode = _is_test_mode()
+    now = datetime.now()
+    
+    per_user = {}
+    for uid in user_ids:
+        # Как и раньше: есть подписка и она действует (в тестовом режиме - просто есть)
+        subscribed = subscriptions.get(uid) is not None and (test_mode or subscriptions.is_active(uid, now))
+        per_user[uid] = {'entries': entries.get(uid, 0), 'projects': projects.get(uid, 0), 'subscribed': subscribed}
+    return {
+        'date': now.strftime('%Y-%m-%d'),
+        'createdAt': now.isoformat(),
+        'user_ids': user_ids,
+        'total_users': len(user_ids),
+        'active_subscriptions': sum(1 for stats in per_user.values() if stats['subscribed']),
+        'total_entries': sum(stats['entries'] for stats in per_user.values()),
+        'total_projects': sum(stats['projects'] for stats in per_user.values()),
+        'per_user': per_user,
+    }
+
+def _load_admin_stats_snapshot() -> Optional[Dict]:
+    """Снимок статистики из admin_stats.json (None, если файла нет или он повреждён)"""
+    try:
+        with open(ADMIN_STATS_FILE, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+        # Ключи JSON-объекта - строки, возвращаем числовые ID
+        stats['per_user'] = {int(uid): value for uid, value in stats['per_user'].items()}
+        return stats
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).warning(f"Не удалось прочитать снимок статистики {ADMIN_STATS_FILE}: {e}")
+        return None
+
+def get_admin_statistics(fresh: bool = False) -> Dict:
+    """Статистика по всем пользователям: всего пользователей, подписок, записей и проектов, и то же по каждому.
     
-    # Если пользователь не найден, добавляем его
-    if not found:
-        users.append({'userId': user_id, 'feedback_given': value})
+    С ADMIN_STATS_SNAPSHOT=true результат за день сохраняется в admin_stats.json и до конца дня
+    отдаётся из снимка; fresh=True пересчитывает его заново.
+    """
+    global _admin_stats
+    if not ADMIN_STATS_SNAPSHOT:
+        return _compute_admin_statistics()
     
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+    today = datetime.now().strftime('%Y-%m-%d')
+    if not fresh:
+        if _admin_stats is None:
+            _admin_stats = _load_admin_stats_snapshot()
+        if _admin_stats is not None and _admin_stats.get('date') == today:
+            return _admin_stats
+    
+    stats = _compute_admin_statistics()
+    try:
+        atomic_write_json(ADMIN_STATS_FILE, stats, indent=None)
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).error(f"Не удалось сохранить снимок статистики {ADMIN_STATS_FILE}: {e}", exc_info=True)
+    _admin_stats = stats
+    return stats
+
+# === Подписчики на изменения записей ===
+# Производные данные вне хранилища (например, состояние челленджей) обновляются по одному изменённому дню
+_entry_listeners: List[Callable[[int, Optional[str]], None]] = []
+
+def add_entry_listener(listener: Callable[[int, Optional[str]], None]):
+    """Вызывать listener(user_id, date) после каждого изменения записей пользователя (date=None - удалены все записи)"""
+    _entry_listeners.append(listener)
+
+def _notify_entry_listeners(user_id: int, date: Optional[str]):
+    import logging
+    for listener in list(_entry_listeners):
+        try:
+            listener(user_id, date)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Ошибка обработчика изменения записей для user_id={user_id}: {e}", exc_info=True)
 
 # === Записи о крестиках ===
 def get_entries(user_id: Optional[int] = None) -> List[Dict]:
     """Получить все записи или записи конкретного пользователя"""
-    with open(ENTRIES_FILE, 'r', encoding='utf-8') as f:
-        entries = json.load(f)
+    if _sqlite:
+        return _sqlite.get_entries(user_id)
     if user_id:
-        return [e for e in entries if e.get('userId') == user_id]
-    return entries
+        index = _entry_index(_user_file(ENTRIES_FILE, user_id))
+        if index is not None:
+            return [dict(e) for e in index.for_user(user_id)]
+    return _load_items(ENTRIES_FILE, user_id)
 
+@_user_write
 def add_count_to_date(date: str, count: float, user_id: int, hashtag: Optional[str] = None):
     """Добавить крестики за дату с опциональным хэштегом"""
-    entries = get_entries()
-    # Ищем существующую запись за эту дату без хэштега или с таким же хэштегом
-    found = False
-    for entry in entries:
-        if (entry.get('date') == date and 
-            entry.get('userId') == user_id and 
-            entry.get('hashtag') == hashtag):
-            entry['count'] = float(entry.get('count', 0)) + count
-            found = True
-            break
-    
-    if not found:
-        entry_data = {
+    if _sqlite:
+        _sqlite.add_count_to_date(date, count, user_id, hashtag)
+    else:
+        _run_entry_op({
+            'op': 'add',
             'id': f"{date}-{user_id}-{int(datetime.now().timestamp())}",
             'date': date,
             'count': count,
-            'userId': user_id
-        }
-        if hashtag:
-            entry_data['hashtag'] = hashtag
-        entries.append(entry_data)
-    
-    with open(ENTRIES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
+            'userId': user_id,
+            'hashtag': hashtag
+        })
+    _notify_entry_listeners(user_id, date)
 
 def get_entries_by_hashtag(hashtag: str, user_id: int) -> List[Dict]:
     """Получить записи по хэштегу"""
+    if _sqlite:
+        return _sqlite.get_entries_by_hashtag(hashtag, user_id)
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is not None:
+        return [dict(e) for e in index.for_hashtag(user_id, hashtag)]
     entries = get_entries(user_id)
     return [e for e in entries if e.get('hashtag') == hashtag]
 
+def get_entries_by_date(date: str, user_id: int) -> List[Dict]:
+    """Получить записи пользователя за дату"""
+    if _sqlite:
+        return _sqlite.get_entries_by_date(date, user_id)
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is not None:
+        return [dict(e) for e in index.for_date(user_id, date)]
+    entries = get_entries(user_id)
+    return [e for e in entries if e.get('date') == date]
+
+def get_daily_totals(user_id: int, hashtag: Optional[str] = None) -> Dict[str, float]:
+    """Получить сумму крестиков по дням {дата: сумма} (по всем хэштегам или по одному)"""
+    if _sqlite:
+        return _sqlite.get_daily_totals(user_id, hashtag)
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is None:
+        index = EntryIndex(get_entries(user_id))
+    return index.daily_totals(user_id, hashtag)
+
+def get_daily_hashtag_totals(user_id: int) -> Dict[str, Dict[Optional[str], float]]:
+    """Получить сумму крестиков по дням с разбивкой по хэштегам {дата: {хэштег: сумма}} (None - без хэштега)"""
+    if _sqlite:
+        return _sqlite.get_daily_hashtag_totals(user_id)
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is None:
+        index = EntryIndex(get_entries(user_id))
+    return index.daily_hashtag_totals(user_id)
+
+def _date_bound(value) -> Optional[str]:
+    """Граница интервала дат: date -> 'YYYY-MM-DD', строка и None - как есть"""
+    return value.isoformat() if isinstance(value, date_type) else value
+
+def range_total(user_id: int, start=None, end=None, hashtag: Optional[str] = None) -> float:
+    """Сумма крестиков пользователя за даты start <= date <= end (date или 'YYYY-MM-DD', None - без границы)"""
+    start, end = _date_bound(start), _date_bound(end)
+    if _sqlite:
+        return _sqlite.range_total(user_id, start, end, hashtag)
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is None:
+        return EntryIndex(get_entries(user_id)).range_total(user_id, start, end, hashtag)
+    # Накопленные суммы достраиваются при чтении - не даём записям меняться в это время
+    with _locked(ENTRIES_FILE, user_id):
+        return index.range_total(user_id, start, end, hashtag)
+
+def range_days(user_id: int, start=None, end=None, hashtag: Optional[str] = None) -> int:
+    """Число дней с записями пользователя за даты start <= date <= end"""
+    start, end = _date_bound(start), _date_bound(end)
+    if _sqlite:
+        return _sqlite.range_days(user_id, start, end, hashtag)
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is None:
+        return EntryIndex(get_entries(user_id)).range_days(user_id, start, end, hashtag)
+    with _locked(ENTRIES_FILE, user_id):
+        return index.range_days(user_id, start, end, hashtag)
+
+def get_plans_progress(user_id: int, plans: List[Dict]) -> List[float]:
+    """Прогресс планов пользователя (в порядке plans) за одно чтение записей.
+    
+    Прогресс плана - крестики с даты создания плана (createdAt) по его хэштегу или по всем записям;
+    у старых планов без createdAt - все записи.
+    """
+    spans = [(plan.get('createdAt') or None, plan.get('hashtag') or None) for plan in plans]
+    if _sqlite:
+        return [_sqlite.range_total(user_id, start, None, hashtag) for start, hashtag in spans]
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is None:
+        # Без кэша файл читается один раз на все планы, а не на каждый план
+        index = EntryIndex(get_entries(user_id))
+        return [index.range_total(user_id, start, None, hashtag) for start, hashtag in spans]
+    with _locked(ENTRIES_FILE, user_id):
+        return [index.range_total(user_id, start, None, hashtag) for start, hashtag in spans]
+
+def get_streak(user_id: int, start: Optional[date_type] = None, today: Optional[date_type] = None) -> Dict[str, int]:
+    """Получить серию дней подряд с записями: текущую (до сегодня включительно, не раньше start) и самую длинную"""
+    today_day = (today or datetime.now().date()).toordinal()
+    start_day = start.toordinal() if start else None
+    if _sqlite:
+        return _sqlite.get_streak(user_id, today_day, start_day)
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is None:
+        return EntryIndex(get_entries(user_id)).streak(user_id, today_day, start_day)
+    with _locked(ENTRIES_FILE, user_id):
+        return index.streak(user_id, today_day, start_day)
+
+def get_entry_stats(user_id: int, today: Optional[date_type] = None) -> Dict:
+    """Получить сводную статистику пользователя для экрана статистики (сегодня, месяц, год, всего, рекорды)"""
+    if _sqlite:
+        return _sqlite.get_entry_stats(user_id, today)
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+    if index is None:
+        index = EntryIndex(get_entries(user_id))
+        return index.stats(user_id).summary(today, functools.partial(index.first_entry, user_id))
+    # Статистика обновляется вместе с записями - собираем и читаем её, пока записи не меняются
+    with _locked(ENTRIES_FILE, user_id):
+        return index.stats(user_id).summary(today, functools.partial(index.first_entry, user_id))
+
+def rebuild_entry_stats(user_id: Optional[int] = None):
+    """Пересобрать сводную статистику по записям (пользователя или всех), если она разошлась с данными"""
+    if _sqlite:
+        return _sqlite.rebuild_entry_stats(user_id)
+    if user_id:
+        stores = [_entry_index(_user_file(ENTRIES_FILE, user_id))]
+    else:
+        with _cache_lock:
+            stores = list(_entry_indexes.values()) + [cached['data'] for cached in _file_cache.values()]
+            stores += list(_pending_writes.values())
+        stores += list(_journal_states.values())
+    for store in stores:
+        # Статистика сбрасывается и при следующем запросе собирается заново по записям
+        if isinstance(store, (EntryIndex, CompactEntries)):
+            store.reset_stats(user_id)
+
 def get_all_hashtags(user_id: int) -> List[str]:
     """Получить все уникальные хэштеги пользователя (из записей и проектов)"""
-    entries = get_entries(user_id)
     projects = get_projects(user_id)
     hashtags = set()
     
     # Хэштеги из записей о крестиках
-    for entry in entries:
-        if entry.get('hashtag'):
-            hashtags.add(entry.get('hashtag'))
+    index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if not _sqlite and user_id else None
+    if _sqlite:
+        hashtags.update(_sqlite.get_entry_hashtags(user_id))
+    elif index is not None:
+        hashtags.update(index.hashtags(user_id))
+    else:
+        for entry in get_entries(user_id):
+            if entry.get('hashtag'):
+                hashtags.add(entry.get('hashtag'))
     
     # Хэштеги из проектов
     for project in projects:
@@ -319,6 +1280,31 @@ def get_all_hashtags(user_id: int) -> List[str]:
     
     return sorted(list(hashtags))
 
+def get_hashtag_summary(user_id: int) -> Dict[str, Dict]:
+    """Сводка по хэштегам пользователя (из записей и проектов) за одно чтение записей и проектов.
+    
+    {хэштег: {'total', 'entries', 'days', 'first_date', 'last_date', 'projects'}}, хэштеги по алфавиту;
+    у хэштега только из проектов total, entries и days равны 0, а даты - None.
+    """
+    if _sqlite:
+        summary = _sqlite.get_hashtag_summary(user_id)
+    else:
+        index = _entry_index(_user_file(ENTRIES_FILE, user_id)) if user_id else None
+        if index is None:
+            summary = EntryIndex(get_entries(user_id)).hashtag_summary(user_id)
+        else:
+            with _locked(ENTRIES_FILE, user_id):
+                summary = index.hashtag_summary(user_id)
+    
+    for item in summary.values():
+        item['projects'] = []
+    for project in get_projects(user_id):
+        hashtag = project.get('hashtag')
+        if hashtag:
+            empty = {'total': 0, 'entries': 0, 'days': 0, 'first_date': None, 'last_date': None, 'projects': []}
+            summary.setdefault(hashtag, empty)['projects'].append(project)
+    return {hashtag: summary[hashtag] for hashtag in sorted(summary)}
+
 def get_projects_by_hashtag(hashtag: str, user_id: int) -> List[Dict]:
     """Получить проекты по хэштегу"""
     projects = get_projects(user_id)
@@ -327,226 +1313,238 @@ def get_projects_by_hashtag(hashtag: str, user_id: int) -> List[Dict]:
 # === Проекты ===
 def get_projects(user_id: Optional[int] = None) -> List[Dict]:
     """Получить все проекты или проекты конкретного пользователя"""
-    with open(PROJECTS_FILE, 'r', encoding='utf-8') as f:
-        projects = json.load(f)
-    if user_id:
-        return [p for p in projects if p.get('userId') == user_id]
-    return projects
+    if _sqlite:
+        return _sqlite.get_projects(user_id)
+    return _load_items(PROJECTS_FILE, user_id)
 
+@_user_write
 def save_project(project: Dict):
     """Сохранить проект"""
-    projects = get_projects()
-    # Ищем существующий
-    found = False
-    for i, p in enumerate(projects):
-        if p.get('id') == project.get('id'):
-            projects[i] = project
-            found = True
-            break
-    
-    if not found:
-        projects.append(project)
-    
-    with open(PROJECTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(projects, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.save_project(project)
+    with _locked(PROJECTS_FILE, project.get('userId')):
+        projects, others = _load_user_items(PROJECTS_FILE, project.get('userId'))
+        # Ищем существующий
+        found = False
+        for i, p in enumerate(projects):
+            if p.get('id') == project.get('id'):
+                projects[i] = project
+                found = True
+                break
+        
+        if not found:
+            projects.append(project)
+        
+        _store_user_items(PROJECTS_FILE, project.get('userId'), projects, others)
 
+@_user_write
 def remove_project_photo(project_id: str, user_id: int):
     """Удалить фото из проекта"""
-    projects = get_projects()
-    for i, p in enumerate(projects):
-        if p.get('id') == project_id and p.get('userId') == user_id:
-            if 'imageFileId' in projects[i]:
-                del projects[i]['imageFileId']
-            with open(PROJECTS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(projects, f, ensure_ascii=False, indent=2)
-            return True
-    return False
+    if _sqlite:
+        return _sqlite.remove_project_photo(project_id, user_id)
+    with _locked(PROJECTS_FILE, user_id):
+        projects, others = _load_user_items(PROJECTS_FILE, user_id)
+        for i, p in enumerate(projects):
+            if p.get('id') == project_id:
+                if 'imageFileId' in projects[i]:
+                    del projects[i]['imageFileId']
+                _store_user_items(PROJECTS_FILE, user_id, projects, others)
+                return True
+        return False
 
+@_user_write
 def delete_project(project_id: str, user_id: int) -> bool:
     """Удалить проект"""
-    projects = get_projects()
-    original_count = len(projects)
-    projects = [p for p in projects if not (p.get('id') == project_id and p.get('userId') == user_id)]
-    
-    if len(projects) < original_count:
-        with open(PROJECTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(projects, f, ensure_ascii=False, indent=2)
-        return True
-    return False
+    if _sqlite:
+        return _sqlite.delete_project(project_id, user_id)
+    with _locked(PROJECTS_FILE, user_id):
+        projects, others = _load_user_items(PROJECTS_FILE, user_id)
+        original_count = len(projects)
+        projects = [p for p in projects if p.get('id') != project_id]
+        
+        if len(projects) < original_count:
+            _store_user_items(PROJECTS_FILE, user_id, projects, others)
+            return True
+        return False
 
+@_user_write
 def delete_all_user_data(user_id: int):
     """Удалить все данные пользователя (ID остается в списке для статистики)"""
+    if _sqlite:
+        _sqlite.delete_all_user_data(user_id)
+        _notify_entry_listeners(user_id, None)
+        return
     # Удаляем записи
-    entries = get_entries()
-    entries = [e for e in entries if e.get('userId') != user_id]
-    with open(ENTRIES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
-    
-    # Удаляем проекты
-    projects = get_projects()
-    projects = [p for p in projects if p.get('userId') != user_id]
-    with open(PROJECTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(projects, f, ensure_ascii=False, indent=2)
-    
-    # Удаляем вишлист
-    wishlist = get_wishlist()
-    wishlist = [w for w in wishlist if w.get('userId') != user_id]
-    with open(WISHLIST_FILE, 'w', encoding='utf-8') as f:
-        json.dump(wishlist, f, ensure_ascii=False, indent=2)
-    
-    # Удаляем заметки
-    notes = get_notes()
-    notes = [n for n in notes if n.get('userId') != user_id]
-    with open(NOTES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(notes, f, ensure_ascii=False, indent=2)
-    
-    # Удаляем планы
-    plans = get_plans()
-    plans = [p for p in plans if p.get('userId') != user_id]
-    with open(PLANS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(plans, f, ensure_ascii=False, indent=2)
-    
-    # Удаляем челленджи
-    challenges = get_user_challenges()
-    challenges = [c for c in challenges if c.get('userId') != user_id]
-    with open(CHALLENGES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(challenges, f, ensure_ascii=False, indent=2)
+    _run_entry_op({'op': 'delete_user', 'userId': user_id})
+    _notify_entry_listeners(user_id, None)
+    
+    # Удаляем проекты, вишлист, заметки, планы и челленджи
+    for filepath in USER_COLLECTION_FILES:
+        if filepath == ENTRIES_FILE:
+            continue
+        with _locked(filepath, user_id):
+            _, others = _load_user_items(filepath, user_id)
+            _store_user_items(filepath, user_id, [], others)
     
     # НЕ удаляем подписки - пользователь должен сохранить доступ к боту
     # НЕ удаляем ID из списка пользователей - для статистики и истории использования бота
 
+@_user_write
 def delete_entry_by_date(date: str, user_id: int):
     """Удалить запись за конкретную дату"""
-    entries = get_entries()
-    entries = [e for e in entries if not (e.get('date') == date and e.get('userId') == user_id)]
-    with open(ENTRIES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        _sqlite.delete_entry_by_date(date, user_id)
+    else:
+        _run_entry_op({'op': 'delete_day', 'date': date, 'userId': user_id})
+    _notify_entry_listeners(user_id, date)
 
 # === Вишлист ===
 def get_wishlist(user_id: Optional[int] = None) -> List[Dict]:
     """Получить вишлист пользователя"""
-    with open(WISHLIST_FILE, 'r', encoding='utf-8') as f:
-        wishlist = json.load(f)
-    if user_id:
-        return [w for w in wishlist if w.get('userId') == user_id]
-    return wishlist
+    if _sqlite:
+        return _sqlite.get_wishlist(user_id)
+    return _load_items(WISHLIST_FILE, user_id)
 
+@_user_write
 def add_to_wishlist(item: Dict):
     """Добавить элемент в вишлист"""
-    wishlist = get_wishlist()
-    wishlist.append(item)
-    with open(WISHLIST_FILE, 'w', encoding='utf-8') as f:
-        json.dump(wishlist, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.add_to_wishlist(item)
+    with _locked(WISHLIST_FILE, item.get('userId')):
+        wishlist, others = _load_user_items(WISHLIST_FILE, item.get('userId'))
+        wishlist.append(item)
+        _store_user_items(WISHLIST_FILE, item.get('userId'), wishlist, others)
 
+@_user_write
 def remove_from_wishlist(item_id: str, user_id: int):
     """Удалить элемент из вишлиста"""
-    wishlist = get_wishlist()
-    wishlist = [w for w in wishlist if not (w.get('id') == item_id and w.get('userId') == user_id)]
-    with open(WISHLIST_FILE, 'w', encoding='utf-8') as f:
-        json.dump(wishlist, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.remove_from_wishlist(item_id, user_id)
+    with _locked(WISHLIST_FILE, user_id):
+        wishlist, others = _load_user_items(WISHLIST_FILE, user_id)
+        wishlist = [w for w in wishlist if w.get('id') != item_id]
+        _store_user_items(WISHLIST_FILE, user_id, wishlist, others)
 
+@_user_write
 def update_wishlist_item(item_id: str, user_id: int, updates: Dict):
     """Обновить элемент вишлиста"""
-    wishlist = get_wishlist()
-    for i, item in enumerate(wishlist):
-        if item.get('id') == item_id and item.get('userId') == user_id:
-            wishlist[i].update(updates)
-            break
-    with open(WISHLIST_FILE, 'w', encoding='utf-8') as f:
-        json.dump(wishlist, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.update_wishlist_item(item_id, user_id, updates)
+    with _locked(WISHLIST_FILE, user_id):
+        wishlist, others = _load_user_items(WISHLIST_FILE, user_id)
+        for i, item in enumerate(wishlist):
+            if item.get('id') == item_id:
+                wishlist[i].update(updates)
+                break
+        _store_user_items(WISHLIST_FILE, user_id, wishlist, others)
 
 # === Заметки ===
 def get_notes(user_id: Optional[int] = None) -> List[Dict]:
     """Получить заметки пользователя"""
-    with open(NOTES_FILE, 'r', encoding='utf-8') as f:
-        notes = json.load(f)
-    if user_id:
-        return [n for n in notes if n.get('userId') == user_id]
-    return notes
+    if _sqlite:
+        return _sqlite.get_notes(user_id)
+    return _load_items(NOTES_FILE, user_id)
 
+@_user_write
 def save_note(note: Dict):
     """Сохранить заметку"""
-    notes = get_notes()
-    found = False
-    for i, n in enumerate(notes):
-        if n.get('id') == note.get('id'):
-            notes[i] = note
-            found = True
-            break
-    if not found:
-        notes.append(note)
-    with open(NOTES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(notes, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.save_note(note)
+    with _locked(NOTES_FILE, note.get('userId')):
+        notes, others = _load_user_items(NOTES_FILE, note.get('userId'))
+        found = False
+        for i, n in enumerate(notes):
+            if n.get('id') == note.get('id'):
+                notes[i] = note
+                found = True
+                break
+        if not found:
+            notes.append(note)
+        _store_user_items(NOTES_FILE, note.get('userId'), notes, others)
 
+@_user_write
 def delete_note(note_id: str, user_id: int):
     """Удалить заметку"""
-    notes = get_notes()
-    notes = [n for n in notes if not (n.get('id') == note_id and n.get('userId') == user_id)]
-    with open(NOTES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(notes, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.delete_note(note_id, user_id)
+    with _locked(NOTES_FILE, user_id):
+        notes, others = _load_user_items(NOTES_FILE, user_id)
+        notes = [n for n in notes if n.get('id') != note_id]
+        _store_user_items(NOTES_FILE, user_id, notes, others)
 
 # === Планы ===
 def get_plans(user_id: Optional[int] = None) -> List[Dict]:
     """Получить планы пользователя"""
-    with open(PLANS_FILE, 'r', encoding='utf-8') as f:
-        plans = json.load(f)
-    if user_id:
-        return [p for p in plans if p.get('userId') == user_id]
-    return plans
+    if _sqlite:
+        return _sqlite.get_plans(user_id)
+    return _load_items(PLANS_FILE, user_id)
 
+@_user_write
 def save_plan(plan: Dict):
     """Сохранить план"""
-    plans = get_plans()
-    found = False
-    for i, p in enumerate(plans):
-        if p.get('id') == plan.get('id'):
-            plans[i] = plan
-            found = True
-            break
-    if not found:
-        plans.append(plan)
-    with open(PLANS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(plans, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.save_plan(plan)
+    with _locked(PLANS_FILE, plan.get('userId')):
+        plans, others = _load_user_items(PLANS_FILE, plan.get('userId'))
+        found = False
+        for i, p in enumerate(plans):
+            if p.get('id') == plan.get('id'):
+                plans[i] = plan
+                found = True
+                break
+        if not found:
+            plans.append(plan)
+        _store_user_items(PLANS_FILE, plan.get('userId'), plans, others)
 
+@_user_write
 def delete_plan(plan_id: str, user_id: int):
     """Удалить план"""
-    plans = get_plans()
-    plans = [p for p in plans if not (p.get('id') == plan_id and p.get('userId') == user_id)]
-    with open(PLANS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(plans, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.delete_plan(plan_id, user_id)
+    with _locked(PLANS_FILE, user_id):
+        plans, others = _load_user_items(PLANS_FILE, user_id)
+        plans = [p for p in plans if p.get('id') != plan_id]
+        _store_user_items(PLANS_FILE, user_id, plans, others)
 
 # === Челленджи ===
 def get_user_challenges(user_id: Optional[int] = None) -> List[Dict]:
     """Получить челленджи пользователя"""
-    with open(CHALLENGES_FILE, 'r', encoding='utf-8') as f:
-        challenges = json.load(f)
-    if user_id:
-        return [c for c in challenges if c.get('userId') == user_id]
-    return challenges
+    if _sqlite:
+        return _sqlite.get_user_challenges(user_id)
+    return _load_items(CHALLENGES_FILE, user_id)
 
+@_user_write
 def add_user_challenge(challenge: Dict):
     """Добавить челлендж пользователю"""
-    challenges = get_user_challenges()
-    challenges.append(challenge)
-    with open(CHALLENGES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(challenges, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.add_user_challenge(challenge)
+    with _locked(CHALLENGES_FILE, challenge.get('userId')):
+        challenges, others = _load_user_items(CHALLENGES_FILE, challenge.get('userId'))
+        challenges.append(challenge)
+        _store_user_items(CHALLENGES_FILE, challenge.get('userId'), challenges, others)
 
+@_user_write
 def update_user_challenge(challenge_id: str, user_id: int, updates: Dict):
     """Обновить челлендж пользователя"""
-    challenges = get_user_challenges()
-    for i, challenge in enumerate(challenges):
-        if challenge.get('challengeId') == challenge_id and challenge.get('userId') == user_id:
-            challenges[i].update(updates)
-            break
-    with open(CHALLENGES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(challenges, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.update_user_challenge(challenge_id, user_id, updates)
+    with _locked(CHALLENGES_FILE, user_id):
+        challenges, others = _load_user_items(CHALLENGES_FILE, user_id)
+        for i, challenge in enumerate(challenges):
+            if challenge.get('challengeId') == challenge_id:
+                challenges[i].update(updates)
+                break
+        _store_user_items(CHALLENGES_FILE, user_id, challenges, others)
 
+@_user_write
 def delete_user_challenge(challenge_id: str, user_id: int):
     """Удалить челлендж пользователя"""
-    challenges = get_user_challenges()
-    challenges = [c for c in challenges if not (c.get('challengeId') == challenge_id and c.get('userId') == user_id)]
-    with open(CHALLENGES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(challenges, f, ensure_ascii=False, indent=2)
+    if _sqlite:
+        return _sqlite.delete_user_challenge(challenge_id, user_id)
+    with _locked(CHALLENGES_FILE, user_id):
+        challenges, others = _load_user_items(CHALLENGES_FILE, user_id)
+        challenges = [c for c in challenges if c.get('challengeId') != challenge_id]
+        _store_user_items(CHALLENGES_FILE, user_id, challenges, others)
 
 def get_user_challenge(challenge_id: str, user_id: int) -> Optional[Dict]:
     """Получить конкретный челлендж пользователя"""
@@ -0,0 +1,80 @@
+"""Серии дней подряд с записями о крестиках, обновляемые по одному дню"""
+from bisect import bisect_right, insort
+from typing import Dict, Iterable, List, Optional
+
+class DayRuns:
+    """Серии подряд идущих дней (порядковые номера дней) с записями.
+
+    День добавляется, когда у него появляется первая запись, и убирается, когда исчезает последняя;
+    соседние серии при этом сливаются или делятся. Текущая серия ищется бинарным поиском по началам серий.
+    """
+    __slots__ = ('_starts', '_ends', '_longest')
+
+    def __init__(self, days: Iterable[int] = ()):
+        # Начала серий по возрастанию и конец каждой серии (включительно)
+        self._starts: List[int] = []
+        self._ends: Dict[int, int] = {}
+        self._longest = 0
+        for day in sorted(set(days)):
+            if self._starts and self._ends[self._starts[-1]] == day - 1:
+                self._ends[self._starts[-1]] = day
+            else:
+                self._starts.append(day)
+                self._ends[day] = day
+        self._longest = max((end - start + 1 for start, end in self._ends.items()), default=0)
+
+    def _run(self, day: int) -> Optional[int]:
+        """Начало серии, в которую входит день (None - день без записей)"""
+        pos = bisect_right(self._starts, day) - 1
+        if pos >= 0 and self._ends[self._starts[pos]] >= day:
+            return self._starts[pos]
+        return None
+
+    def add(self, day: int):
+        """У дня появились записи"""
+        if self._run(day) is not None:
+            return
+        left = self._run(day - 1)
+        right_end = self._ends.pop(day + 1, None)
+        if right_end is not None:
+            self._starts.remove(day + 1)
+        if left is not None:
+            start = left
+        else:
+            start = day
+            insort(self._starts, day)
+        end = right_end if right_end is not None else day
+        self._ends[start] = end
+        self._longest = max(self._longest, end - start + 1)
+
+    def remove(self, day: int):
+        """У дня не осталось записей"""
+        start = self._run(day)
+        if start is None:
+            return
+        end = self._ends[start]
+        if start == day:
+            del self._ends[start]
+            self._starts.remove(start)
+        else:
+            self._ends[start] = day - 1
+        if end > day:
+            insort(self._starts, day + 1)
+            self._ends[day + 1] = end
+        if end - start + 1 == self._longest:
+            # Самая длинная серия могла быть только что разорвана - ищем заново
+            self._longest = max((e - s + 1 for s, e in self._ends.items()), default=0)
+
+    def current(self, today: int, start: Optional[int] = None) -> int:
+        """Длина серии, которая идёт до сегодняшнего дня включительно (не раньше дня start)"""
+        run_start = self._run(today)
+        if run_start is None:
+            return 0
+        if start is not None:
+            run_start = max(run_start, start)
+        return max(0, today - run_start + 1)
+
+    @property
+    def longest(self) -> int:
+        """Самая длинная серия за всё время"""
+        return self._longest
@@ -0,0 +1,76 @@
+"""Индекс подписок: по userId и по дате окончания"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+def parse_expires_at(subscription: Dict):
+    """Дата окончания подписки: datetime, None (expiresAt не задан) или False (не разбирается)"""
+    expires_at = subscription.get('expiresAt')
+    if not expires_at:
+        return None
+    try:
+        expire_date = datetime.fromisoformat(expires_at)
+    except (TypeError, ValueError):
+        return False
+    # С наивным datetime.now() сравниваются только наивные даты
+    return expire_date if expire_date.tzinfo is None else False
+
+class SubscriptionIndex:
+    """Подписки файла по userId и отсортированный по дате окончания список.
+
+    Хранит ссылки на элементы исходного списка (source), поэтому после замены
+    списка индекс нужно перестроить или обновить через replace.
+    """
+
+    def __init__(self, subscriptions: List[Dict]):
+        self.source = subscriptions
+        self._by_user: Dict[int, Dict] = {}
+        self._expires: Dict[int, object] = {}
+        # (дата окончания, userId) по возрастанию - для выборки «кто истекает в ближайшие N дней»
+        self._by_expiry: List[Tuple[datetime, int]] = []
+        for subscription in subscriptions:
+            # Как и линейный поиск, берём первую подписку пользователя
+            if subscription.get('userId') not in self._by_user:
+                self._add(subscription)
+
+    def _add(self, subscription: Dict):
+        user_id = subscription.get('userId')
+        expires = parse_expires_at(subscription)
+        self._by_user[user_id] = subscription
+        self._expires[user_id] = expires
+        if expires:
+            insort(self._by_expiry, (expires, user_id))
+
+    def _remove(self, user_id: int):
+        self._by_user.pop(user_id, None)
+        expires = self._expires.pop(user_id, None)
+        if expires:
+            pos = bisect_left(self._by_expiry, (expires, user_id))
+            if pos < len(self._by_expiry) and self._by_expiry[pos] == (expires, user_id):
+                del self._by_expiry[pos]
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        """Подписка пользователя"""
+        return self._by_user.get(user_id)
+
+    def is_active(self, user_id: int, now: datetime) -> bool:
+        """Действует ли подписка пользователя на момент now"""
+        subscription = self._by_user.get(user_id)
+        if subscription is None:
+            return False
+        expires = self._expires[user_id]
+        if expires is None:
+            return subscription.get('active', False)
+        return bool(expires) and now < expires
+
+    def expiring(self, start: datetime, end: datetime) -> List[Dict]:
+        """Подписки, которые заканчиваются в интервале (start, end), по возрастанию даты окончания"""
+        lo = bisect_right(self._by_expiry, (start, float('inf')))
+        hi = bisect_left(self._by_expiry, (end, float('-inf')))
+        return [self._by_user[user_id] for _, user_id in self._by_expiry[lo:hi]]
+
+    def replace(self, user_id: int, subscription: Dict, source: List[Dict]):
+        """Заменить подписку пользователя после перезаписи файла новым списком source"""
+        self.source = source
+        self._remove(user_id)
+        self._add(subscription)
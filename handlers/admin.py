@@ -2,12 +2,14 @@
 from aiogram import Router
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
-from datetime import datetime
-from data.storage import grant_access, get_all_user_ids, get_user_subscription, is_subscribed
+from datetime import datetime, timedelta
+from data import async_storage
+from data.storage import get_cache_stats
 from config import ADMIN_IDS
+from handlers.broadcast import is_broadcast_running, start_broadcast
 from handlers.subscription_notifications import reset_notification_flags
+from middleware.outbound import PRIORITY_NAMES, get_outbound_stats
 import logging
-import asyncio
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -30,7 +32,7 @@ async def cmd_grant_me(message: Message):
         return
     
     try:
-        expires_at = grant_access(user_id, days=36500)  # ~100 лет
+        expires_at = await async_storage.grant_access(user_id, days=36500)  # ~100 лет
         reset_notification_flags(user_id)  # Сбрасываем флаги уведомлений
         await message.answer("💛 Бесплатный доступ активирован!")
         logger.info(f"[ADMIN] Доступ выдан создателю (user_id={user_id}) до {expires_at.strftime('%d.%m.%Y')}")
@@ -63,7 +65,7 @@ async def cmd_grant(message: Message):
             await message.answer("❌ Количество дней должно быть положительным")
             return
         
-        expires_at = grant_access(target_user_id, days=days)
+        expires_at = await async_storage.grant_access(target_user_id, days=days)
         reset_notification_flags(target_user_id)  # Сбрасываем флаги уведомлений
         date_str = expires_at.strftime("%d.%m.%Y")
         await message.answer(f"🎁 Доступ пользователю {target_user_id} выдан до {date_str}")
@@ -86,85 +88,113 @@ async def cmd_send_trial(message: Message):
         logger.warning(f"[ADMIN] Попытка использования /send_trial от user_id={user_id} (не ADMIN)")
         return
     
-    try:
-        bot = message.bot
-        all_users = get_all_user_ids()
-        
-        if not all_users:
-            await message.answer("❌ Нет пользователей для рассылки")
-            return
-        
-        await message.answer(f"🔄 Начинаю рассылку пробных подписок...\nВсего пользователей: {len(all_users)}")
-        
-        success_count = 0
-        skipped_count = 0
-        error_count = 0
+    if is_broadcast_running('trial'):
+        await message.answer("⏳ Рассылка пробных подписок уже идёт")
+        return
+    
+    all_users = await async_storage.get_all_user_ids()
+    if not all_users:
+        await message.answer("❌ Нет пользователей для рассылки")
+        return
+    
+    status = await message.answer(f"🔄 Начинаю рассылку пробных подписок...\nВсего пользователей: {len(all_users)}")
+    
+    async def prepare(target_user_id: int):
+        # Проверяем, есть ли активная подписка
+        if await async_storage.is_subscribed(target_user_id):
+            logger.debug(f"[ADMIN] Пропуск user_id={target_user_id} - есть активная подписка")
+            return None
         
-        for target_user_id in all_users:
-            try:
-                # Проверяем, есть ли активная подписка
-                if is_subscribed(target_user_id):
-                    skipped_count += 1
-                    logger.debug(f"[ADMIN] Пропуск user_id={target_user_id} - есть активная подписка")
-                    continue
-                
-                # Проверяем, была ли уже выдана пробная подписка
-                subscription = get_user_subscription(target_user_id)
-                if subscription and subscription.get('isTrial'):
-                    skipped_count += 1
-                    logger.debug(f"[ADMIN] Пропуск user_id={target_user_id} - уже получал пробную подписку")
-                    continue
-                
-                # Выдаем пробную подписку на 3 дня
-                expires_at = grant_access(target_user_id, days=3, is_trial=True)
-                logger.info(f"[ADMIN] Выдана пробная подписка user_id={target_user_id}, expires_at={expires_at}")
-                
-                # Отправляем сообщение пользователю
-                try:
-                    await bot.send_message(
-                        chat_id=target_user_id,
-                        text=(
-                            '🎁 <b>Специальное предложение!</b>\n\n'
-                            'Мы предоставляем вам <b>пробную подписку на 3 дня</b>!\n\n'
-                            f'Подписка действует до: {expires_at.strftime("%d.%m.%Y")}\n\n'
-                            'Попробуйте все функции бота:\n'
-                            '• Добавление крестиков\n'
-                            '• Статистика и прогресс\n'
-                            '• Проекты с фото\n'
-                            '• Челленджи и планы\n'
-                            '• И многое другое!\n\n'
-                            'После окончания пробного периода для продолжения использования потребуется оформление подписки (99₽/мес).\n\n'
-                            'Нажмите /start для начала работы!'
-                        ),
-                        parse_mode='HTML'
-                    )
-                    success_count += 1
-                    logger.info(f"[ADMIN] Сообщение отправлено user_id={target_user_id}")
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"[ADMIN] Ошибка при отправке сообщения user_id={target_user_id}: {e}")
-                
-                # Небольшая задержка, чтобы не перегружать API Telegram
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                error_count += 1
-                logger.error(f"[ADMIN] Ошибка при обработке user_id={target_user_id}: {e}", exc_info=True)
+        # Проверяем, была ли уже выдана пробная подписка
+        subscription = await async_storage.get_user_subscription(target_user_id)
+        if subscription and subscription.get('isTrial'):
+            logger.debug(f"[ADMIN] Пропуск user_id={target_user_id} - уже получал пробную подписку")
+            return None
         
+        # Подписку выдаём только после успешной отправки (delivered); дата окончания считается так же, как в grant_access
+        expires_at = datetime.now() + timedelta(days=3)
+        return {
+            'text': (
+                '🎁 <b>Специальное предложение!</b>\n\n'
+                'Мы предоставляем вам <b>пробную подписку на 3 дня</b>!\n\n'
+                f'Подписка действует до: {expires_at.strftime("%d.%m.%Y")}\n\n'
+                'Попробуйте все функции бота:\n'
+                '• Добавление крестиков\n'
+                '• Статистика и прогресс\n'
+                '• Проекты с фото\n'
+                '• Челленджи и планы\n'
+                '• И многое другое!\n\n'
+                'После окончания пробного периода для продолжения использования потребуется оформление подписки (99₽/мес).\n\n'
+                'Нажмите /start для начала работы!'
+            ),
+            'parse_mode': 'HTML',
+        }
+    
+    async def delivered(target_user_id: int):
+        # Выдаем пробную подписку на 3 дня тем, кто получил сообщение
+        expires_at = await async_storage.grant_access(target_user_id, days=3, is_trial=True)
+        logger.info(f"[ADMIN] Выдана пробная подписка user_id={target_user_id}, expires_at={expires_at}")
+    
+    async def progress(stats):
+        resumed = ' (продолжение прерванной)' if stats['resumed'] else ''
+        await status.edit_text(
+            f"🔄 Идёт рассылка пробных подписок{resumed}...\n"
+            f"Обработано: {stats['processed']} из {stats['total']}"
+        )
+    
+    async def finished(stats):
         # Отправляем отчет администратору
         report = (
             f'✅ <b>Рассылка завершена</b>\n\n'
             f'📊 Статистика:\n'
-            f'✅ Отправлено успешно: {success_count}\n'
-            f'⏭️ Пропущено: {skipped_count}\n'
-            f'❌ Ошибок: {error_count}\n'
-            f'📊 Всего пользователей: {len(all_users)}'
+            f'✅ Отправлено успешно: {stats["sent"]}\n'
+            f'⏭️ Пропущено: {stats["skipped"]}\n'
+            f'🚫 Заблокировали бота: {stats["blocked"]}\n'
+            f'❌ Ошибок: {stats["errors"]}\n'
+            f'📊 Всего пользователей: {stats["total"]}'
         )
-        
         await message.answer(report, parse_mode='HTML')
-        logger.info(f"[ADMIN] Рассылка завершена: success={success_count}, skipped={skipped_count}, errors={error_count}")
-        
-    except Exception as e:
-        logger.error(f"[ADMIN] Критическая ошибка при рассылке: {e}", exc_info=True)
-        await message.answer(f"❌ Критическая ошибка при рассылке: {e}")
+    
+    # Рассылка идёт в фоне, обработчик сразу освобождается
+    start_broadcast('trial', message.bot, all_users, prepare, progress, finished, delivered)
 
+@router.message(Command("cache_stats"))
+async def cmd_cache_stats(message: Message):
+    """Показать счётчики кэша чтения хранилища"""
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ Команда недоступна")
+        return
+    
+    stats = get_cache_stats()
+    total = stats['hits'] + stats['misses']
+    hit_rate = (stats['hits'] / total * 100) if total else 0
+    await message.answer(
+        f'<b>🗃️ Кэш хранилища</b>\n\n'
+        f'✅ Попаданий: {stats["hits"]}\n'
+        f'📖 Чтений с диска: {stats["misses"]}\n'
+        f'♻️ Сбросов: {stats["invalidations"]}\n'
+        f'📁 Файлов в кэше: {stats["files"]}\n'
+        f'📈 Доля попаданий: {hit_rate:.1f}%',
+        parse_mode='HTML'
+    )
+
+@router.message(Command("outbound_stats"))
+async def cmd_outbound_stats(message: Message):
+    """Показать очередь и задержки исходящих сообщений"""
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ Команда недоступна")
+        return
+    
+    stats = get_outbound_stats()
+    text = '<b>📤 Исходящие сообщения</b>\n'
+    for priority, item in stats['priorities'].items():
+        text += (
+            f'\n<b>{PRIORITY_NAMES[priority].capitalize()}</b>\n'
+            f'⏳ В очереди: {item["queued"]}\n'
+            f'✅ Отправлено: {item["sent"]}\n'
+            f'🔁 Повторов: {item["retries"]}\n'
+            f'❌ Ошибок: {item["failed"]}\n'
+            f'⏱️ Задержка: p50 {item["p50_ms"]:.0f} мс, p95 {item["p95_ms"]:.0f} мс, макс. {item["max_ms"]:.0f} мс\n'
+        )
+    text += f'\n🚦 Ожидание по RetryAfter: {stats["retry_after_total"]:.0f} с'
+    await message.answer(text, parse_mode='HTML')
@@ -0,0 +1,194 @@
+"""Рассылки администратора всем пользователям.
+
+Рассылка идёт фоновой задачей. Частоту отправки, паузы после TelegramRetryAfter и повторы берёт на себя
+общая очередь исходящих сообщений (middleware.outbound, приоритет рассылок - самый низкий), а число
+одновременных отправок ограничено. Пользователи, заблокировавшие бота, пропускаются. Итог каждого
+обработанного пользователя сразу дописывается в файл хода рассылки, поэтому прерванная рассылка
+(например, перезапуском бота) при повторном запуске продолжается с того же места. Доставка - "хотя бы раз":
+после аварийной остановки сообщение повторно могут получить только те, кому оно отправлялось в этот момент.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+from aiogram.exceptions import TelegramForbiddenError
+from data.async_storage import run_in_storage
+from data.storage import DATA_DIR
+from middleware.outbound import PRIORITY_BROADCAST, send_message
+
+logger = logging.getLogger(__name__)
+
+# Сколько сообщений рассылки может отправляться одновременно
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '8'))
+# Как часто (в секундах) сообщать администратору о ходе рассылки
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', '30'))
+
+BROADCASTS_DIR = os.path.join(DATA_DIR, 'broadcasts')
+
+# Имя рассылки -> фоновая задача (держим ссылку, чтобы задачу не собрал сборщик мусора)
+_jobs: Dict[str, asyncio.Task] = {}
+
+def _progress_path(name: str) -> str:
+    return os.path.join(BROADCASTS_DIR, f'{name}.jsonl')
+
+def _load_progress(name: str) -> Optional[Dict[int, str]]:
+    """Итоги пользователей прерванной рассылки {user_id: итог} (None - рассылка не начиналась или завершена)"""
+    path = _progress_path(name)
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    outcomes = {}
+    with f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                outcomes[record['user_id']] = record['outcome']
+            except (ValueError, KeyError, TypeError) as e:
+                # Недописанная строка в конце файла после сбоя
+                logger.warning(f"[BROADCAST] Пропущена повреждённая строка в {path}: {e}")
+    return outcomes
+
+def _append_progress(name: str, user_id: int, outcome: str):
+    """Дописать итог пользователя в файл хода рассылки"""
+    os.makedirs(BROADCASTS_DIR, exist_ok=True)
+    with open(_progress_path(name), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'user_id': user_id, 'outcome': outcome}) + '\n')
+
+def _remove_progress(name: str):
+    try:
+        os.remove(_progress_path(name))
+    except FileNotFoundError:
+        pass
+
+def _stats(state: Dict) -> Dict:
+    """Счётчики рассылки для отчёта администратору"""
+    return {
+        'total': state['total'],
+        'processed': state['sent'] + state['skipped'] + state['blocked'] + state['errors'],
+        'sent': state['sent'],
+        'skipped': state['skipped'],
+        'blocked': state['blocked'],
+        'errors': state['errors'],
+        'resumed': state['resumed'],
+    }
+
+async def _deliver(bot, user_id: int, prepare: Callable[[int], Awaitable[Optional[Dict]]],
+                   delivered: Optional[Callable[[int], Awaitable]] = None) -> str:
+    """Подготовить и отправить сообщение одному пользователю, вернуть итог: sent, skipped, blocked или errors"""
+    try:
+        message = await prepare(user_id)
+    except Exception as e:
+        logger.error(f"[BROADCAST] Ошибка при подготовке сообщения user_id={user_id}: {e}", exc_info=True)
+        return 'errors'
+    if message is None:
+        return 'skipped'
+
+    try:
+        # Паузу после RetryAfter и повторы делает общая очередь отправки
+        await send_message(bot, user_id, priority=PRIORITY_BROADCAST, **message)
+    except TelegramForbiddenError:
+        logger.info(f"[BROADCAST] Пользователь user_id={user_id} заблокировал бота, пропускаем")
+        return 'blocked'
+    except Exception as e:
+        logger.error(f"[BROADCAST] Ошибка при отправке сообщения user_id={user_id}: {e}")
+        return 'errors'
+    if delivered is not None:
+        try:
+            await delivered(user_id)
+        except Exception as e:
+            logger.error(f"[BROADCAST] Ошибка после отправки сообщения user_id={user_id}: {e}", exc_info=True)
+            return 'errors'
+    return 'sent'
+
+async def run_broadcast(name: str, bot, user_ids: List[int],
+                        prepare: Callable[[int], Awaitable[Optional[Dict]]],
+                        progress: Optional[Callable[[Dict], Awaitable]] = None,
+                        delivered: Optional[Callable[[int], Awaitable]] = None) -> Dict:
+    """Разослать сообщения пользователям и вернуть счётчики.
+
+    prepare(user_id) возвращает параметры bot.send_message (text, parse_mode, reply_markup...)
+    или None, если пользователю отправлять не нужно. delivered(user_id) вызывается только после
+    успешной отправки - в нём делают то, что без сообщения делать нельзя (например, выдают подписку).
+    Пользователи, обработанные до прерывания рассылки с тем же name, пропускаются; пользователи
+    с ошибкой при продолжении обрабатываются снова.
+    progress(stats) вызывается в начале и раз в BROADCAST_PROGRESS_INTERVAL секунд.
+    """
+    outcomes = await run_in_storage(_load_progress, name)
+    state = {'total': 0, 'sent': 0, 'skipped': 0, 'blocked': 0, 'errors': 0, 'resumed': outcomes is not None}
+    outcomes = outcomes or {}
+    for outcome in outcomes.values():
+        state[outcome] += 1
+    if state['resumed']:
+        logger.info(f"[BROADCAST] Продолжаем рассылку {name}: уже обработано {len(outcomes)}")
+    pending_ids = [uid for uid in user_ids if uid not in outcomes]
+    state['total'] = len(outcomes) + len(pending_ids)
+    pending = iter(pending_ids)
+
+    async def report():
+        if progress is None:
+            return
+        try:
+            await progress(_stats(state))
+        except Exception as e:
+            logger.warning(f"[BROADCAST] Не удалось сообщить о ходе рассылки {name}: {e}")
+
+    async def report_periodically():
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            await report()
+
+    async def worker():
+        # Общий итератор: каждый пользователь достаётся ровно одному отправителю
+        for user_id in pending:
+            outcome = await _deliver(bot, user_id, prepare, delivered)
+            state[outcome] += 1
+            if outcome != 'errors':
+                await run_in_storage(_append_progress, name, user_id, outcome)
+
+    await report()
+    reporter = asyncio.create_task(report_periodically())
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, BROADCAST_CONCURRENCY))))
+    finally:
+        reporter.cancel()
+
+    await run_in_storage(_remove_progress, name)
+    stats = _stats(state)
+    logger.info(f"[BROADCAST] Рассылка {name} завершена: {stats}")
+    return stats
+
+def is_broadcast_running(name: str) -> bool:
+    """Идёт ли сейчас рассылка с таким именем"""
+    task = _jobs.get(name)
+    return task is not None and not task.done()
+
+def start_broadcast(name: str, bot, user_ids: List[int],
+                    prepare: Callable[[int], Awaitable[Optional[Dict]]],
+                    progress: Optional[Callable[[Dict], Awaitable]] = None,
+                    finished: Optional[Callable[[Dict], Awaitable]] = None,
+                    delivered: Optional[Callable[[int], Awaitable]] = None) -> bool:
+    """Запустить рассылку фоновой задачей (False - рассылка с таким именем уже идёт).
+
+    finished(stats) вызывается по окончании рассылки.
+    """
+    if is_broadcast_running(name):
+        return False
+
+    async def job():
+        try:
+            stats = await run_broadcast(name, bot, user_ids, prepare, progress, delivered)
+        except Exception as e:
+            logger.error(f"[BROADCAST] Рассылка {name} прервана: {e}", exc_info=True)
+            return
+        if finished is not None:
+            try:
+                await finished(stats)
+            except Exception as e:
+                logger.error(f"[BROADCAST] Ошибка при отправке отчёта о рассылке {name}: {e}", exc_info=True)
+
+    _jobs[name] = asyncio.create_task(job())
+    return True
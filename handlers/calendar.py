@@ -1,30 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
 from calendar import monthrange
-from data.storage import get_entries, format_number
+from data.dates import parse_date
+from data.storage import add_entry_listener, get_daily_totals, get_external_version, format_number
+from data.async_storage import run_in_storage
 from handlers.keyboards import get_back_keyboard
 from utils import safe_answer_callback
 
 router = Router()
 
-def generate_daily_list(year: int, month: int, user_id: int) -> str:
+# Для скольких пользователей держать готовые тексты месяцев (0 - не кэшировать)
+CALENDAR_CACHE_USERS = int(os.getenv('CALENDAR_CACHE_USERS', '1000'))
+
+# === Кэш готовых месяцев ===
+# user_id -> {(год, месяц, вид): текст}; пользователи упорядочены по последнему обращению.
+# Месяц выбрасывается из кэша, только когда меняются записи за дату этого месяца.
+_month_views: "OrderedDict[int, Dict[Tuple[int, int, str], str]]" = OrderedDict()
+# Счётчик изменений записей пользователя: текст, собранный до изменения, в кэш не кладём
+_versions: Dict[int, int] = {}
+# Счётчик изменений данных пользователя извне (get_external_version), при котором собраны его месяцы
+_external_versions: Dict[int, int] = {}
+_views_lock = threading.Lock()
+
+def _cached_view(kind: str, year: int, month: int, user_id: int, build: Callable[[int, int, int], str]) -> str:
+    """Текст месяца из кэша или собранный заново"""
+    if CALENDAR_CACHE_USERS <= 0:
+        return build(year, month, user_id)
+    key = (year, month, kind)
+    # Изменения из других процессов слушатель записей не видит - их замечаем по счётчику изменений извне
+    external = get_external_version(user_id)
+    with _views_lock:
+        if _external_versions.get(user_id, external) != external:
+            _month_views.pop(user_id, None)
+            _versions[user_id] = _versions.get(user_id, 0) + 1
+        _external_versions[user_id] = external
+        views = _month_views.get(user_id)
+        if views is not None:
+            _month_views.move_to_end(user_id)
+            if key in views:
+                return views[key]
+        version = _versions.get(user_id, 0)
+    
+    text = build(year, month, user_id)
+    with _views_lock:
+        if _versions.get(user_id, 0) == version:
+            _month_views.setdefault(user_id, {})[key] = text
+            _month_views.move_to_end(user_id)
+            while len(_month_views) > CALENDAR_CACHE_USERS:
+                _month_views.popitem(last=False)
+    return text
+
+def _on_entries_changed(user_id: int, date: Optional[str]):
+    """Выбросить из кэша месяц изменённой даты (date=None - все месяцы пользователя)"""
+    entry_date = parse_date(date) if date else None
+    if date and entry_date is None:
+        # Записи с неразбираемой датой в календаре не показываются
+        return
+    with _views_lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+        views = _month_views.get(user_id)
+        if views is None:
+            return
+        if entry_date is None:
+            del _month_views[user_id]
+            return
+        for key in [k for k in views if k[:2] == (entry_date.year, entry_date.month)]:
+            del views[key]
+
+add_entry_listener(_on_entries_changed)
+
+def _build_daily_list(year: int, month: int, user_id: int) -> str:
     """Генерировать список крестиков по дням месяца"""
-    entries = get_entries(user_id)
-    
-    # Создаем словарь дат с количеством крестиков
+    # Создаем словарь дат с количеством крестиков (по одной строке на день)
     dates_data = {}
-    for entry in entries:
-        date_str = entry.get('date', '')
-        try:
-            entry_date = datetime.strptime(date_str, '%Y-%m-%d')
-            if entry_date.year == year and entry_date.month == month:
-                day = entry_date.day
-                if day not in dates_data:
-                    dates_data[day] = 0.0
-                dates_data[day] += float(entry.get('count', 0))
-        except:
-            continue
+    for date_str, total in get_daily_totals(user_id).items():
+        # Разбор даты кэшируется: каждая строка даты разбирается один раз
+        entry_date = parse_date(date_str)
+        if entry_date and entry_date.year == year and entry_date.month == month:
+            day = entry_date.day
+            if day not in dates_data:
+                dates_data[day] = 0.0
+            dates_data[day] += total
     
     # Названия месяцев
     months = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
@@ -46,23 +107,18 @@ def generate_daily_list(year: int, month: int, user_id: int) -> str:
     
     return text
 
-def generate_calendar(year: int, month: int, user_id: int) -> str:
+def _build_calendar(year: int, month: int, user_id: int) -> str:
     """Генерировать календарь с отметками вышивальных дней"""
-    entries = get_entries(user_id)
-    
-    # Создаем словарь дат с количеством крестиков
+    # Создаем словарь дат с количеством крестиков (по одной строке на день)
     dates_data = {}
-    for entry in entries:
-        date_str = entry.get('date', '')
-        try:
-            entry_date = datetime.strptime(date_str, '%Y-%m-%d')
-            if entry_date.year == year and entry_date.month == month:
-                day = entry_date.day
-                if day not in dates_data:
-                    dates_data[day] = 0.0
-                dates_data[day] += float(entry.get('count', 0))
-        except:
-            continue
+    for date_str, total in get_daily_totals(user_id).items():
+        # Разбор даты кэшируется: каждая строка даты разбирается один раз
+        entry_date = parse_date(date_str)
+        if entry_date and entry_date.year == year and entry_date.month == month:
+            day = entry_date.day
+            if day not in dates_data:
+                dates_data[day] = 0.0
+            dates_data[day] += total
     
     # Названия месяцев
     months = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
@@ -136,6 +192,14 @@ def generate_calendar(year: int, month: int, user_id: int) -> str:
     
     return text
 
+def generate_daily_list(year: int, month: int, user_id: int) -> str:
+    """Список крестиков по дням месяца (из кэша, если записи месяца не менялись)"""
+    return _cached_view('list', year, month, user_id, _build_daily_list)
+
+def generate_calendar(year: int, month: int, user_id: int) -> str:
+    """Календарь месяца (из кэша, если записи месяца не менялись)"""
+    return _cached_view('calendar', year, month, user_id, _build_calendar)
+
 async def show_calendar(message: Message, user_id: int, year: int = None, month: int = None):
     """Показать календарь"""
     now = datetime.now()
@@ -144,7 +208,7 @@ async def show_calendar(message: Message, user_id: int, year: int = None, month:
     if month is None:
         month = now.month
     
-    calendar_text = generate_calendar(year, month, user_id)
+    calendar_text = await run_in_storage(generate_calendar, year, month, user_id)
     
     # Кнопки навигации
     keyboard = []
@@ -195,7 +259,7 @@ async def show_calendar(message: Message, user_id: int, year: int = None, month:
 async def callback_calendar_menu(callback: CallbackQuery):
     await safe_answer_callback(callback)
     now = datetime.now()
-    calendar_text = generate_calendar(now.year, now.month, callback.from_user.id)
+    calendar_text = await run_in_storage(generate_calendar, now.year, now.month, callback.from_user.id)
     
     # Кнопки навигации
     keyboard = []
@@ -259,7 +323,7 @@ async def callback_calendar(callback: CallbackQuery):
         if len(parts) == 2:
             year = int(parts[0])
             month = int(parts[1])
-            daily_list_text = generate_daily_list(year, month, callback.from_user.id)
+            daily_list_text = await run_in_storage(generate_daily_list, year, month, callback.from_user.id)
             
             # Кнопки навигации для возврата к календарю
             keyboard = []
@@ -320,7 +384,7 @@ async def callback_calendar(callback: CallbackQuery):
     if len(parts) == 2:
         year = int(parts[0])
         month = int(parts[1])
-        calendar_text = generate_calendar(year, month, callback.from_user.id)
+        calendar_text = await run_in_storage(generate_calendar, year, month, callback.from_user.id)
         
         # Кнопки навигации
         keyboard = []
@@ -1,8 +1,9 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
-from data.storage import get_user_challenges, add_user_challenge, delete_user_challenge, get_user_challenge, format_number
-from data.challenges import get_available_challenges, get_challenge_by_id, check_challenge_progress
+from data import async_storage
+from data.storage import format_number
+from data.challenges import get_available_challenges, get_challenge_by_id
 from handlers.keyboards import get_back_keyboard
 from utils import safe_answer_callback
 
@@ -11,7 +12,7 @@ router = Router()
 async def show_challenges_menu(message: Message, user_id: int):
     """Показать меню челленджей"""
     available = get_available_challenges()
-    user_challenges = get_user_challenges(user_id)
+    user_challenges = await async_storage.get_user_challenges(user_id)
     active_challenge_ids = {c.get('challengeId') for c in user_challenges if not c.get('completed', False)}
     
     text = '<b>🏆 Челленджи</b>\n\n'
@@ -38,7 +39,7 @@ async def show_challenges_menu(message: Message, user_id: int):
             for challenge in active_challenges[:5]:  # Показываем до 5 активных
                 challenge_data = get_challenge_by_id(challenge.get('challengeId', ''))
                 if challenge_data:
-                    progress_data = check_challenge_progress(user_id, challenge['challengeId'], challenge)
+                    progress_data = await async_storage.check_challenge_progress(user_id, challenge['challengeId'], challenge)
                     if progress_data:
                         progress_bar = "█" * int(progress_data['progress'] / 5) + "░" * (20 - int(progress_data['progress'] / 5))
                         
@@ -81,7 +82,7 @@ async def show_challenge_details(message: Message, user_id: int, challenge_id: s
         await message.answer('❌ Челлендж не найден', reply_markup=get_back_keyboard())
         return
     
-    user_challenge = get_user_challenge(challenge_id, user_id)
+    user_challenge = await async_storage.get_user_challenge(challenge_id, user_id)
     
     if not user_challenge:
         # Показываем информацию о челлендже перед выбором
@@ -96,7 +97,7 @@ async def show_challenge_details(message: Message, user_id: int, challenge_id: s
         ]
     else:
         # Показываем прогресс
-        progress_data = check_challenge_progress(user_id, challenge_id, user_challenge)
+        progress_data = await async_storage.check_challenge_progress(user_id, challenge_id, user_challenge)
         if not progress_data:
             await message.answer('❌ Ошибка при проверке прогресса', reply_markup=get_back_keyboard())
             return
@@ -154,7 +155,7 @@ async def callback_challenge_start(callback: CallbackQuery):
     challenge_id = callback.data.replace("challenge_start_", "")
     
     # Проверяем, не активен ли уже этот челлендж
-    existing = get_user_challenge(challenge_id, callback.from_user.id)
+    existing = await async_storage.get_user_challenge(challenge_id, callback.from_user.id)
     if existing and not existing.get('completed', False):
         await callback.message.answer(
             '⚠️ Этот челлендж уже активен!',
@@ -171,7 +172,7 @@ async def callback_challenge_start(callback: CallbackQuery):
         'completed': False
     }
     
-    add_user_challenge(challenge)
+    await async_storage.add_user_challenge(challenge)
     
     challenge_data = get_challenge_by_id(challenge_id)
     await callback.message.answer(
@@ -193,7 +194,7 @@ async def callback_challenge_view(callback: CallbackQuery):
 async def callback_challenge_cancel(callback: CallbackQuery):
     await safe_answer_callback(callback)
     challenge_id = callback.data.replace("challenge_cancel_", "")
-    delete_user_challenge(challenge_id, callback.from_user.id)
+    await async_storage.delete_user_challenge(challenge_id, callback.from_user.id)
     await callback.message.answer(
         '✅ Челлендж отменен',
         reply_markup=get_back_keyboard()
@@ -1,13 +1,15 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
-from data.storage import is_subscribed, get_all_user_ids, get_user_subscription, grant_access, save_user_id
+from data import async_storage
+from data.storage import ADMIN_STATS_SNAPSHOT
 from handlers.entries import add_stitches_dialog, show_history
 from handlers.statistics import show_statistics
 from handlers.projects import show_projects, add_project_dialog
 from handlers.keyboards import get_main_menu
 from config import ADMIN_IDS
 from utils import safe_answer_callback
+from datetime import datetime
 import logging
 
 router = Router()
@@ -22,19 +24,19 @@ async def cmd_start(message: Message):
     logger.info(f"[COMMANDS] /start вызван для user_id={user_id}, TEST_MODE={TEST_MODE}")
     
     # Сохраняем ID пользователя (если его еще нет)
-    save_user_id(user_id)
+    await async_storage.save_user_id(user_id)
     
     # Проверяем, первый ли раз пользователь запускает бота
-    existing_subscription = get_user_subscription(user_id)
+    existing_subscription = await async_storage.get_user_subscription(user_id)
     is_first_time = existing_subscription is None
     
-    subscription_status = is_subscribed(user_id)
+    subscription_status = await async_storage.is_subscribed(user_id)
     logger.info(f"[COMMANDS] is_subscribed({user_id}) = {subscription_status}, is_first_time={is_first_time}")
     
     # Если первый раз и не в тестовом режиме - выдаем 3 дня пробной подписки
     if is_first_time and not TEST_MODE:
         try:
-            expires_at = grant_access(user_id, days=3, is_trial=True)
+            expires_at = await async_storage.grant_access(user_id, days=3, is_trial=True)
             logger.info(f"[COMMANDS] Выдана пробная подписка на 3 дня для user_id={user_id}, expires_at={expires_at}")
             
             # Отправляем сообщение о пробной подписке
@@ -108,14 +110,14 @@ async def cmd_help(message: Message):
 @router.message(Command("stats"))
 async def cmd_stats(message: Message):
     user_id = message.from_user.id
-    if not is_subscribed(user_id):
+    if not await async_storage.is_subscribed(user_id):
         return
     await show_statistics(message, user_id)
 
 @router.message(Command("add"))
 async def cmd_add(message: Message):
     user_id = message.from_user.id
-    if not is_subscribed(user_id):
+    if not await async_storage.is_subscribed(user_id):
         return
     await add_stitches_dialog(message, user_id)
 
@@ -129,27 +131,21 @@ async def cmd_users(message: Message):
         await message.answer('❌ У вас нет доступа к этой команде.')
         return
     
-    from data.storage import get_entries, get_projects, get_user_subscription
+    from data.async_storage import get_admin_statistics
     
-    user_ids = get_all_user_ids()
+    # /users fresh - пересчитать, не дожидаясь завтрашнего снимка
+    args = (message.text or '').split()[1:]
+    stats = await get_admin_statistics(fresh='fresh' in args)
+    user_ids = stats['user_ids']
     
     if not user_ids:
         await message.answer('📝 Пользователей пока нет.')
         return
     
-    # Подсчитываем статистику
-    total_users = len(user_ids)
-    active_subscriptions = 0
-    total_entries = 0
-    total_projects = 0
-    
-    for uid in user_ids:
-        if get_user_subscription(uid) and is_subscribed(uid):
-            active_subscriptions += 1
-        entries = get_entries(uid)
-        total_entries += len(entries)
-        projects = get_projects(uid)
-        total_projects += len(projects)
+    total_users = stats['total_users']
+    active_subscriptions = stats['active_subscriptions']
+    total_entries = stats['total_entries']
+    total_projects = stats['total_projects']
     
     text = f'<b>👥 Статистика пользователей</b>\n\n'
     text += f'📊 Всего пользователей: <b>{total_users}</b>\n'
@@ -169,6 +165,10 @@ async def cmd_users(message: Message):
         text += ' '.join(f'<code>{uid}</code>' for uid in user_ids[:10]) + '\n'
         text += f'<i>... и еще {total_users - 10} пользователей</i>'
     
+    if ADMIN_STATS_SNAPSHOT:
+        created_at = datetime.fromisoformat(stats['createdAt'])
+        text = text.rstrip('\n') + f'\n\n<i>Данные на {created_at.strftime("%H:%M")}, обновить: /users fresh</i>'
+    
     await message.answer(text, parse_mode='HTML')
 
 @router.callback_query(F.data == "main_menu")
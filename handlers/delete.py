@@ -2,7 +2,7 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
 from dateutil import parser
-from data.storage import delete_all_user_data, delete_entry_by_date, get_entries
+from data import async_storage
 from handlers.keyboards import get_delete_menu, get_back_keyboard
 from utils import safe_answer_callback
 
@@ -51,7 +51,7 @@ async def callback_delete_all(callback: CallbackQuery):
 async def callback_confirm_delete_all(callback: CallbackQuery):
     await safe_answer_callback(callback)
     user_id = callback.from_user.id
-    delete_all_user_data(user_id)
+    await async_storage.delete_all_user_data(user_id)
     await callback.message.edit_text(
         '✅ <b>Все данные удалены!</b>',
         parse_mode='HTML',
@@ -91,14 +91,13 @@ async def process_delete_message(message: Message, user_id: int):
                 return True
         
         # Проверяем, есть ли запись за эту дату
-        entries = get_entries(user_id)
-        entry_for_date = [e for e in entries if e.get('date') == date]
+        entry_for_date = await async_storage.get_entries_by_date(date, user_id)
         
         # Если не найдено, пробуем найти запись с некорректной датой, которая может совпадать с введенным текстом
         if not entry_for_date and text != 'сегодня' and text != 'today':
             # Пробуем найти запись, где дата может быть в формате, который пользователь ввел
             original_text = message.text.strip()
-            for e in entries:
+            for e in await async_storage.get_entries(user_id):
                 entry_date = e.get('date', '')
                 # Проверяем прямое совпадение или совпадение после преобразования
                 if entry_date == original_text or entry_date == date:
@@ -116,7 +115,7 @@ async def process_delete_message(message: Message, user_id: int):
             del pending_deletes[user_id]
             return True
         
-        delete_entry_by_date(date, user_id)
+        await async_storage.delete_entry_by_date(date, user_id)
         
         # Безопасное форматирование даты для отображения
         try:
@@ -1,10 +1,14 @@
+from typing import List, Optional
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime, timedelta
 from dateutil import parser
-from data.storage import add_count_to_date, get_entries, get_all_hashtags, get_user_challenges, update_user_challenge, format_number
-from data.challenges import check_challenge_progress
+from data import async_storage
+from data.storage import format_number
+from data.dates import parse_date
 from handlers.keyboards import get_back_keyboard
+from handlers.screen_cache import cached_screen
+from middleware.outbound import send_message
 from utils import safe_answer_callback
 import logging
 
@@ -18,7 +22,7 @@ async def add_stitches_dialog(message: Message, user_id: int):
     logger.info(f"[ENTRIES] add_stitches_dialog вызван для user_id={user_id}")
     hashtag_hint = ""
     try:
-        hashtags = get_all_hashtags(user_id)
+        hashtags = await async_storage.get_all_hashtags(user_id)
         if hashtags:
             hashtag_hint = f"\n\n💡 Ваши хэштеги: {', '.join(hashtags[:5])}"
             if len(hashtags) > 5:
@@ -185,7 +189,7 @@ async def process_entry_message(message: Message, user_id: int):
             
             try:
                 logger.info("[ENTRIES] Получение хэштегов...")
-                hashtags = get_all_hashtags(user_id)
+                hashtags = await async_storage.get_all_hashtags(user_id)
                 logger.info(f"[ENTRIES] Получено хэштегов: {len(hashtags) if hashtags else 0}")
                 hashtag_hint = "\n\n💡 Отправьте хэштег (например: #работа1) или нажмите 'Пропустить'"
                 if hashtags:
@@ -247,7 +251,7 @@ async def process_entry_message(message: Message, user_id: int):
                 return True
         
         # Сохраняем запись (с хэштегом или без)
-        add_count_to_date(state['date'], state['count'], user_id, hashtag)
+        await async_storage.add_count_to_date(state['date'], state['count'], user_id, hashtag)
         
         # Используем безопасное форматирование даты
         try:
@@ -274,29 +278,20 @@ async def process_entry_message(message: Message, user_id: int):
         )
         
         # Проверяем челленджи после добавления крестиков
-        # Используем бот из контекста, если доступен
-        from aiogram import Bot
-        from config import BOT_TOKEN
-        bot = Bot(token=BOT_TOKEN)
-        try:
-            await check_challenges_on_entry(user_id, bot)
-        finally:
-            await bot.session.close()
+        await check_challenges_on_entry(user_id, message.bot)
         
         del pending_entries[user_id]
         return True
     
     return False
 
-async def show_history(message: Message, user_id: int):
-    entries = get_entries(user_id)
+async def _build_history(user_id: int) -> Optional[List[str]]:
+    """Собрать историю записей, разбитую на сообщения (None - записей нет)"""
+    entries = await async_storage.get_entries(user_id)
     entries.sort(key=lambda x: x.get('date', ''), reverse=True)
     
     if not entries:
-        await message.answer('📝 Пока нет записей.', reply_markup=get_back_keyboard())
-        return
-    
-    from datetime import datetime
+        return None
     
     # Используем безопасное форматирование без locale
     months_short = ['янв', 'фев', 'мар', 'апр', 'мая', 'июн',
@@ -307,7 +302,7 @@ async def show_history(message: Message, user_id: int):
     
     # Если записей много, показываем все, но предупреждаем
     for entry in entries:
-        entry_date = datetime.strptime(entry['date'], '%Y-%m-%d')
+        entry_date = parse_date(entry['date'])
         date_str = f"{entry_date.day} {months_short[entry_date.month - 1]} {entry_date.year}"
         hashtag_info = ""
         if entry.get('hashtag'):
@@ -315,36 +310,32 @@ async def show_history(message: Message, user_id: int):
         text += f"📆 {date_str}: {format_number(entry['count'])} крестиков{hashtag_info}\n"
     
     # Telegram ограничивает длину сообщения до 4096 символов
-    # Если текст слишком длинный, разбиваем на несколько сообщений
+    # Если текст слишком длинный, разбиваем на несколько сообщений по границам строк
     max_length = 4000
-    if len(text) > max_length:
-        # Отправляем первую часть
-        first_part = text[:max_length]
-        last_newline = first_part.rfind('\n')
-        if last_newline > 0:
-            first_part = text[:last_newline]
-            remaining = text[last_newline+1:]
+    parts = []
+    pos = 0
+    while len(text) - pos > max_length:
+        last_newline = text.rfind('\n', pos, pos + max_length)
+        if last_newline > pos:
+            parts.append(text[pos:last_newline])
+            pos = last_newline + 1
         else:
-            remaining = text[max_length:]
-        
-        await message.answer(first_part, parse_mode='HTML', reply_markup=get_back_keyboard())
-        
-        # Отправляем оставшиеся части
-        while remaining:
-            if len(remaining) > max_length:
-                last_newline = remaining[:max_length].rfind('\n')
-                if last_newline > 0:
-                    part = remaining[:last_newline]
-                    remaining = remaining[last_newline+1:]
-                else:
-                    part = remaining[:max_length]
-                    remaining = remaining[max_length:]
-                await message.answer(part, parse_mode='HTML')
-            else:
-                await message.answer(remaining, parse_mode='HTML')
-                break
-    else:
-        await message.answer(text, parse_mode='HTML', reply_markup=get_back_keyboard())
+            parts.append(text[pos:pos + max_length])
+            pos += max_length
+    if pos < len(text):
+        parts.append(text[pos:])
+    return parts
+
+async def show_history(message: Message, user_id: int):
+    parts = await cached_screen('history', user_id, lambda: _build_history(user_id))
+    if parts is None:
+        await message.answer('📝 Пока нет записей.', reply_markup=get_back_keyboard())
+        return
+    
+    # Кнопка "назад" - под первой частью
+    await message.answer(parts[0], parse_mode='HTML', reply_markup=get_back_keyboard())
+    for part in parts[1:]:
+        await message.answer(part, parse_mode='HTML')
 
 def clear_pending(user_id: int):
     if user_id in pending_entries:
@@ -352,7 +343,7 @@ def clear_pending(user_id: int):
 
 async def check_challenges_on_entry(user_id: int, bot_instance=None):
     """Проверить прогресс челленджей после добавления крестиков"""
-    user_challenges = get_user_challenges(user_id)
+    user_challenges = await async_storage.get_user_challenges(user_id)
     active_challenges = [c for c in user_challenges if not c.get('completed', False)]
     
     if not active_challenges:
@@ -362,11 +353,11 @@ async def check_challenges_on_entry(user_id: int, bot_instance=None):
     
     for user_challenge in active_challenges:
         challenge_id = user_challenge.get('challengeId')
-        progress_data = check_challenge_progress(user_id, challenge_id, user_challenge)
+        progress_data = await async_storage.check_challenge_progress(user_id, challenge_id, user_challenge)
         
         if progress_data and progress_data.get('completed') and not user_challenge.get('completed'):
             # Челлендж выполнен!
-            update_user_challenge(challenge_id, user_id, {'completed': True, 'completedAt': datetime.now().strftime('%Y-%m-%d')})
+            await async_storage.update_user_challenge(challenge_id, user_id, {'completed': True, 'completedAt': datetime.now().strftime('%Y-%m-%d')})
             completed_challenges.append(challenge_id)
     
     # Отправляем уведомления о выполненных челленджах
@@ -376,7 +367,8 @@ async def check_challenges_on_entry(user_id: int, bot_instance=None):
             challenge_data = get_challenge_by_id(challenge_id)
             if challenge_data:
                 try:
-                    await bot_instance.send_message(
+                    await send_message(
+                        bot_instance,
                         user_id,
                         f'🎉 <b>Поздравляем!</b>\n\n'
                         f'Вы выполнили челлендж:\n'
@@ -516,7 +508,7 @@ async def callback_entry_hashtag_skip(callback: CallbackQuery):
     
     # Сохраняем запись без хэштега
     logger.info(f"[ENTRIES] Сохранение записи без хэштега: date={state.get('date')}, count={state.get('count')}")
-    add_count_to_date(state['date'], state['count'], user_id, None)
+    await async_storage.add_count_to_date(state['date'], state['count'], user_id, None)
     
     # Используем безопасное форматирование даты
     try:
@@ -555,13 +547,7 @@ async def callback_entry_hashtag_skip(callback: CallbackQuery):
             logger.error(f"[ENTRIES] Критическая ошибка при отправке сообщения: {e2}", exc_info=True)
     
     # Проверяем челленджи после добавления крестиков
-    from aiogram import Bot
-    from config import BOT_TOKEN
-    bot = Bot(token=BOT_TOKEN)
-    try:
-        await check_challenges_on_entry(user_id, bot)
-    finally:
-        await bot.session.close()
+    await check_challenges_on_entry(user_id, callback.bot)
     
     del pending_entries[user_id]
     logger.info(f"[ENTRIES] Диалог завершен, pending_entries очищен для user_id={user_id}")
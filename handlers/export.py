@@ -4,15 +4,19 @@ from datetime import datetime
 import json
 import os
 import tempfile
-from data.storage import (
-    get_entries, get_projects, get_wishlist, get_notes, get_plans,
-    get_user_challenges, get_user_subscription
-)
+from data import async_storage
+from data.async_storage import run_in_storage
 from utils import safe_answer_callback
 from handlers.keyboards import get_back_keyboard
 
 router = Router()
 
+def _write_export_file(export_data: dict) -> str:
+    """Записать экспорт во временный файл и вернуть путь к нему"""
+    with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.json', delete=False) as f:
+        json.dump(export_data, f, ensure_ascii=False, indent=2)
+        return f.name
+
 async def export_user_data(message: Message, user_id: int):
     """Экспортировать все данные пользователя в JSON"""
     try:
@@ -20,19 +24,17 @@ async def export_user_data(message: Message, user_id: int):
         export_data = {
             'userId': user_id,
             'exportDate': datetime.now().isoformat(),
-            'entries': get_entries(user_id),
-            'projects': get_projects(user_id),
-            'wishlist': get_wishlist(user_id),
-            'notes': get_notes(user_id),
-            'plans': get_plans(user_id),
-            'challenges': get_user_challenges(user_id),
-            'subscription': get_user_subscription(user_id)
+            'entries': await async_storage.get_entries(user_id),
+            'projects': await async_storage.get_projects(user_id),
+            'wishlist': await async_storage.get_wishlist(user_id),
+            'notes': await async_storage.get_notes(user_id),
+            'plans': await async_storage.get_plans(user_id),
+            'challenges': await async_storage.get_user_challenges(user_id),
+            'subscription': await async_storage.get_user_subscription(user_id)
         }
         
-        # Создаем временный файл
-        with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.json', delete=False) as f:
-            json.dump(export_data, f, ensure_ascii=False, indent=2)
-            temp_file_path = f.name
+        # Создаем временный файл (сериализация тоже вне event loop)
+        temp_file_path = await run_in_storage(_write_export_file, export_data)
         
         # Отправляем файл
         file = FSInputFile(temp_file_path, filename=f'export_{user_id}_{datetime.now().strftime("%Y%m%d")}.json')
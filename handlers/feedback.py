@@ -1,18 +1,13 @@
 """Модуль для анонимного опроса пользователей после завершения пробного периода"""
-import asyncio
 import logging
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from datetime import datetime
-from data.storage import (
-    get_user_subscription, 
-    is_subscribed, 
-    get_user_feedback_given, 
-    set_user_feedback_given,
-    get_all_user_ids
-)
+from data import async_storage
 from config import ADMIN_IDS
+from handlers.broadcast import is_broadcast_running, start_broadcast
+from middleware.outbound import send_message
 from utils import safe_answer_callback
 
 logger = logging.getLogger(__name__)
@@ -42,15 +37,15 @@ async def check_and_send_feedback(bot, user_id: int):
     """Проверить, нужно ли отправить опрос пользователю"""
     try:
         # Проверяем, был ли уже отправлен опрос
-        if get_user_feedback_given(user_id):
+        if await async_storage.get_user_feedback_given(user_id):
             return False
         
         # Проверяем, есть ли активная подписка
-        if is_subscribed(user_id):
+        if await async_storage.is_subscribed(user_id):
             return False
         
         # Проверяем, была ли пробная подписка и истекла ли она
-        subscription = get_user_subscription(user_id)
+        subscription = await async_storage.get_user_subscription(user_id)
         if not subscription:
             return False
         
@@ -81,21 +76,22 @@ async def check_and_send_feedback(bot, user_id: int):
         logger.error(f"[FEEDBACK] Ошибка при проверке опроса для user_id={user_id}: {e}", exc_info=True)
         return False
 
-async def send_feedback_request(bot, user_id: int):
-    """Отправить запрос на опрос пользователю"""
-    try:
-        message_text = (
+def get_feedback_request() -> dict:
+    """Параметры сообщения с запросом на опрос для bot.send_message"""
+    return {
+        'text': (
             "✨ Пробный период закончился!\n\n"
             "Если можно — поддержите улучшение Дневника ❤️\n\n"
             "Ответьте на один вопрос анонимно: что помешало оформить подписку?\n"
             "Выберите вариант ниже 👇"
-        )
-        
-        await bot.send_message(
-            chat_id=user_id,
-            text=message_text,
-            reply_markup=get_feedback_keyboard()
-        )
+        ),
+        'reply_markup': get_feedback_keyboard(),
+    }
+
+async def send_feedback_request(bot, user_id: int):
+    """Отправить запрос на опрос пользователю"""
+    try:
+        await send_message(bot, user_id, **get_feedback_request())
         logger.info(f"[FEEDBACK] Отправлен запрос на опрос для user_id={user_id}")
         
     except Exception as e:
@@ -123,16 +119,13 @@ async def handle_feedback_response(callback: CallbackQuery):
             bot = callback.bot
             for admin_id in ADMIN_IDS:
                 try:
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=admin_message
-                    )
+                    await send_message(bot, admin_id, admin_message)
                     logger.info(f"[FEEDBACK] Ответ отправлен администратору {admin_id}")
                 except Exception as e:
                     logger.error(f"[FEEDBACK] Ошибка при отправке ответа администратору {admin_id}: {e}")
         
         # Устанавливаем флаг, что опрос был пройден
-        set_user_feedback_given(user_id, True)
+        await async_storage.set_user_feedback_given(user_id, True)
         logger.info(f"[FEEDBACK] Пользователь user_id={user_id} прошел опрос: {feedback_text}")
         
         # Удаляем сообщение с опросом
@@ -154,65 +147,50 @@ async def cmd_send_feedback(message: Message):
         logger.warning(f"[FEEDBACK] Попытка использования /send_feedback от user_id={user_id} (не ADMIN)")
         return
     
-    try:
-        await message.answer("🔄 Начинаю рассылку опроса...")
-        
-        all_users = get_all_user_ids()
-        logger.info(f"[FEEDBACK] Начало рассылки опроса. Всего пользователей: {len(all_users)}")
-        success_count = 0
-        skipped_count = 0
-        error_count = 0
-        
-        for target_user_id in all_users:
-            try:
-                # Пропускаем администраторов
-                if ADMIN_IDS and target_user_id in ADMIN_IDS:
-                    logger.debug(f"[FEEDBACK] Пропуск user_id={target_user_id} - администратор")
-                    skipped_count += 1
-                    continue
-                
-                # Проверяем, был ли уже отправлен опрос
-                if get_user_feedback_given(target_user_id):
-                    logger.debug(f"[FEEDBACK] Пропуск user_id={target_user_id} - опрос уже был отправлен")
-                    skipped_count += 1
-                    continue
-                
-                # Проверяем, есть ли активная подписка
-                if is_subscribed(target_user_id):
-                    logger.debug(f"[FEEDBACK] Пропуск user_id={target_user_id} - есть активная подписка")
-                    skipped_count += 1
-                    continue
-                
-                # Проверяем, была ли пробная подписка (для рассылки отправляем всем без подписки)
-                # Но можно добавить дополнительную проверку, если нужно отправлять только тем, у кого была пробная
-                subscription = get_user_subscription(target_user_id)
-                # Для рассылки отправляем всем без активной подписки, независимо от того, была ли пробная
-                # Если нужно только тем, у кого была пробная, раскомментируйте следующую проверку:
-                # if not subscription or not subscription.get('isTrial', False):
-                #     skipped_count += 1
-                #     continue
-                
-                # Отправляем опрос
-                await send_feedback_request(bot, target_user_id)
-                success_count += 1
-                logger.info(f"[FEEDBACK] Опрос отправлен user_id={target_user_id}")
-                
-                # Небольшая задержка, чтобы избежать rate limiting
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                error_count += 1
-                logger.error(f"[FEEDBACK] Ошибка при обработке user_id={target_user_id}: {e}", exc_info=True)
+    if is_broadcast_running('feedback'):
+        await message.answer("⏳ Рассылка опроса уже идёт")
+        return
+    
+    status = await message.answer("🔄 Начинаю рассылку опроса...")
+    
+    all_users = await async_storage.get_all_user_ids()
+    logger.info(f"[FEEDBACK] Начало рассылки опроса. Всего пользователей: {len(all_users)}")
+    
+    async def prepare(target_user_id: int):
+        # Пропускаем администраторов
+        if ADMIN_IDS and target_user_id in ADMIN_IDS:
+            logger.debug(f"[FEEDBACK] Пропуск user_id={target_user_id} - администратор")
+            return None
+        
+        # Проверяем, был ли уже отправлен опрос
+        if await async_storage.get_user_feedback_given(target_user_id):
+            logger.debug(f"[FEEDBACK] Пропуск user_id={target_user_id} - опрос уже был отправлен")
+            return None
         
+        # Проверяем, есть ли активная подписка
+        if await async_storage.is_subscribed(target_user_id):
+            logger.debug(f"[FEEDBACK] Пропуск user_id={target_user_id} - есть активная подписка")
+            return None
+        
+        # Для рассылки отправляем всем без активной подписки, независимо от того, была ли пробная.
+        # Если нужно только тем, у кого была пробная, добавьте проверку subscription.get('isTrial')
+        return get_feedback_request()
+    
+    async def progress(stats):
+        resumed = ' (продолжение прерванной)' if stats['resumed'] else ''
+        await status.edit_text(
+            f"🔄 Идёт рассылка опроса{resumed}...\n"
+            f"Обработано: {stats['processed']} из {stats['total']}"
+        )
+    
+    async def finished(stats):
         await message.answer(
             f"✅ Рассылка завершена!\n\n"
-            f"Успешно: {success_count}\n"
-            f"Пропущено: {skipped_count}\n"
-            f"Ошибок: {error_count}"
+            f"Успешно: {stats['sent']}\n"
+            f"Пропущено: {stats['skipped']}\n"
+            f"Заблокировали бота: {stats['blocked']}\n"
+            f"Ошибок: {stats['errors']}"
         )
-        logger.info(f"[FEEDBACK] Рассылка завершена: success={success_count}, skipped={skipped_count}, errors={error_count}")
-        
-    except Exception as e:
-        logger.error(f"[FEEDBACK] Критическая ошибка при рассылке: {e}", exc_info=True)
-        await message.answer(f"❌ Ошибка при рассылке: {e}")
-
+    
+    # Рассылка идёт в фоне, обработчик сразу освобождается
+    start_broadcast('feedback', bot, all_users, prepare, progress, finished)
@@ -1,42 +1,49 @@
+from typing import Tuple
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from datetime import datetime
-from data.storage import get_all_hashtags, get_entries_by_hashtag, get_projects_by_hashtag, get_projects, format_number
+from data.dates import parse_date
+from data import async_storage
+from data.storage import format_number
 from handlers.keyboards import get_back_keyboard
+from handlers.screen_cache import cached_screen
 from utils import safe_answer_callback
 
 router = Router()
 
-async def show_hashtags_menu(message: Message, user_id: int):
-    """Показать меню хэштегов"""
-    hashtags = get_all_hashtags(user_id)
+def _format_date(date_str: str) -> str:
+    """'YYYY-MM-DD' -> 'DD.MM.YYYY' (неразбираемая дата - как есть)"""
+    parsed = parse_date(date_str)
+    return parsed.strftime('%d.%m.%Y') if parsed else str(date_str)
+
+async def _build_hashtags_menu(user_id: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Собрать текст и клавиатуру меню хэштегов"""
+    # Все итоги по хэштегам - за одно чтение записей и проектов
+    summary = await async_storage.get_hashtag_summary(user_id)
     
-    if not hashtags:
-        await message.answer(
+    if not summary:
+        return (
             '📝 <b>Хэштеги</b>\n\n'
             'У вас пока нет записей и работ с хэштегами.\n\n'
             'Добавьте хэштег:\n'
             '• При добавлении крестиков\n'
             '• При добавлении работы с фото',
-            parse_mode='HTML',
-            reply_markup=get_back_keyboard()
+            get_back_keyboard()
         )
-        return
     
     text = '<b>📝 Ваши хэштеги:</b>\n\n'
     keyboard = []
     
-    for hashtag in hashtags:
-        entries = get_entries_by_hashtag(hashtag, user_id)
-        projects = get_projects_by_hashtag(hashtag, user_id)
-        total = sum(e.get('count', 0) for e in entries)
+    for hashtag, item in summary.items():
+        total = item['total']
+        entries_count = item['entries']
+        projects = item['projects']
         
         # Формируем описание
         desc_parts = []
         if total > 0:
             desc_parts.append(f"{format_number(total)} крестиков")
-        if len(entries) > 0:
-            desc_parts.append(f"{len(entries)} записей")
+        if entries_count > 0:
+            desc_parts.append(f"{entries_count} записей")
         if len(projects) > 0:
             desc_parts.append(f"{len(projects)} фото")
         
@@ -56,42 +63,44 @@ async def show_hashtags_menu(message: Message, user_id: int):
         )])
     
     keyboard.append([InlineKeyboardButton(text='🔙 Главное меню', callback_data='main_menu')])
-    
-    await message.answer(
-        text,
-        parse_mode='HTML',
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-    )
+    return text, InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+async def show_hashtags_menu(message: Message, user_id: int):
+    """Показать меню хэштегов"""
+    text, markup = await cached_screen('hashtags', user_id, lambda: _build_hashtags_menu(user_id))
+    await message.answer(text, parse_mode='HTML', reply_markup=markup)
 
 async def show_hashtag_progress(message: Message, user_id: int, hashtag: str):
     """Показать прогресс по хэштегу с фото работ"""
-    entries = get_entries_by_hashtag(hashtag, user_id)
-    projects = get_projects_by_hashtag(hashtag, user_id)
+    item = (await async_storage.get_hashtag_summary(user_id)).get(hashtag)
     
-    if not entries and not projects:
+    if item is None:
         await message.answer(
             f'❌ Нет записей и работ с хэштегом #{hashtag}',
             reply_markup=get_back_keyboard()
         )
         return
     
+    projects = item['projects']
+    # Сами записи нужны только для списка последних
+    entries = await async_storage.get_entries_by_hashtag(hashtag, user_id) if item['entries'] else []
+    
     # Формируем текст статистики
     text = f'<b>📊 Прогресс по хэштегу #{hashtag}</b>\n\n'
     
     if entries:
         entries.sort(key=lambda x: x.get('date', ''), reverse=True)
-        total = sum(e.get('count', 0) for e in entries)
-        unique_days = len(set(e.get('date') for e in entries))
+        total = item['total']
+        unique_days = item['days']
         avg_per_day = total // unique_days if unique_days > 0 else 0
         
-        # Находим первую и последнюю дату
-        dates = sorted([e.get('date') for e in entries])
-        first_date = datetime.strptime(dates[0], '%Y-%m-%d').strftime('%d.%m.%Y')
-        last_date = datetime.strptime(dates[-1], '%Y-%m-%d').strftime('%d.%m.%Y')
+        # Первая и последняя дата уже есть в сводке
+        first_date = _format_date(item['first_date'])
+        last_date = _format_date(item['last_date'])
         
         text += (
             f'✨ <b>Всего крестиков:</b> {format_number(total)}\n'
-            f'📝 <b>Записей:</b> {len(entries)}\n'
+            f'📝 <b>Записей:</b> {item["entries"]}\n'
             f'📅 <b>Дней с записями:</b> {unique_days}\n'
             f'📈 <b>Среднее в день:</b> {format_number(avg_per_day)}\n'
             f'📆 <b>Период:</b> {first_date} - {last_date}\n\n'
@@ -109,7 +118,7 @@ async def show_hashtag_progress(message: Message, user_id: int, hashtag: str):
             if entries:
                 photo_caption += '<b>Последние записи:</b>\n'
                 for entry in entries[:5]:
-                    date_str = datetime.strptime(entry['date'], '%Y-%m-%d').strftime('%d.%m.%Y')
+                    date_str = _format_date(entry['date'])
                     photo_caption += f"📆 {date_str}: {format_number(entry['count'])} крестиков\n"
                 if len(entries) > 5:
                     photo_caption += f"\n... и еще {len(entries) - 5} записей"
@@ -134,7 +143,7 @@ async def show_hashtag_progress(message: Message, user_id: int, hashtag: str):
             if entries:
                 text += '<b>Последние записи:</b>\n'
                 for entry in entries[:10]:
-                    date_str = datetime.strptime(entry['date'], '%Y-%m-%d').strftime('%d.%m.%Y')
+                    date_str = _format_date(entry['date'])
                     text += f"📆 {date_str}: {format_number(entry['count'])} крестиков\n"
                 if len(entries) > 10:
                     text += f"\n... и еще {len(entries) - 10} записей"
@@ -149,7 +158,7 @@ async def show_hashtag_progress(message: Message, user_id: int, hashtag: str):
         if entries:
             text += '<b>Последние записи:</b>\n'
             for entry in entries[:10]:
-                date_str = datetime.strptime(entry['date'], '%Y-%m-%d').strftime('%d.%m.%Y')
+                date_str = _format_date(entry['date'])
                 text += f"📆 {date_str}: {entry['count']:,} крестиков\n"
             if len(entries) > 10:
                 text += f"\n... и еще {len(entries) - 10} записей"
@@ -1,7 +1,7 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
-from data.storage import get_notes, save_note, delete_note
+from data import async_storage
 from handlers.keyboards import get_back_keyboard
 from utils import safe_answer_callback
 
@@ -11,7 +11,7 @@ pending_notes = {}
 
 async def show_notes(message: Message, user_id: int):
     """Показать список заметок"""
-    notes = get_notes(user_id)
+    notes = await async_storage.get_notes(user_id)
     notes.sort(key=lambda x: x.get('createdAt', ''), reverse=True)
     
     if not notes:
@@ -98,7 +98,7 @@ async def process_note_message(message: Message, user_id: int):
             'createdAt': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        save_note(note)
+        await async_storage.save_note(note)
         await message.answer(
             f'✅ <b>Заметка сохранена!</b>\n\n'
             f'<b>{note["title"]}</b>\n'
@@ -113,7 +113,7 @@ async def process_note_message(message: Message, user_id: int):
 
 async def show_note(message: Message, user_id: int, note_id: str):
     """Показать заметку"""
-    notes = get_notes(user_id)
+    notes = await async_storage.get_notes(user_id)
     note = next((n for n in notes if n.get('id') == note_id), None)
     
     if not note:
@@ -170,7 +170,7 @@ async def callback_note(callback: CallbackQuery):
     note_id = callback.data.replace("note_", "")
     if note_id.startswith("delete_"):
         note_id = note_id.replace("delete_", "")
-        delete_note(note_id, callback.from_user.id)
+        await async_storage.delete_note(note_id, callback.from_user.id)
         await callback.message.answer('✅ Заметка удалена', reply_markup=get_back_keyboard())
         await show_notes(callback.message, callback.from_user.id)
     else:
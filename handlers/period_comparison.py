@@ -1,15 +1,17 @@
+from typing import Tuple
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime, timedelta
-from data.storage import get_entries, format_number
+from data import async_storage
+from data.storage import format_number
 from handlers.keyboards import get_back_keyboard
+from handlers.screen_cache import cached_screen
 from utils import safe_answer_callback
 
 router = Router()
 
-async def show_period_comparison(message: Message, user_id: int):
-    """Показать сравнение периодов"""
-    entries = get_entries(user_id)
+async def _build_period_comparison(user_id: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Собрать текст и клавиатуру сравнения периодов"""
     now = datetime.now()
     
     # Текущий месяц
@@ -42,25 +44,22 @@ async def show_period_comparison(message: Message, user_id: int):
     prev_year_start_str = prev_year_start.strftime('%Y-%m-%d')
     prev_year_end_str = prev_year_end.strftime('%Y-%m-%d')
     
+    # Суммы за периоды - по накопленным суммам, без прохода по записям
     # Подсчет для текущего месяца
-    current_month_entries = [e for e in entries if e.get('date') >= current_month_str]
-    current_month_count = sum(e.get('count', 0) for e in current_month_entries)
-    current_month_days = len(set(e.get('date') for e in current_month_entries))
+    current_month_count = await async_storage.range_total(user_id, current_month_str)
+    current_month_days = await async_storage.range_days(user_id, current_month_str)
     
     # Подсчет для предыдущего месяца
-    prev_month_entries = [e for e in entries if prev_month_start_str <= e.get('date') <= prev_month_end_str]
-    prev_month_count = sum(e.get('count', 0) for e in prev_month_entries)
-    prev_month_days = len(set(e.get('date') for e in prev_month_entries))
+    prev_month_count = await async_storage.range_total(user_id, prev_month_start_str, prev_month_end_str)
+    prev_month_days = await async_storage.range_days(user_id, prev_month_start_str, prev_month_end_str)
     
     # Подсчет для текущего года
-    current_year_entries = [e for e in entries if e.get('date') >= current_year_str]
-    current_year_count = sum(e.get('count', 0) for e in current_year_entries)
-    current_year_days = len(set(e.get('date') for e in current_year_entries))
+    current_year_count = await async_storage.range_total(user_id, current_year_str)
+    current_year_days = await async_storage.range_days(user_id, current_year_str)
     
     # Подсчет для предыдущего года
-    prev_year_entries = [e for e in entries if prev_year_start_str <= e.get('date') <= prev_year_end_str]
-    prev_year_count = sum(e.get('count', 0) for e in prev_year_entries)
-    prev_year_days = len(set(e.get('date') for e in prev_year_entries))
+    prev_year_count = await async_storage.range_total(user_id, prev_year_start_str, prev_year_end_str)
+    prev_year_days = await async_storage.range_days(user_id, prev_year_start_str, prev_year_end_str)
     
     # Формируем текст
     text = '<b>📊 Сравнение периодов</b>\n\n'
@@ -101,7 +100,12 @@ async def show_period_comparison(message: Message, user_id: int):
     else:
         text += f'📈 <b>+{format_number(current_year_count)}</b> крестиков (новый период)\n'
     
-    await message.answer(text, parse_mode='HTML', reply_markup=get_back_keyboard())
+    return text, get_back_keyboard()
+
+async def show_period_comparison(message: Message, user_id: int):
+    """Показать сравнение периодов"""
+    text, markup = await cached_screen('period_comparison', user_id, lambda: _build_period_comparison(user_id))
+    await message.answer(text, parse_mode='HTML', reply_markup=markup)
 
 @router.callback_query(F.data == "period_comparison")
 async def callback_period_comparison(callback: CallbackQuery):
@@ -1,9 +1,12 @@
+from typing import Tuple
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime, timedelta
 from dateutil import parser
-from data.storage import get_plans, save_plan, delete_plan, get_entries, format_number
+from data import async_storage
+from data.storage import format_number
 from handlers.keyboards import get_back_keyboard
+from handlers.screen_cache import cached_screen
 from utils import safe_answer_callback
 
 router = Router()
@@ -24,9 +27,9 @@ def get_plan_date_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text='🔙 Главное меню', callback_data='main_menu')]
     ])
 
-async def show_plans(message: Message, user_id: int):
-    """Показать список планов"""
-    plans = get_plans(user_id)
+async def _build_plans(user_id: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Собрать текст и клавиатуру списка планов"""
+    plans = await async_storage.get_plans(user_id)
     plans.sort(key=lambda x: x.get('targetDate', ''), reverse=False)
     
     if not plans:
@@ -34,50 +37,23 @@ async def show_plans(message: Message, user_id: int):
             [InlineKeyboardButton(text='➕ Создать план', callback_data='plan_add')],
             [InlineKeyboardButton(text='🔙 Главное меню', callback_data='main_menu')]
         ]
-        await message.answer(
+        return (
             '📋 <b>Планы/Цели</b>\n\n'
             'У вас пока нет планов. Создайте первый план!',
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+            InlineKeyboardMarkup(inline_keyboard=keyboard)
         )
-        return
     
     text = '<b>📋 Ваши планы и цели:</b>\n\n'
     keyboard = []
     
-    for i, plan in enumerate(plans[:20], 1):
+    # Прогресс всех показываемых планов - только записи после создания плана, за одно чтение записей
+    plans = plans[:20]
+    progress_values = await async_storage.get_plans_progress(user_id, plans)
+    
+    for i, (plan, current) in enumerate(zip(plans, progress_values), 1):
         name = plan.get('name', 'Без названия')
         target = plan.get('targetCount', 0)
         target_date = plan.get('targetDate', '')
-        
-        # Считаем прогресс - только записи после создания плана
-        entries = get_entries(user_id)
-        plan_created_at = plan.get('createdAt', '')
-        hashtag = plan.get('hashtag')
-        
-        if hashtag:
-            # Фильтруем по хэштегу и дате создания плана
-            if plan_created_at:
-                plan_entries = [
-                    e for e in entries 
-                    if e.get('hashtag') == hashtag 
-                    and e.get('date', '') >= plan_created_at
-                ]
-            else:
-                # Для старых планов без createdAt считаем все записи
-                plan_entries = [e for e in entries if e.get('hashtag') == hashtag]
-        else:
-            # Фильтруем только по дате создания плана
-            if plan_created_at:
-                plan_entries = [
-                    e for e in entries 
-                    if e.get('date', '') >= plan_created_at
-                ]
-            else:
-                # Для старых планов без createdAt считаем все записи
-                plan_entries = entries
-        
-        current = sum(e.get('count', 0) for e in plan_entries)
         progress = (current / target * 100) if target > 0 else 0
         progress_bar = "█" * int(progress / 5) + "░" * (20 - int(progress / 5))
         remaining = max(0, target - current)
@@ -115,12 +91,12 @@ async def show_plans(message: Message, user_id: int):
     
     keyboard.append([InlineKeyboardButton(text='➕ Создать план', callback_data='plan_add')])
     keyboard.append([InlineKeyboardButton(text='🔙 Главное меню', callback_data='main_menu')])
-    
-    await message.answer(
-        text,
-        parse_mode='HTML',
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-    )
+    return text, InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+async def show_plans(message: Message, user_id: int):
+    """Показать список планов"""
+    text, markup = await cached_screen('plans', user_id, lambda: _build_plans(user_id))
+    await message.answer(text, parse_mode='HTML', reply_markup=markup)
 
 async def add_plan_dialog(message: Message, user_id: int):
     """Начать диалог создания плана"""
@@ -220,7 +196,7 @@ async def process_plan_message(message: Message, user_id: int):
             'createdAt': datetime.now().strftime('%Y-%m-%d')
         }
         
-        save_plan(plan)
+        await async_storage.save_plan(plan)
         
         result_text = (
             f'✅ <b>План создан!</b>\n\n'
@@ -244,7 +220,7 @@ async def process_plan_message(message: Message, user_id: int):
 
 async def show_plan(message: Message, user_id: int, plan_id: str):
     """Показать детали плана"""
-    plans = get_plans(user_id)
+    plans = await async_storage.get_plans(user_id)
     plan = next((p for p in plans if p.get('id') == plan_id), None)
     
     if not plan:
@@ -252,33 +228,7 @@ async def show_plan(message: Message, user_id: int, plan_id: str):
         return
     
     # Считаем прогресс - только записи после создания плана
-    entries = get_entries(user_id)
-    plan_created_at = plan.get('createdAt', '')
-    hashtag = plan.get('hashtag')
-    
-    if hashtag:
-        # Фильтруем по хэштегу и дате создания плана
-        if plan_created_at:
-            plan_entries = [
-                e for e in entries 
-                if e.get('hashtag') == hashtag 
-                and e.get('date', '') >= plan_created_at
-            ]
-        else:
-            # Для старых планов без createdAt считаем все записи
-            plan_entries = [e for e in entries if e.get('hashtag') == hashtag]
-    else:
-        # Фильтруем только по дате создания плана
-        if plan_created_at:
-            plan_entries = [
-                e for e in entries 
-                if e.get('date', '') >= plan_created_at
-            ]
-        else:
-            # Для старых планов без createdAt считаем все записи
-            plan_entries = entries
-    
-    current = sum(e.get('count', 0) for e in plan_entries)
+    current = (await async_storage.get_plans_progress(user_id, [plan]))[0]
     target = plan.get('targetCount', 0)
     progress = (current / target * 100) if target > 0 else 0
     progress_bar = "█" * int(progress / 5) + "░" * (20 - int(progress / 5))
@@ -423,7 +373,7 @@ async def callback_plan_skip_date(callback: CallbackQuery):
         'createdAt': datetime.now().strftime('%Y-%m-%d')
     }
     
-    save_plan(plan)
+    await async_storage.save_plan(plan)
     
     result_text = (
         f'✅ <b>План создан!</b>\n\n'
@@ -446,7 +396,7 @@ async def callback_plan(callback: CallbackQuery):
     plan_id = callback.data.replace("plan_", "")
     if plan_id.startswith("delete_"):
         plan_id = plan_id.replace("delete_", "")
-        delete_plan(plan_id, callback.from_user.id)
+        await async_storage.delete_plan(plan_id, callback.from_user.id)
         await callback.message.answer('✅ План удален', reply_markup=get_back_keyboard())
         await show_plans(callback.message, callback.from_user.id)
     else:
@@ -1,7 +1,7 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
-from data.storage import get_projects, save_project, remove_project_photo, delete_project
+from data import async_storage
 from handlers.keyboards import get_back_keyboard, get_project_navigation
 from utils import safe_answer_callback
 import os
@@ -96,7 +96,7 @@ async def process_project_message(message: Message, user_id: int):
         if hashtag:
             project['hashtag'] = hashtag
         
-        save_project(project)
+        await async_storage.save_project(project)
         
         result_text = f'✅ <b>Работа добавлена!</b>\n\nНазвание: {project["name"]}'
         if hashtag:
@@ -116,16 +116,16 @@ async def process_project_photo(message: Message, user_id: int, photo_file_id: s
     # Проверяем, обновляется ли фото существующего проекта
     if user_id in pending_photo_updates:
         project_id = pending_photo_updates[user_id]
-        projects = get_projects(user_id)
+        projects = await async_storage.get_projects(user_id)
         project = next((p for p in projects if p.get('id') == project_id), None)
         
         if project:
             # Обновляем фото проекта
             project['imageFileId'] = photo_file_id
-            save_project(project)
+            await async_storage.save_project(project)
             
             # Находим индекс проекта для обновления отображения
-            projects_list = get_projects(user_id)
+            projects_list = await async_storage.get_projects(user_id)
             projects_list.reverse()
             project_index = None
             for i, p in enumerate(projects_list):
@@ -166,7 +166,7 @@ async def process_project_photo(message: Message, user_id: int, photo_file_id: s
     return False
 
 async def show_projects(message: Message, user_id: int, index: int = 0):
-    projects_list = get_projects(user_id)
+    projects_list = await async_storage.get_projects(user_id)
     
     if not projects_list:
         await message.answer('📝 У вас пока нет работ.', reply_markup=get_back_keyboard())
@@ -176,7 +176,7 @@ async def show_projects(message: Message, user_id: int, index: int = 0):
 
 async def show_project_by_index(message, user_id: int, index: int, is_edit: bool = False):
     """Универсальная функция для показа проекта с поддержкой редактирования"""
-    projects_list = get_projects(user_id)
+    projects_list = await async_storage.get_projects(user_id)
     projects_list.reverse()
     
     if not projects_list or index < 0 or index >= len(projects_list):
@@ -286,7 +286,7 @@ async def callback_project_skip_hashtag(callback: CallbackQuery):
     if 'imageFileId' in state:
         project['imageFileId'] = state['imageFileId']
     
-    save_project(project)
+    await async_storage.save_project(project)
     
     result_text = f'✅ <b>Работа добавлена!</b>\n\nНазвание: {project["name"]}'
     
@@ -303,7 +303,7 @@ async def callback_project_prev(callback: CallbackQuery):
     await safe_answer_callback(callback)
     user_id = callback.from_user.id
     index = int(callback.data.split('_')[-1])
-    projects_list = get_projects(user_id)
+    projects_list = await async_storage.get_projects(user_id)
     if index > 0:
         await show_project_by_index(callback.message, user_id, index - 1, is_edit=True)
 
@@ -313,7 +313,7 @@ async def callback_project_next(callback: CallbackQuery):
     await safe_answer_callback(callback)
     user_id = callback.from_user.id
     index = int(callback.data.split('_')[-1])
-    projects_list = get_projects(user_id)
+    projects_list = await async_storage.get_projects(user_id)
     if index < len(projects_list) - 1:
         await show_project_by_index(callback.message, user_id, index + 1, is_edit=True)
 
@@ -324,7 +324,7 @@ async def callback_change_project_photo(callback: CallbackQuery):
     project_id = callback.data.replace("project_change_photo_", "")
     
     # Проверяем, существует ли проект
-    projects = get_projects(user_id)
+    projects = await async_storage.get_projects(user_id)
     project = next((p for p in projects if p.get('id') == project_id), None)
     
     if not project:
@@ -357,9 +357,9 @@ async def callback_delete_project_photo(callback: CallbackQuery):
     project_id = callback.data.replace("project_delete_photo_", "")
     
     # Удаляем фото
-    if remove_project_photo(project_id, user_id):
+    if await async_storage.remove_project_photo(project_id, user_id):
         # Находим индекс проекта для обновления отображения
-        projects_list = get_projects(user_id)
+        projects_list = await async_storage.get_projects(user_id)
         projects_list.reverse()
         project_index = None
         for i, p in enumerate(projects_list):
@@ -399,7 +399,7 @@ async def callback_delete_project(callback: CallbackQuery):
     project_id = callback.data.replace("project_delete_", "")
     
     # Проверяем, что проект существует и принадлежит пользователю
-    projects = get_projects(user_id)
+    projects = await async_storage.get_projects(user_id)
     project = next((p for p in projects if p.get('id') == project_id), None)
     
     if not project:
@@ -407,7 +407,7 @@ async def callback_delete_project(callback: CallbackQuery):
         return
     
     # Удаляем проект
-    if delete_project(project_id, user_id):
+    if await async_storage.delete_project(project_id, user_id):
         project_name = project.get('name', 'Работа')
         
         # Пытаемся удалить сообщение с проектом
@@ -420,7 +420,7 @@ async def callback_delete_project(callback: CallbackQuery):
             pass
         
         # Показываем обновленный список проектов
-        projects_list = get_projects(user_id)
+        projects_list = await async_storage.get_projects(user_id)
         if projects_list:
             # Показываем первый проект из списка
             projects_list.reverse()
@@ -0,0 +1,41 @@
+"""Кэш готовых экранов, которые зависят только от данных пользователя и сегодняшней даты.
+
+Экран (текст и клавиатура) хранится вместе с версией данных пользователя и датой, для которых он собран.
+Любая запись в хранилище увеличивает версию, поэтому после изменения данных экран собирается заново.
+Изменения из других процессов версию не меняют - их учитывает счётчик изменений извне (get_external_version).
+"""
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from data import async_storage
+from data.storage import get_data_version
+
+# Для скольких пользователей держать готовые экраны (0 - не кэшировать)
+SCREEN_CACHE_USERS = int(os.getenv('SCREEN_CACHE_USERS', '1000'))
+
+# user_id -> {(экран, параметры): ((версия данных, изменения извне), дата, экран)}; пользователи упорядочены по последнему обращению
+_screens: "OrderedDict[int, Dict[Tuple, Tuple[Tuple[int, int], str, Any]]]" = OrderedDict()
+
+async def cached_screen(screen: str, user_id: int, build: Callable[[], Awaitable[Any]], *params) -> Any:
+    """Готовый экран из кэша или собранный build(), если данные пользователя или дата изменились"""
+    if SCREEN_CACHE_USERS <= 0:
+        return await build()
+    key = (screen,) + params
+    # Версию берём до сборки: изменение во время сборки увеличит её, и собранный экран не будет выдан
+    version = (get_data_version(user_id), await async_storage.get_external_version(user_id))
+    today = datetime.now().strftime('%Y-%m-%d')
+    cached = _screens.get(user_id, {}).get(key)
+    if cached is not None and cached[0] == version and cached[1] == today:
+        _screens.move_to_end(user_id)
+        return cached[2]
+
+    result = await build()
+    screens = _screens.get(user_id)
+    if screens is None:
+        screens = _screens[user_id] = {}
+    screens[key] = (version, today, result)
+    _screens.move_to_end(user_id)
+    while len(_screens) > SCREEN_CACHE_USERS:
+        _screens.popitem(last=False)
+    return result
@@ -3,10 +3,13 @@ import asyncio
 import logging
 import os
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from data.storage import get_user_subscription, get_all_user_ids, DATA_DIR, is_subscribed
+from data import async_storage
+from data.storage import DATA_DIR
+from data.atomic_io import atomic_write_json
+from middleware.outbound import send_message
 
 logger = logging.getLogger(__name__)
 
@@ -30,10 +33,9 @@ def load_notification_flags():
 def save_notification_flags(flags):
     """Сохранить флаги уведомлений в файл"""
     try:
-        with open(NOTIFICATION_FLAGS_FILE, 'w', encoding='utf-8') as f:
-            # Конвертируем ключи из int в строки для JSON
-            data = {str(k): v for k, v in flags.items()}
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # Конвертируем ключи из int в строки для JSON
+        data = {str(k): v for k, v in flags.items()}
+        atomic_write_json(NOTIFICATION_FLAGS_FILE, data)
     except Exception as e:
         logger.error(f"[SUBSCRIPTION_NOTIFICATIONS] Ошибка при сохранении флагов уведомлений: {e}")
 
@@ -48,26 +50,17 @@ async def check_expiring_subscriptions(bot: Bot):
     try:
         logger.info("[SUBSCRIPTION_NOTIFICATIONS] Начало проверки подписок")
         
-        # Получаем всех пользователей
-        user_ids = get_all_user_ids()
-        logger.debug(f"[SUBSCRIPTION_NOTIFICATIONS] Проверка {len(user_ids)} пользователей")
-        
         today = datetime.now().date()
         one_day_later = today + timedelta(days=1)
         three_days_later = today + timedelta(days=3)
         
-        for user_id in user_ids:
+        # Только действующие подписки, которые закончатся не позже чем через 3 дня
+        subscriptions = await async_storage.get_expiring_subscriptions(datetime.combine(three_days_later + timedelta(days=1), time.min))
+        logger.debug(f"[SUBSCRIPTION_NOTIFICATIONS] Истекают в ближайшие 3 дня: {len(subscriptions)} подписок")
+        
+        for subscription in subscriptions:
+            user_id = subscription.get('userId')
             try:
-                # Проверяем, есть ли активная подписка
-                if not is_subscribed(user_id):
-                    # У пользователя нет активной подписки - пропускаем
-                    logger.debug(f"[SUBSCRIPTION_NOTIFICATIONS] Нет активной подписки для user_id={user_id}, пропускаем")
-                    continue
-                
-                subscription = get_user_subscription(user_id)
-                if not subscription:
-                    continue
-                
                 expires_at_str = subscription.get('expiresAt')
                 if not expires_at_str:
                     continue
@@ -109,16 +102,25 @@ async def check_expiring_subscriptions(bot: Bot):
                         logger.info(f"[SUBSCRIPTION_NOTIFICATIONS] Отправлено уведомление за 3 дня для user_id={user_id}")
                     else:
                         logger.debug(f"[SUBSCRIPTION_NOTIFICATIONS] Пропуск user_id={user_id} - уведомление за 3 дня уже было отправлено")
-                
-                # Сбрасываем флаги, если подписка была продлена (больше чем на 3 дня)
-                if expires_at > three_days_later:
-                    sent_notifications[user_id] = {'3days': False, '1day': False, 'expired': False}
-                    save_notification_flags(sent_notifications)
                     
             except Exception as e:
                 logger.error(f"[SUBSCRIPTION_NOTIFICATIONS] Ошибка при проверке подписки user_id={user_id}: {e}", exc_info=True)
                 continue
         
+        # Сбрасываем флаги, если подписка была продлена (больше чем на 3 дня)
+        expiring_ids = {subscription.get('userId') for subscription in subscriptions}
+        for user_id, flags in list(sent_notifications.items()):
+            if user_id in expiring_ids or not any(flags.values()) or not await async_storage.is_subscribed(user_id):
+                continue
+            subscription = await async_storage.get_user_subscription(user_id)
+            try:
+                expires_at = datetime.fromisoformat(subscription['expiresAt']).date()
+            except Exception:
+                continue
+            if expires_at > three_days_later:
+                sent_notifications[user_id] = {'3days': False, '1day': False, 'expired': False}
+                save_notification_flags(sent_notifications)
+        
         logger.info("[SUBSCRIPTION_NOTIFICATIONS] Проверка подписок завершена")
         
     except Exception as e:
@@ -143,8 +145,9 @@ async def send_1day_notification(bot: Bot, user_id: int, expires_at: datetime.da
             'Чтобы не потерять доступ к боту, продлите подписку прямо сейчас.'
         )
         
-        await bot.send_message(
-            chat_id=user_id,
+        await send_message(
+            bot,
+            user_id,
             text=message_text,
             parse_mode='HTML',
             reply_markup=keyboard
@@ -181,8 +184,9 @@ async def send_3days_notification(bot: Bot, user_id: int, expires_at: datetime.d
             'Чтобы продолжить пользоваться ботом, продлите подписку.'
         )
         
-        await bot.send_message(
-            chat_id=user_id,
+        await send_message(
+            bot,
+            user_id,
             text=message_text,
             parse_mode='HTML',
             reply_markup=keyboard
@@ -197,7 +201,7 @@ async def send_expired_notification(bot: Bot, user_id: int, expires_at: datetime
         expires_str = expires_at.strftime("%d.%m.%Y")
         
         # Проверяем, была ли это пробная подписка
-        subscription = get_user_subscription(user_id)
+        subscription = await async_storage.get_user_subscription(user_id)
         is_trial = subscription and subscription.get('isTrial', False)
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[[
@@ -223,8 +227,9 @@ async def send_expired_notification(bot: Bot, user_id: int, expires_at: datetime
                 'Все ваши данные сохранены и будут доступны после продления.'
             )
         
-        await bot.send_message(
-            chat_id=user_id,
+        await send_message(
+            bot,
+            user_id,
             text=message_text,
             parse_mode='HTML',
             reply_markup=keyboard
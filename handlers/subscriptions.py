@@ -2,7 +2,7 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, PreCheckoutQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton, LabeledPrice
 from aiogram.filters import Command
 from datetime import datetime, timedelta
-from data.storage import save_subscription, is_subscribed, get_user_subscription
+from data import async_storage
 from config import SUBSCRIPTION_ID, TEST_MODE, PROVIDER_TOKEN
 from handlers.keyboards import get_main_menu
 from utils import safe_answer_callback
@@ -30,8 +30,8 @@ async def callback_subscribe(callback: CallbackQuery):
     # Можно оставить пустым, инвойс будет отправляться без него
     
     # Проверяем, есть ли уже активная подписка
-    subscription = get_user_subscription(callback.from_user.id)
-    if subscription and is_subscribed(callback.from_user.id):
+    subscription = await async_storage.get_user_subscription(callback.from_user.id)
+    if subscription and await async_storage.is_subscribed(callback.from_user.id):
         expires_at = subscription.get('expiresAt')
         if expires_at:
             try:
@@ -154,7 +154,7 @@ async def process_subscription_payment(message: Message):
     }
     
     logger.info(f"[SUBSCRIPTIONS] Сохранение подписки: user_id={user_id}, expires_at={expires_at.isoformat()}")
-    save_subscription(user_id, subscription_data)
+    await async_storage.save_subscription(user_id, subscription_data)
     logger.info(f"[SUBSCRIPTIONS] Подписка успешно сохранена для user_id={user_id}")
     
     # Сбрасываем флаги уведомлений при продлении подписки
@@ -192,8 +192,8 @@ async def callback_check_subscription(callback: CallbackQuery):
         )
         return
     
-    subscription = get_user_subscription(user_id)
-    if subscription and is_subscribed(user_id):
+    subscription = await async_storage.get_user_subscription(user_id)
+    if subscription and await async_storage.is_subscribed(user_id):
         expires_at = subscription.get('expiresAt')
         if expires_at:
             try:
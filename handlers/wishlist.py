@@ -1,8 +1,9 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime
-from data.storage import get_wishlist, add_to_wishlist, remove_from_wishlist, update_wishlist_item
+from data import async_storage
 from handlers.keyboards import get_back_keyboard
+from handlers.screen_cache import cached_screen
 from utils import safe_answer_callback
 
 router = Router()
@@ -18,7 +19,7 @@ def get_wishlist_link_keyboard() -> InlineKeyboardMarkup:
 
 async def show_wishlist(message: Message, user_id: int):
     """Показать вишлист"""
-    items = get_wishlist(user_id)
+    items = await async_storage.get_wishlist(user_id)
     
     if not items:
         keyboard = [
@@ -107,7 +108,7 @@ async def process_wishlist_message(message: Message, user_id: int):
                 'completed': False
             }
             
-            add_to_wishlist(item)
+            await async_storage.add_to_wishlist(item)
             
             result_text = (
                 f'✅ <b>Добавлено в вишлист!</b>\n\n'
@@ -153,7 +154,7 @@ async def process_wishlist_message(message: Message, user_id: int):
             if link:
                 item['link'] = link
             
-            add_to_wishlist(item)
+            await async_storage.add_to_wishlist(item)
             
             result_text = (
                 f'✅ <b>Добавлено в вишлист!</b>\n\n'
@@ -175,7 +176,7 @@ async def process_wishlist_message(message: Message, user_id: int):
 
 async def show_wishlist_item(message: Message, user_id: int, item_id: str):
     """Показать детали элемента вишлиста"""
-    items = get_wishlist(user_id)
+    items = await async_storage.get_wishlist(user_id)
     item = next((i for i in items if i.get('id') == item_id), None)
     
     if not item:
@@ -218,9 +219,9 @@ async def show_wishlist_item(message: Message, user_id: int, item_id: str):
         reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
     )
 
-def get_wishlist_share_text(user_id: int, use_html: bool = True) -> str:
+async def get_wishlist_share_text(user_id: int, use_html: bool = True) -> str:
     """Получить текст вишлиста для шаринга (только работы в планах)"""
-    items = get_wishlist(user_id)
+    items = await async_storage.get_wishlist(user_id)
     
     # Фильтруем только работы в планах
     pending_items = [item for item in items if not item.get('completed', False)]
@@ -305,7 +306,7 @@ async def callback_wishlist_skip_link(callback: CallbackQuery):
         'completed': False
     }
     
-    add_to_wishlist(item)
+    await async_storage.add_to_wishlist(item)
     
     result_text = (
         f'✅ <b>Добавлено в вишлист!</b>\n\n'
@@ -330,48 +331,52 @@ async def callback_wishlist_item(callback: CallbackQuery):
 async def callback_wishlist_complete(callback: CallbackQuery):
     await safe_answer_callback(callback)
     item_id = callback.data.replace("wishlist_complete_", "")
-    update_wishlist_item(item_id, callback.from_user.id, {'completed': True, 'completedAt': datetime.now().strftime('%Y-%m-%d')})
+    await async_storage.update_wishlist_item(item_id, callback.from_user.id, {'completed': True, 'completedAt': datetime.now().strftime('%Y-%m-%d')})
     await show_wishlist_item(callback.message, callback.from_user.id, item_id)
 
 @router.callback_query(F.data.startswith("wishlist_uncomplete_"))
 async def callback_wishlist_uncomplete(callback: CallbackQuery):
     await safe_answer_callback(callback)
     item_id = callback.data.replace("wishlist_uncomplete_", "")
-    update_wishlist_item(item_id, callback.from_user.id, {'completed': False})
+    await async_storage.update_wishlist_item(item_id, callback.from_user.id, {'completed': False})
     await show_wishlist_item(callback.message, callback.from_user.id, item_id)
 
 @router.callback_query(F.data.startswith("wishlist_delete_"))
 async def callback_wishlist_delete(callback: CallbackQuery):
     await safe_answer_callback(callback)
     item_id = callback.data.replace("wishlist_delete_", "")
-    remove_from_wishlist(item_id, callback.from_user.id)
+    await async_storage.remove_from_wishlist(item_id, callback.from_user.id)
     await callback.message.answer('✅ Удалено из вишлиста', reply_markup=get_back_keyboard())
     await show_wishlist(callback.message, callback.from_user.id)
 
 @router.callback_query(F.data == "wishlist_share")
 async def callback_wishlist_share(callback: CallbackQuery):
     await safe_answer_callback(callback)
-    items = get_wishlist(callback.from_user.id)
+    user_id = callback.from_user.id
     
-    if not items:
+    async def build():
+        if not await async_storage.get_wishlist(user_id):
+            return None
+        # Создаем красивую клавиатуру
+        keyboard = [
+            [InlineKeyboardButton(text='🔙 Назад', callback_data='wishlist_menu')]
+        ]
+        return await get_wishlist_share_text(user_id, use_html=True), InlineKeyboardMarkup(inline_keyboard=keyboard)
+    
+    screen = await cached_screen('wishlist_share', user_id, build)
+    if screen is None:
         await callback.message.answer(
             '❌ Вишлист пуст. Нечего делиться.',
             reply_markup=get_back_keyboard()
         )
         return
     
-    share_text = get_wishlist_share_text(callback.from_user.id, use_html=True)
-    
-    # Создаем красивую клавиатуру
-    keyboard = [
-        [InlineKeyboardButton(text='🔙 Назад', callback_data='wishlist_menu')]
-    ]
-    
+    share_text, markup = screen
     # Отправляем красиво оформленное сообщение
     await callback.message.answer(
         share_text,
         parse_mode='HTML',
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+        reply_markup=markup,
         disable_web_page_preview=False
     )
 
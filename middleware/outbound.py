@@ -0,0 +1,193 @@
+"""Общий лимит исходящих сообщений бота с приоритетами.
+
+Все отправки и правки сообщений проходят через OutboundMiddleware (подключается к сессии бота):
+перед запросом к Telegram они ждут разрешения в общей очереди с ограничением частоты. Ответы
+на действия пользователя идут первыми, уведомления - после них, рассылки - в последнюю очередь.
+После TelegramRetryAfter очередь останавливается на указанное время и запрос повторяется,
+после ошибок сервера Telegram - повторяется с нарастающей паузой. После сетевой ошибки повторяются
+только правки сообщений: отправка могла дойти до Telegram, и повтор прислал бы сообщение дважды.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import (
+    CopyMessage, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup, EditMessageText,
+    ForwardMessage, SendDocument, SendMediaGroup, SendMessage, SendPhoto,
+)
+
+logger = logging.getLogger(__name__)
+
+# Сколько сообщений в секунду бот отправляет всего (лимит Telegram - около 30)
+OUTBOUND_RATE = float(os.getenv('OUTBOUND_RATE', '25'))
+# Сколько сообщений можно отправить подряд без паузы после затишья
+OUTBOUND_BURST = int(os.getenv('OUTBOUND_BURST', '3'))
+# Сколько раз повторять запрос после RetryAfter, ошибки сервера Telegram или сетевой ошибки (для правок)
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+# Приоритеты: чем меньше число, тем раньше отправка
+PRIORITY_INTERACTIVE = 0   # ответ на действие пользователя
+PRIORITY_NOTIFICATION = 1  # уведомления (челленджи, подписка, опрос)
+PRIORITY_BROADCAST = 2     # рассылки администратора
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'ответы', PRIORITY_NOTIFICATION: 'уведомления', PRIORITY_BROADCAST: 'рассылки'}
+
+# Запросы, на которые распространяется лимит Telegram на отправку сообщений
+LIMITED_METHODS = (
+    SendMessage, SendPhoto, SendDocument, SendMediaGroup, CopyMessage, ForwardMessage,
+    EditMessageText, EditMessageCaption, EditMessageReplyMarkup, EditMessageMedia,
+)
+# Запросы, которые можно повторить после сетевой ошибки: повторная правка не меняет результат
+IDEMPOTENT_METHODS = (EditMessageText, EditMessageCaption, EditMessageReplyMarkup, EditMessageMedia)
+
+# Приоритет отправок текущей задачи; всё, что не помечено через send_message, - ответ пользователю
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar('outbound_priority', default=PRIORITY_INTERACTIVE)
+
+# Сколько последних задержек отправки хранить для перцентилей
+_LATENCY_SAMPLES = 1000
+
+class PriorityLimiter:
+    """Ограничитель частоты (token bucket), который выдаёт разрешения по приоритету, а внутри приоритета - по очереди"""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Ожидающие: [приоритет, номер в очереди]
+        self._waiters: List[List[int]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+
+    def _delay(self) -> float:
+        """Через сколько секунд можно выдать следующее разрешение"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if now < self._paused_until:
+            return self._paused_until - now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    async def acquire(self, priority: int):
+        """Дождаться разрешения на один запрос"""
+        entry = [priority, next(self._seq)]
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    if self._waiters[0] is not entry:
+                        await self._cond.wait()
+                        continue
+                    delay = self._delay()
+                    if delay <= 0:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        self._cond.notify_all()
+                        return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def pause(self, seconds: float):
+        """Не выдавать разрешений seconds секунд (Telegram ответил RetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    def waiting(self) -> Dict[int, int]:
+        """Сколько запросов ждут разрешения, по приоритетам"""
+        counts: Dict[int, int] = {}
+        for priority, _ in self._waiters:
+            counts[priority] = counts.get(priority, 0) + 1
+        return counts
+
+_limiter = PriorityLimiter(OUTBOUND_RATE, OUTBOUND_BURST)
+
+# Счётчики по приоритетам: отправлено, повторов, ошибок и последние задержки (от постановки в очередь до ответа Telegram)
+_metrics: Dict[int, Dict[str, Any]] = {
+    priority: {'sent': 0, 'retries': 0, 'failed': 0, 'latencies': deque(maxlen=_LATENCY_SAMPLES)}
+    for priority in PRIORITY_NAMES
+}
+_retry_after_total = 0.0
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """Пропускает отправку сообщений через общий лимит с приоритетами и повторяет её после ошибок"""
+
+    async def __call__(self, make_request, bot, method):
+        global _retry_after_total
+        if not isinstance(method, LIMITED_METHODS):
+            return await make_request(bot, method)
+
+        priority = _priority.get()
+        metrics = _metrics[priority]
+        started = time.monotonic()
+        for attempt in range(OUTBOUND_MAX_RETRIES + 1):
+            await _limiter.acquire(priority)
+            try:
+                result = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                _limiter.pause(e.retry_after)
+                _retry_after_total += e.retry_after
+                logger.warning(f"[OUTBOUND] RetryAfter {e.retry_after} с на {type(method).__name__} (попытка {attempt + 1})")
+                if attempt == OUTBOUND_MAX_RETRIES:
+                    metrics['failed'] += 1
+                    raise
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"[OUTBOUND] Ошибка {type(method).__name__}: {e} (попытка {attempt + 1})")
+                if attempt == OUTBOUND_MAX_RETRIES or (
+                        isinstance(e, TelegramNetworkError) and not isinstance(method, IDEMPOTENT_METHODS)):
+                    metrics['failed'] += 1
+                    raise
+                await asyncio.sleep(min(10.0, 0.5 * 2 ** attempt))
+            except Exception:
+                metrics['failed'] += 1
+                raise
+            else:
+                metrics['sent'] += 1
+                metrics['latencies'].append(time.monotonic() - started)
+                return result
+            metrics['retries'] += 1
+
+async def send_message(bot, chat_id: int, text: str, priority: int = PRIORITY_NOTIFICATION, **kwargs):
+    """Отправить сообщение не в ответ на действие пользователя (уведомление, рассылка) с пониженным приоритетом"""
+    token = _priority.set(priority)
+    try:
+        return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+    finally:
+        _priority.reset(token)
+
+def _percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+def get_outbound_stats() -> Dict:
+    """Очередь и задержки исходящих сообщений по приоритетам (задержки в мс)"""
+    waiting = _limiter.waiting()
+    stats = {'retry_after_total': _retry_after_total, 'priorities': {}}
+    for priority, metrics in _metrics.items():
+        latencies = list(metrics['latencies'])
+        stats['priorities'][priority] = {
+            'queued': waiting.get(priority, 0),
+            'sent': metrics['sent'],
+            'retries': metrics['retries'],
+            'failed': metrics['failed'],
+            'p50_ms': _percentile(latencies, 0.5) * 1000,
+            'p95_ms': _percentile(latencies, 0.95) * 1000,
+            'max_ms': max(latencies, default=0.0) * 1000,
+        }
+    return stats
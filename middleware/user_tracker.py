@@ -2,7 +2,7 @@
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
-from data.storage import save_user_id
+from data import async_storage
 
 class UserTrackerMiddleware(BaseMiddleware):
     """Middleware для автоматического сохранения ID пользователей"""
@@ -25,7 +25,7 @@ class UserTrackerMiddleware(BaseMiddleware):
         
         # Сохраняем ID пользователя
         if user:
-            save_user_id(user.id)
+            await async_storage.save_user_id(user.id)
         
         # Продолжаем обработку
         return await handler(event, data)
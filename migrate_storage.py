@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Скрипт для переноса данных бота в другой формат хранения
+
+Использование:
+    python migrate_storage.py sqlite    # импорт JSON-файлов из DATA_DIR в SQLite
+    python migrate_storage.py shards    # разложить JSON-файлы по папкам пользователей (data/users/<id>/)
+"""
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def migrate_to_sqlite():
+    from data import sqlite_storage
+    from data.storage import DATA_DIR, SQLITE_FILE, flush_storage
+
+    # Сворачиваем журнал новых пользователей в users.json перед чтением файлов
+    flush_storage()
+    print(f"📦 Импорт JSON-файлов из {DATA_DIR} в {SQLITE_FILE}...")
+    sqlite_storage.init(SQLITE_FILE)
+    counts = sqlite_storage.import_from_json(DATA_DIR)
+    sqlite_storage.close()
+
+    for name, count in counts.items():
+        print(f"  • {name}: {count}")
+    print("✅ Импорт завершен. Установите STORAGE_BACKEND=sqlite в .env и перезапустите бота.")
+
+def migrate_to_shards():
+    from data.storage import USERS_DIR, split_into_shards
+
+    print(f"📦 Раскладка JSON-файлов по папкам пользователей в {USERS_DIR}...")
+    counts = split_into_shards()
+
+    for name, count in counts.items():
+        print(f"  • {name}: {count}")
+    print("✅ Готово. Установите STORAGE_LAYOUT=sharded в .env и перезапустите бота.")
+
+TARGETS = {
+    'sqlite': migrate_to_sqlite,
+    'shards': migrate_to_shards,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in TARGETS:
+        print(__doc__)
+        sys.exit(1)
+    TARGETS[sys.argv[1]]()
@@ -0,0 +1,155 @@
+"""Рассылки администратора: пауза после RetryAfter, заблокировавшие бота, продолжение прерванной рассылки"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Данные бота при импорте хранилища не должны попасть в ./data
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='stitch_bot_test_'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from handlers import broadcast
+from middleware import outbound
+from middleware.outbound import OutboundMiddleware
+
+
+class FakeBot:
+    """Бот без сети: запоминает отправленные сообщения, а для отдельных пользователей возвращает ошибки.
+
+    Отправка, как и у настоящего бота, проходит через OutboundMiddleware.
+    """
+
+    def __init__(self, retry_after=None, forbidden=(), failing=(), stop_after=None):
+        # user_id -> сколько секунд ждать после первой попытки (один раз)
+        self.retry_after = dict(retry_after or {})
+        self.forbidden = set(forbidden)
+        # Пользователи, отправка которым заканчивается ошибкой
+        self.failing = set(failing)
+        self.stop_after = stop_after
+        self.stopped = asyncio.Event()
+        self.sent = []
+        self.attempts = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        method = SendMessage(chat_id=chat_id, text=text)
+        return await OutboundMiddleware()(self._request, self, method)
+
+    async def _request(self, bot, method):
+        chat_id = method.chat_id
+        self.attempts.append((chat_id, time.monotonic()))
+        if chat_id in self.failing:
+            raise RuntimeError('bad request')
+        if chat_id in self.retry_after:
+            raise TelegramRetryAfter(method, 'Too Many Requests', self.retry_after.pop(chat_id))
+        if chat_id in self.forbidden:
+            raise TelegramForbiddenError(method, 'bot was blocked by the user')
+        # Точка переключения: прерванная здесь отправка не считается выполненной
+        await asyncio.sleep(0)
+        self.sent.append(chat_id)
+        if self.stop_after is not None and len(self.sent) >= self.stop_after:
+            self.stopped.set()
+
+
+async def _prepare(user_id):
+    return {'text': f'привет, {user_id}'}
+
+
+@pytest.fixture(autouse=True)
+def broadcasts_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(broadcast, 'BROADCASTS_DIR', str(tmp_path))
+    # У каждого теста свой цикл событий - и своя очередь отправки
+    monkeypatch.setattr(outbound, '_limiter', outbound.PriorityLimiter(1000.0, 1000.0))
+    return tmp_path
+
+
+def test_retry_after_pauses_and_resends():
+    bot = FakeBot(retry_after={2: 1})
+
+    stats = asyncio.run(broadcast.run_broadcast('retry', bot, [1, 2, 3], _prepare))
+
+    assert sorted(bot.sent) == [1, 2, 3]
+    assert stats['sent'] == 3 and stats['errors'] == 0
+    # Повторная отправка пользователю 2 - не раньше, чем через retry_after
+    first, second = [at for user_id, at in bot.attempts if user_id == 2]
+    assert second - first >= 1.0
+
+
+def test_forbidden_user_is_counted_as_blocked():
+    bot = FakeBot(forbidden={2})
+
+    stats = asyncio.run(broadcast.run_broadcast('blocked', bot, [1, 2, 3], _prepare))
+
+    assert sorted(bot.sent) == [1, 3]
+    assert stats['blocked'] == 1
+    assert stats['sent'] == 2
+    assert stats['processed'] == stats['total'] == 3
+
+
+def test_interrupted_broadcast_resumes_from_checkpoint(broadcasts_dir, monkeypatch):
+    monkeypatch.setattr(broadcast, 'BROADCAST_CONCURRENCY', 1)
+    user_ids = list(range(1, 11))
+    first_bot = FakeBot(stop_after=4)
+    delivered = []
+
+    async def mark_delivered(user_id):
+        delivered.append(user_id)
+
+    async def interrupt():
+        task = asyncio.create_task(broadcast.run_broadcast('resume', first_bot, user_ids, _prepare, delivered=mark_delivered))
+        await first_bot.stopped.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(interrupt())
+    assert 0 < len(first_bot.sent) < len(user_ids)
+    assert (broadcasts_dir / 'resume.jsonl').exists()
+
+    second_bot = FakeBot()
+    stats = asyncio.run(broadcast.run_broadcast('resume', second_bot, user_ids, _prepare, delivered=mark_delivered))
+
+    assert stats['resumed'] is True
+    assert not set(first_bot.sent) & set(second_bot.sent)
+    assert sorted(first_bot.sent + second_bot.sent) == user_ids
+    assert sorted(delivered) == user_ids
+    assert stats['sent'] == len(user_ids)
+    assert not (broadcasts_dir / 'resume.jsonl').exists()
+
+
+def test_delivered_is_not_called_when_send_fails():
+    bot = FakeBot(forbidden={2})
+    delivered = []
+
+    async def mark_delivered(user_id):
+        delivered.append(user_id)
+
+    asyncio.run(broadcast.run_broadcast('delivered', bot, [1, 2], _prepare, delivered=mark_delivered))
+
+    assert delivered == [1]
+
+
+def test_failed_user_is_retried_on_resume(broadcasts_dir, monkeypatch):
+    monkeypatch.setattr(broadcast, 'BROADCAST_CONCURRENCY', 1)
+    first_bot = FakeBot(failing={2}, stop_after=2)
+
+    async def interrupt():
+        task = asyncio.create_task(broadcast.run_broadcast('failed', first_bot, [1, 2, 3, 4], _prepare))
+        await first_bot.stopped.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(interrupt())
+    assert first_bot.sent == [1, 3]
+
+    second_bot = FakeBot()
+    stats = asyncio.run(broadcast.run_broadcast('failed', second_bot, [1, 2, 3, 4], _prepare))
+
+    # Пользователь с ошибкой не попал в файл хода рассылки - при продолжении ему отправляют снова
+    assert second_bot.sent == [2, 4]
+    assert stats['sent'] == 4 and stats['errors'] == 0
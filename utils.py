@@ -1,6 +1,7 @@
 """Утилиты для бота"""
 from aiogram.types import CallbackQuery
 from aiogram.exceptions import TelegramBadRequest
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,3 +30,44 @@ async def safe_answer_callback(callback: CallbackQuery, text: str = None, show_a
         logger.error(f"Unexpected error answering callback query: {e}", exc_info=True)
         # Не пробрасываем исключение, чтобы не ломать обработку
 
+
+# Статистика задержек event loop (заполняется event_loop_lag_monitor)
+loop_lag_stats = {'max_ms': 0.0, 'total_stall_ms': 0.0, 'stalls': 0, 'samples': 0}
+
+
+async def event_loop_lag_monitor(interval: float = 0.1, stall_threshold: float = 0.05, report_every: float = 300):
+    """
+    Фоновая задача: измеряет, насколько event loop опаздывает с пробуждением
+    
+    Args:
+        interval: Как часто просыпаться (секунды)
+        stall_threshold: Опоздание, начиная с которого считаем loop заблокированным (секунды)
+        report_every: Как часто писать сводку в лог (секунды)
+    """
+    loop = asyncio.get_running_loop()
+    last_report = loop.time()
+    period_max = 0.0
+    period_stall = 0.0
+    
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = loop.time() - started - interval
+        
+        loop_lag_stats['samples'] += 1
+        loop_lag_stats['max_ms'] = max(loop_lag_stats['max_ms'], lag * 1000)
+        period_max = max(period_max, lag)
+        if lag >= stall_threshold:
+            loop_lag_stats['stalls'] += 1
+            loop_lag_stats['total_stall_ms'] += lag * 1000
+            period_stall += lag
+            logger.debug(f"Event loop был заблокирован на {lag * 1000:.0f} мс")
+        
+        if loop.time() - last_report >= report_every:
+            logger.info(
+                f"Задержка event loop за {report_every:.0f} с: максимум {period_max * 1000:.0f} мс, "
+                f"суммарная блокировка {period_stall * 1000:.0f} мс"
+            )
+            last_report = loop.time()
+            period_max = 0.0
+            period_stall = 0.0